@@ -0,0 +1,211 @@
+"""
+Parser Benchmark
+Offline throughput and regression check for newsletter extraction
+
+Runs NewsletterWebScraper.parse_ideas_from_html over the HTML fixtures and
+NewsletterMonitor.extract_quotes_from_email over the email fixtures, then
+compares the extracted ideas against benchmarks/fixtures/expected.json.
+
+Throughput is compared relative to a fixed calibration loop timed in the
+same run (best of --runs each), so a baseline recorded on one machine
+still means something on another. A throughput drop is reported as a
+warning, and only fails the run with --check-throughput.
+
+Usage:
+    python benchmarks/parser_benchmark.py                    # check output against baseline
+    python benchmarks/parser_benchmark.py --check-throughput # also fail on a throughput drop
+    python benchmarks/parser_benchmark.py --update           # accept current output as baseline
+    python benchmarks/parser_benchmark.py --tolerance 0.5    # allow a 50% relative throughput drop
+
+Exits with status 1 if extraction output changed (or, with
+--check-throughput, if relative throughput regressed).
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+import sys
+import time
+from typing import Callable, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(BENCH_DIR, 'fixtures')
+EXPECTED_FILE = os.path.join(FIXTURES_DIR, 'expected.json')
+
+# Shortest timed run, so fast suites aren't timed over a few milliseconds
+MIN_RUN_SECONDS = 0.5
+
+# Add src directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'src'))
+from newsletter_scraper import NewsletterWebScraper
+from email_monitor import NewsletterMonitor
+
+
+def load_fixtures(subdir: str) -> Dict[str, str]:
+    """Load every fixture file in a subdirectory, keyed by file name"""
+    directory = os.path.join(FIXTURES_DIR, subdir)
+    fixtures = {}
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name), 'r', encoding='utf-8') as f:
+            fixtures[name] = f.read()
+    return fixtures
+
+
+def calibrate(runs: int) -> float:
+    """
+    Rounds per second of a fixed string/dict/regex workload (best of runs),
+    the yardstick throughput is measured against
+    """
+    text = ' '.join(f"idea{i} <p>Habits are the compound interest of self-improvement.</p>" for i in range(20))
+    best = 0.0
+    for _ in range(runs):
+        rounds = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < MIN_RUN_SECONDS:
+            words = {}
+            for word in re.findall(r'\w+', text.lower()):
+                words[word] = words.get(word, 0) + 1
+            ' '.join(sorted(words))
+            rounds += 1
+        best = max(best, rounds / (time.perf_counter() - start))
+    return best
+
+
+def run_suite(parse: Callable[[str], List[str]], fixtures: Dict[str, str], iterations: int, runs: int = 1) -> Dict:
+    """
+    Parse every fixture at least `iterations` times per run (more for fast
+    suites, so each run lasts MIN_RUN_SECONDS), `runs` times over
+
+    Returns the extracted ideas per fixture (from the first pass) and the
+    pages per second of the fastest run
+    """
+    # Parsers print diagnostics for pages without an ideas section
+    with contextlib.redirect_stdout(io.StringIO()):
+        outputs = {name: parse(content) for name, content in fixtures.items()}
+
+        best = 0.0
+        for _ in range(runs):
+            passes = 0
+            start = time.perf_counter()
+            while passes < iterations or time.perf_counter() - start < MIN_RUN_SECONDS:
+                for content in fixtures.values():
+                    parse(content)
+                passes += 1
+            elapsed = time.perf_counter() - start
+            best = max(best, len(fixtures) * passes / elapsed)
+
+    return {
+        'outputs': outputs,
+        'ideas': sum(len(ideas) for ideas in outputs.values()),
+        'pages_per_sec': best,
+    }
+
+
+def compare_outputs(suite: str, actual: Dict[str, List[str]], expected: Dict[str, List[str]]) -> List[str]:
+    """Describe every fixture whose extracted ideas differ from the baseline"""
+    problems = []
+    for name in sorted(set(actual) | set(expected)):
+        if name not in expected:
+            problems.append(f"{suite}/{name}: no baseline (run with --update)")
+        elif name not in actual:
+            problems.append(f"{suite}/{name}: fixture missing")
+        elif actual[name] != expected[name]:
+            problems.append(
+                f"{suite}/{name}: extracted {len(actual[name])} ideas, expected {len(expected[name])}"
+            )
+            for got, want in zip(actual[name], expected[name]):
+                if got != want:
+                    problems.append(f"    got:  {got[:80]!r}")
+                    problems.append(f"    want: {want[:80]!r}")
+                    break
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark newsletter and email parsers')
+    parser.add_argument('--iterations', type=int, default=20, help='Passes over each fixture set')
+    parser.add_argument('--runs', type=int, default=3, help='Timed runs per suite; the fastest counts')
+    parser.add_argument('--tolerance', type=float, default=0.3,
+                        help='Allowed relative throughput drop as a fraction of the baseline')
+    parser.add_argument('--check-throughput', action='store_true',
+                        help='Fail (not just warn) when relative throughput regressed')
+    parser.add_argument('--update', action='store_true', help='Write current results as the new baseline')
+    args = parser.parse_args()
+
+    scraper = NewsletterWebScraper()
+    monitor = NewsletterMonitor('benchmark@example.com', '')
+
+    calibration = calibrate(args.runs)
+    results = {
+        'newsletters': run_suite(scraper.parse_ideas_from_html, load_fixtures('newsletters'),
+                                 args.iterations, args.runs),
+        'emails': run_suite(monitor.extract_quotes_from_email, load_fixtures('emails'),
+                            args.iterations, args.runs),
+    }
+
+    for suite, result in results.items():
+        # Pages parsed per thousand calibration rounds: roughly machine-independent
+        result['relative'] = result['pages_per_sec'] / calibration * 1000
+        print(f"{suite:12} {result['pages_per_sec']:10.1f} pages/sec   {result['relative']:8.1f} relative   "
+              f"{result['ideas']:3} ideas from {len(result['outputs'])} fixtures")
+
+    if args.update:
+        baseline = {
+            suite: {
+                'pages_per_sec': round(result['pages_per_sec'], 1),
+                'relative': round(result['relative'], 1),
+                'outputs': result['outputs'],
+            }
+            for suite, result in results.items()
+        }
+        with open(EXPECTED_FILE, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+        print(f"Baseline written to {EXPECTED_FILE}")
+        return 0
+
+    if not os.path.exists(EXPECTED_FILE):
+        print(f"No baseline at {EXPECTED_FILE}. Run with --update first.")
+        return 1
+
+    with open(EXPECTED_FILE, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    problems = []
+    slow = []
+    for suite, result in results.items():
+        expected = baseline.get(suite, {})
+        problems.extend(compare_outputs(suite, result['outputs'], expected.get('outputs', {})))
+
+        if 'relative' not in expected:
+            slow.append(f"{suite}: no relative throughput baseline (run with --update)")
+            continue
+        floor = expected['relative'] * (1 - args.tolerance)
+        if result['relative'] < floor:
+            slow.append(
+                f"{suite}: relative throughput {result['relative']:.1f} is below "
+                f"{floor:.1f} (baseline {expected['relative']} - {args.tolerance:.0%})"
+            )
+
+    if args.check_throughput:
+        problems.extend(slow)
+    elif slow:
+        print("\n⚠️  Throughput (not failing without --check-throughput):")
+        for warning in slow:
+            print(f"  {warning}")
+
+    if problems:
+        print("\n❌ Regressions:")
+        for problem in problems:
+            print(f"  {problem}")
+        return 1
+
+    print("\n✅ Output matches baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,41 @@
+#!/bin/bash
+
+# Local primary/replica cluster for trying out snapshot shipping
+#
+# Starts a primary on port 5000 and replicas on 5001 and 5002, each in its
+# own directory under $CLUSTER_DIR (default /tmp/trmnl-cluster), all from
+# this checkout. Ctrl+C stops everything.
+#
+#   bash scripts/local_cluster.sh
+#   curl -X POST -d '{"quotes": ["A new idea posted to the primary"]}' \
+#        -H 'Content-Type: application/json' localhost:5000/webhook/newsletter
+#   curl localhost:5001/stats     # the replicas pick it up within a few seconds
+
+REPO="$(cd "$(dirname "$0")/.." && pwd)"
+CLUSTER_DIR="${CLUSTER_DIR:-/tmp/trmnl-cluster}"
+REPLICAS="${REPLICAS:-2}"
+PRIMARY="http://127.0.0.1:5000"
+
+trap 'trap - TERM; kill 0' INT TERM EXIT
+
+mkdir -p "$CLUSTER_DIR/primary/data"
+cp -n "$REPO/data/quotes.json" "$CLUSTER_DIR/primary/data/" 2>/dev/null
+
+echo "Starting primary on $PRIMARY"
+(cd "$CLUSTER_DIR/primary" && exec gunicorn --pythonpath "$REPO" -w 2 -b 127.0.0.1:5000 src.server:app) &
+
+# Wait for the primary before the replicas take their first snapshot
+until curl -sf "$PRIMARY/health" > /dev/null; do sleep 0.5; done
+
+for i in $(seq 1 "$REPLICAS"); do
+    port=$((5000 + i))
+    dir="$CLUSTER_DIR/replica$i"
+    mkdir -p "$dir/data"
+    echo "Starting replica $i on http://127.0.0.1:$port"
+    (cd "$dir" && TRMNL_PRIMARY_URL="$PRIMARY" python "$REPO/src/replica.py" --once &&
+        TRMNL_PRIMARY_URL="$PRIMARY" exec python "$REPO/src/replica.py" --interval 5) &
+    (cd "$dir" && sleep 2 && TRMNL_PRIMARY_URL="$PRIMARY" \
+        exec gunicorn --pythonpath "$REPO" -w 2 -b "127.0.0.1:$port" src.server:app) &
+done
+
+wait
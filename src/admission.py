@@ -0,0 +1,170 @@
+"""
+Admission Control
+Keeps /plugin answering with a slightly stale screen instead of an error
+
+A /plugin response is computed on a small thread pool (at most
+TRMNL_PLUGIN_CONCURRENCY at a time), and the request waits for it until its
+deadline. If the response isn't ready by then (a cache being built, a scrape
+competing for the worker) or computing it fails, the request gets the last
+good response for the same user, settings and device, with an Age header.
+The computation carries on in the background and becomes the next last good
+response. When more requests are waiting than the queue holds, new ones
+aren't queued at all: they get their last good response straight away.
+
+A request with nothing to fall back on waits for its own response, or gets
+a 503 with Retry-After if the queue is full.
+
+Settings (environment):
+- TRMNL_PLUGIN_CONCURRENCY: Responses computed at once (default 4)
+- TRMNL_PLUGIN_DEADLINE_MS: Wait before serving the last good response (default 1000)
+- TRMNL_PLUGIN_QUEUE: Requests waiting or computing before new ones are shed
+  (default 4 x concurrency)
+"""
+
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+from profiler import SamplingProfiler
+
+logger = logging.getLogger(__name__)
+
+# Last good responses kept per worker
+LAST_GOOD_SIZE = 5000
+
+# Oldest last good response worth serving, in seconds
+MAX_STALE = 24 * 60 * 60
+
+
+class Overloaded(Exception):
+    """The queue is full and there is no last good response to serve"""
+
+
+class AdmissionControl:
+    """Concurrency limit and deadline for computing responses, with last-good fallback"""
+
+    def __init__(self, concurrency: Optional[int] = None, deadline: Optional[float] = None,
+                 max_queue: Optional[int] = None, cache_size: int = LAST_GOOD_SIZE,
+                 profiler: Optional[SamplingProfiler] = None):
+        """
+        Args:
+            concurrency: Responses computed at once (default TRMNL_PLUGIN_CONCURRENCY)
+            deadline: Seconds a request waits before falling back (default
+                TRMNL_PLUGIN_DEADLINE_MS)
+            max_queue: Requests waiting or computing before new ones are shed
+                (default TRMNL_PLUGIN_QUEUE)
+            cache_size: Last good responses kept
+            profiler: Samples computations for profiled requests on the pool threads
+        """
+        self.concurrency = concurrency or int(os.environ.get('TRMNL_PLUGIN_CONCURRENCY', 4) or 4)
+        self.deadline = deadline or float(os.environ.get('TRMNL_PLUGIN_DEADLINE_MS', 1000) or 1000) / 1000
+        self.max_queue = max_queue or int(os.environ.get('TRMNL_PLUGIN_QUEUE', 0) or 4 * self.concurrency)
+        self.cache_size = cache_size
+        self.profiler = profiler
+        self.executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix='plugin')
+        self.last_good: 'OrderedDict[Hashable, Tuple[Dict, float]]' = OrderedDict()
+        self.pending = 0
+        self.counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def run(self, key: Hashable, compute: Callable[[], Dict]) -> Tuple[Dict, Optional[float]]:
+        """
+        Response for key, computed or the last good one
+
+        ValueError from compute (a bad request) is raised, never covered up.
+
+        Returns:
+            (response, age in seconds if it is a last good response, else None)
+
+        Raises:
+            Overloaded: If the queue is full and there is no last good response
+        """
+        with self._lock:
+            shed = self.pending >= self.max_queue
+            if not shed:
+                self.pending += 1
+        if shed:
+            stale = self._fallback(key, 'shed')
+            if stale is None:
+                raise Overloaded()
+            return stale
+
+        future = self.executor.submit(contextvars.copy_context().run, self._compute, key, compute)
+        try:
+            response = future.result(timeout=self.deadline)
+        except FutureTimeout:
+            stale = self._fallback(key, 'late')
+            if stale is not None:
+                future.add_done_callback(self._log_failure)
+                return stale
+            response = future.result()  # Nothing to fall back on: wait it out
+        except ValueError:
+            raise
+        except Exception as e:
+            stale = self._fallback(key, 'failed')
+            if stale is None:
+                raise
+            logger.warning("Serving last good response after error: %s", e)
+            return stale
+
+        with self._lock:
+            self.counts['fresh'] += 1
+        return response, None
+
+    def _compute(self, key: Hashable, compute: Callable[[], Dict]) -> Dict:
+        """Compute a response and remember it as the last good one"""
+        # Runs in a copy of the request's context, so a profiled request's
+        # label is here and its computation is sampled on this thread
+        label = self.profiler.current_label() if self.profiler else None
+        if label:
+            self.profiler.begin(label)
+        try:
+            response = compute()
+        finally:
+            if label:
+                self.profiler.end()
+            with self._lock:
+                self.pending -= 1
+        with self._lock:
+            self.last_good[key] = (response, time.time())
+            self.last_good.move_to_end(key)
+            while len(self.last_good) > self.cache_size:
+                self.last_good.popitem(last=False)
+        return response
+
+    def _fallback(self, key: Hashable, reason: str) -> Optional[Tuple[Dict, float]]:
+        """Last good response for key and its age, counting why it was needed"""
+        with self._lock:
+            self.counts[reason] += 1
+            entry = self.last_good.get(key)
+            if entry is None:
+                return None
+            age = time.time() - entry[1]
+            if age > MAX_STALE:
+                return None
+            self.counts['stale'] += 1
+            return entry[0], age
+
+    @staticmethod
+    def _log_failure(future: Future):
+        """Log a background computation that failed after its request moved on"""
+        error = future.exception()
+        if error is not None and not isinstance(error, ValueError):
+            logger.warning("Background plugin response failed: %s", error)
+
+    def stats(self) -> Dict:
+        """Limits and counts, for /health"""
+        with self._lock:
+            return {
+                'concurrency': self.concurrency,
+                'deadline_ms': int(self.deadline * 1000),
+                'max_queue': self.max_queue,
+                'pending': self.pending,
+                'last_good': len(self.last_good),
+                **self.counts,
+            }
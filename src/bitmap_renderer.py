@@ -0,0 +1,261 @@
+"""
+Bitmap Renderer
+Pre-renders quotes as 1-bit e-ink bitmaps so devices don't each rasterize HTML
+
+Rendering runs in a background process pool. Finished bitmaps are cached
+content-addressed by (quote text, layout, dimensions, format) in memory and
+under data/render_cache/, so serving a bitmap is a dict or file lookup.
+"""
+
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, Optional
+
+try:
+    from PIL import Image, ImageDraw
+except ImportError:  # Pillow is only needed for image-serving mode
+    Image = ImageDraw = None
+
+from text_fit import content_box, fit_table, load_font
+
+
+LAYOUTS = ('full', 'half_vertical', 'half_horizontal', 'quadrant')
+
+IMAGE_FORMATS = {
+    'png': 'image/png',
+    'bmp': 'image/bmp',
+}
+
+
+def is_available() -> bool:
+    """Whether Pillow is installed"""
+    return Image is not None
+
+
+def cache_key(text: str, layout: str, width: int, height: int, image_format: str = 'png') -> str:
+    """Content address of a rendered bitmap"""
+    payload = json.dumps([text, layout, width, height, image_format], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def render_quote(text: str, layout: str, width: int, height: int, image_format: str = 'png') -> bytes:
+    """
+    Render a quote as a 1-bit bitmap for one layout
+
+    Font size, line breaks and truncation come from the text fit table, so
+    the bitmap matches what the HTML layouts are sized for
+    """
+    box = content_box(layout, width, height)
+    fit = fit_table.get(text, layout, width, height)
+
+    image = Image.new('1', (box['area_width'], box['area_height']), 1)
+    draw = ImageDraw.Draw(image)
+
+    if box['title_size']:
+        draw.text((box['margin'], box['margin']), 'Daily Wisdom', font=load_font(box['title_size']), fill=0)
+
+    font = load_font(fit.font_size)
+    line_height = int(fit.font_size * fit.line_height)
+    top = box['margin'] + box['title_height'] + max((box['height'] - len(fit.lines) * line_height) // 2, 0)
+    for i, line in enumerate(fit.lines):
+        left = box['margin'] + (box['width'] - font.getlength(line)) / 2
+        draw.text((left, top + i * line_height), line, font=font, fill=0)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format.upper())
+    return buffer.getvalue()
+
+
+class BitmapCache:
+    """
+    Content-addressed bitmap cache: bounded in-memory LRU backed by a directory
+
+    The directory is shared by all workers and kept under max_disk_bytes by
+    removing the least recently used files (a read refreshes a file's mtime).
+    Each worker counts its own writes and rescans the directory when they
+    would take it over the limit, or every TRIM_INTERVAL writes to catch up
+    with the other workers.
+    """
+
+    TRIM_INTERVAL = 64
+
+    def __init__(self, cache_dir: str = 'data/render_cache', max_memory_items: int = 256,
+                 max_disk_bytes: Optional[int] = None):
+        self.cache_dir = cache_dir
+        self.max_memory_items = max_memory_items
+        if max_disk_bytes is None:
+            max_disk_bytes = int(os.environ.get('TRMNL_RENDER_CACHE_MB', 256)) * 1024 * 1024
+        self.max_disk_bytes = max_disk_bytes
+        self.memory: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._disk_bytes: Optional[int] = None  # Unknown until the first scan
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def path(self, key: str, image_format: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.{image_format}")
+
+    def get(self, key: str, image_format: str) -> Optional[bytes]:
+        with self._lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                return self.memory[key]
+
+        path = self.path(key, image_format)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+
+        self._remember(key, data)
+        return data
+
+    def put(self, key: str, image_format: str, data: bytes):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path(key, image_format)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        self._remember(key, data)
+
+        with self._lock:
+            self._writes += 1
+            if self._disk_bytes is not None:
+                self._disk_bytes += len(data)
+            due = (self._disk_bytes is None or self._disk_bytes > self.max_disk_bytes
+                   or self._writes % self.TRIM_INTERVAL == 0)
+        if due:
+            self.trim()
+
+    def trim(self):
+        """Remove the least recently used files until the directory is under its limit"""
+        files = []
+        try:
+            with os.scandir(self.cache_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.tmp'):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:  # Removed by another worker
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+        except FileNotFoundError:
+            files = []
+
+        total = sum(size for _, size, _ in files)
+        if total > self.max_disk_bytes:
+            # Down to 90% so the next few writes don't each trigger a trim
+            target = self.max_disk_bytes * 9 // 10
+            for _, size, path in sorted(files):
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+        with self._lock:
+            self._disk_bytes = total
+
+    def _remember(self, key: str, data: bytes):
+        with self._lock:
+            self.memory[key] = data
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.max_memory_items:
+                self.memory.popitem(last=False)
+
+
+class BitmapRenderer:
+    """
+    Renders bitmaps in a background process pool, deduplicating in-flight work
+
+    The pool is created on first use so each gunicorn worker gets its own
+    after forking. Only the worker that submitted a render knows about it
+    until it is written to the shared cache directory, so /image waits for
+    the render (render()) before redirecting to a URL any worker can serve.
+    """
+
+    def __init__(self, cache: Optional[BitmapCache] = None, max_workers: Optional[int] = None):
+        self.cache = cache or BitmapCache()
+        self.max_workers = max_workers or int(os.environ.get('TRMNL_RENDER_WORKERS', 2))
+        self._pool = None
+        # Resolved once the bitmap is in the cache, not just rendered
+        self._pending: Dict[str, Future] = {}
+        # Re-entrant: a render that finishes immediately runs _finish inside submit
+        self._lock = threading.RLock()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._pool
+
+    def submit(self, text: str, layout: str, width: int, height: int, image_format: str = 'png') -> str:
+        """
+        Make sure a bitmap is cached or being rendered
+
+        Returns:
+            The bitmap's cache key
+        """
+        key = cache_key(text, layout, width, height, image_format)
+        if self.cache.get(key, image_format) is not None:
+            return key
+
+        with self._lock:
+            if key not in self._pending:
+                stored = Future()
+                self._pending[key] = stored
+                future = self._executor().submit(render_quote, text, layout, width, height, image_format)
+                future.add_done_callback(lambda done: self._finish(key, image_format, done, stored))
+        return key
+
+    def render(self, text: str, layout: str, width: int, height: int, image_format: str = 'png',
+               timeout: float = 10) -> str:
+        """
+        Render a bitmap if it isn't cached and wait until it is
+
+        Returns:
+            The bitmap's cache key, servable by any worker
+
+        Raises:
+            concurrent.futures.TimeoutError: If the render takes longer than timeout
+        """
+        key = self.submit(text, layout, width, height, image_format)
+        with self._lock:
+            stored = self._pending.get(key)
+        if stored is not None:
+            stored.result(timeout=timeout)
+        return key
+
+    def _finish(self, key: str, image_format: str, future: Future, stored: Future):
+        try:
+            data = future.result()
+            self.cache.put(key, image_format, data)
+        except BaseException as e:
+            stored.set_exception(e)
+        else:
+            stored.set_result(data)
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def get(self, key: str, image_format: str = 'png', timeout: float = 10) -> Optional[bytes]:
+        """Cached bitmap for key, waiting for an in-flight render if needed"""
+        data = self.cache.get(key, image_format)
+        if data is not None:
+            return data
+
+        with self._lock:
+            stored = self._pending.get(key)
+        if stored is None:
+            return None
+
+        return stored.result(timeout=timeout)
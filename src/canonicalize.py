@@ -0,0 +1,135 @@
+"""
+Quote Canonicalization
+Single cleanup stage applied to quote text at ingestion
+
+Every source (website scraper, newsletter archive, email, webhook) passes
+quotes through canonical_text before they are stored, so the display path
+never has to clean text up. Display variants (per-layout truncation and the
+HTML-escaped text) are computed once per quote by the text fit table.
+
+Run directly to canonicalize an existing database:
+    python src/canonicalize.py            # report quotes that would change
+    python src/canonicalize.py --apply    # rewrite data/quotes.json
+"""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from typing import Dict, List
+
+# Zero-width characters left behind by the newsletter's HTML
+_ZERO_WIDTH = re.compile(r'[\u200b-\u200d\u2060\ufeff]')
+
+# Roman numeral the newsletter puts in front of each idea ("II.")
+_ROMAN_PREFIX = re.compile(r'^\s*I{1,3}\.\s*')
+
+# Social sharing link in a trailing parenthesis, "(Share on Twitter)"
+_SHARE_LINK = re.compile(r'\s*\(\s*(?:share on twitter|click to share|tweet this)[^()]*\)$', re.IGNORECASE)
+
+# The "()" an older scraper left after dropping the share link's text
+_EMPTY_PARENS = re.compile(r'\s*\(\s*\)$')
+
+# Titles the newsletter links, whose surrounding spaces were lost with the
+# link markup ("a quote fromAtomic Habits")
+_TITLES = ('Atomic Habits', '3-2-1 Newsletter')
+_TITLE = '|'.join(map(re.escape, _TITLES))
+_GLUED_TITLE = re.compile(r'(?<=[A-Za-z])(?=%s)|(%s)(?=[A-Za-z])' % (_TITLE, _TITLE))
+
+# Double quote marks wrapped around the whole idea (templates add their own).
+# Single quotes are left alone since they double as apostrophes.
+_WRAPPING_QUOTES = '"\u201c\u201d\u00ab\u00bb'
+
+
+def canonical_text(text: str) -> str:
+    """
+    Canonical form of a quote's text
+
+    Unicode-normalizes (NFKC), removes zero-width characters, a leading
+    roman numeral, a trailing "(Share on Twitter)" or its empty "()" and
+    wrapping quote marks, spaces out glued titles, and collapses whitespace
+    """
+    text = unicodedata.normalize('NFKC', text)
+    text = _ZERO_WIDTH.sub('', text)
+    text = ' '.join(text.split())
+    text = _ROMAN_PREFIX.sub('', text)
+
+    # Cheap tests first: almost no quote ends in a parenthesis or names a title
+    if text.endswith(')'):
+        text = _EMPTY_PARENS.sub('', _SHARE_LINK.sub('', text))
+    if 'Atomic Habits' in text or '3-2-1 Newsletter' in text:
+        text = _GLUED_TITLE.sub(lambda match: (match.group(1) or '') + ' ', text)
+
+    text = text.strip().strip(_WRAPPING_QUOTES).strip()
+    # Stripping the wrapping marks can leave an inner quotation unclosed
+    if text.count('\u201c') > text.count('\u201d'):
+        text += '\u201d'
+    return text
+
+
+def leftovers(text: str) -> List[str]:
+    """Scraper leftovers in a text that canonical_text would remove"""
+    found = []
+    if _EMPTY_PARENS.search(text) or _SHARE_LINK.search(text):
+        found.append('share link remnant')
+    if _GLUED_TITLE.search(text):
+        found.append('glued title')
+    return found
+
+
+def canonical_key(text: str) -> int:
+    """
+    Stable 64-bit id of a quote: a hash of its canonical text
+
+    Unlike a position in the quotes file, it survives quotes being removed,
+    deduplicated or reordered.
+    """
+    digest = hashlib.blake2b(canonical_text(text).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def canonicalize_quote(quote: Dict) -> Dict:
+    """Quote record with canonical text and a matching length (copied only if it changes)"""
+    text = canonical_text(quote['text'])
+    if text == quote['text'] and quote.get('length') == len(text):
+        return quote
+    return {**quote, 'text': text, 'length': len(text)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Canonicalize quote texts')
+    parser.add_argument('--file', default='data/quotes.json', help='Quotes database to clean up')
+    parser.add_argument('--apply', action='store_true', help='Rewrite the file with canonical texts')
+    args = parser.parse_args()
+
+    # ingest imports this module, so its lock is imported here
+    from ingest import locked
+
+    # Hold the writers' lock from read to rewrite so a concurrent ingest isn't lost
+    with locked(args.file) if args.apply else contextlib.nullcontext():
+        with open(args.file, 'r', encoding='utf-8') as f:
+            quotes: List[Dict] = json.load(f)
+
+        canonical = [canonicalize_quote(quote) for quote in quotes]
+        changed = [(old, new) for old, new in zip(quotes, canonical) if old['text'] != new['text']]
+
+        for old, new in changed[:20]:
+            print(f"- {old['text'][:90]!r}")
+            print(f"+ {new['text'][:90]!r}")
+        print(f"\n{len(changed)} of {len(quotes)} quotes change")
+
+        if args.apply and changed:
+            temp_file = args.file + '.tmp'
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(canonical, f, indent=2, ensure_ascii=False)
+            os.replace(temp_file, args.file)
+            print(f"Saved {len(canonical)} quotes to {args.file}")
+        elif changed:
+            print("Dry run. Re-run with --apply to rewrite the file.")
+
+
+if __name__ == '__main__':
+    main()
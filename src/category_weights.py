@@ -0,0 +1,138 @@
+"""
+Category Weights
+Weighted category mixing ("mostly atomic-habits, some 3-2-1 newsletter")
+
+The categories form field accepts optional weights:
+    atomic-habits:3,3-2-1-newsletter:1
+
+Picks use a Walker alias table, so choosing a category costs O(1) however
+many categories are mixed.
+"""
+
+from typing import Collection, Dict, List, Optional, Tuple
+
+
+def parse_category_weights(field: str) -> Optional[Dict[str, float]]:
+    """
+    Category weights from a categories field
+
+    Returns None if no entry has an explicit weight, so a plain
+    comma-separated list keeps working as an include filter. Entries
+    without a weight count as 1.
+
+    Raises:
+        ValueError: If a weight is not a non-negative number
+    """
+    if not field or ':' not in field:
+        return None
+
+    weights: Dict[str, float] = {}
+    for entry in field.split(','):
+        name, _, weight = entry.partition(':')
+        name = name.strip()
+        if not name:
+            continue
+        value = float(weight) if weight.strip() else 1.0
+        if not value >= 0 or value == float('inf'):
+            raise ValueError(f"Invalid weight for category '{name}': {weight.strip()}")
+        weights[name] = weights.get(name, 0.0) + value
+    return weights
+
+
+def parse_categories(selected_categories: str) -> Tuple[Optional[List[str]], Optional[Dict[str, float]]]:
+    """
+    Category filter or weights from the categories form field
+
+    Returns (categories, weights): a plain comma-separated list is an include
+    filter (empty means all); entries with weights ("atomic-habits:3,life:1")
+    mix categories in proportion instead.
+
+    Raises:
+        ValueError: If a weight is invalid
+    """
+    weights = parse_category_weights(selected_categories)
+    if weights is not None:
+        return None, weights
+    return [cat.strip() for cat in (selected_categories or '').split(',') if cat.strip()], None
+
+
+def normalize_weights(weights: Dict[str, float]) -> Tuple[Tuple[str, float], ...]:
+    """
+    Canonical spec for a weight vector: categories with positive weight,
+    sorted, weights scaled to sum to 1
+
+    Equivalent requests ("a:2,b:1" and "b:10,a:20") get the same spec and
+    so share one alias table.
+    """
+    total = sum(weight for weight in weights.values() if weight > 0)
+    if not total:
+        return ()
+    return tuple(sorted(
+        (category, round(weight / total, 6))
+        for category, weight in weights.items()
+        if weight > 0
+    ))
+
+
+def category_spec(categories: Optional[List[str]], weights: Optional[Dict[str, float]],
+                  known: Optional[Collection[str]] = None) -> Optional[str]:
+    """
+    Canonical form of a parsed categories field, for telling settings apart
+
+    Categories are sorted and weights normalized, so "b,a" and "a,b", or
+    "a:2,b:1" and "b:10,a:20", get the same spec; '' means all categories.
+    Categories not in known are left out, as they match no quotes.
+
+    Returns:
+        The spec, or None if the field matches no quotes (it names only
+        unknown categories, or every weight is zero)
+    """
+    if weights is not None:
+        normalized = normalize_weights({category: weight for category, weight in weights.items()
+                                        if known is None or category in known})
+        if not normalized:
+            return None
+        return ','.join(f"{category}:{weight:g}" for category, weight in normalized)
+
+    names = sorted({category for category in categories or () if known is None or category in known})
+    if categories and not names:
+        return None
+    return ','.join(names)
+
+
+class AliasTable:
+    """
+    Walker alias table (Vose's construction) for O(1) weighted sampling
+
+    Each of the n slots holds a probability and an alias: a uniform draw
+    picks a slot, then either the slot or its alias.
+    """
+
+    def __init__(self, weights: List[float]):
+        count = len(weights)
+        if not count:
+            raise ValueError("AliasTable needs at least one weight")
+
+        total = sum(weights)
+        scaled = [weight * count / total for weight in weights]
+        self.prob = [1.0] * count
+        self.alias = list(range(count))
+
+        small = [i for i, value in enumerate(scaled) if value < 1.0]
+        large = [i for i, value in enumerate(scaled) if value >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+        # Leftovers are 1 up to rounding error and keep prob 1
+
+    def __len__(self) -> int:
+        return len(self.prob)
+
+    def pick(self, u: float) -> int:
+        """Index for a uniform draw u in [0, 1)"""
+        scaled = u * len(self.prob)
+        slot = int(scaled)
+        return slot if scaled - slot < self.prob[slot] else self.alias[slot]
@@ -0,0 +1,277 @@
+"""
+Corpus Export
+Precompressed downloads and a changefeed of data/quotes.json
+
+Every distinct version of the quotes file is a numbered generation. When a
+new version is seen, it is diffed against the previous one and the added
+and removed records are appended to a change log
+(data/quotes.changes.ndjson), so a mirror can fetch just what changed since
+the generation it has. The log is shared by all workers and appended under
+a file lock, so each generation is recorded once.
+
+The log grows with every change; compact() folds old generations into a
+single base generation (python src/corpus_tool.py compact). Mirrors older
+than the base have to download the file again.
+
+Downloads are compressed once per generation (gzip, plus zstd if the
+zstandard package is installed) and served from memory.
+"""
+
+import contextlib
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; gzip is always available
+    zstandard = None
+
+
+def record_key(quote: Dict) -> str:
+    """Identity of a record: an edited record counts as removed and re-added"""
+    return json.dumps(quote, sort_keys=True, ensure_ascii=False)
+
+
+def available_encodings() -> List[str]:
+    """Content encodings downloads can be served in, most preferred first"""
+    return (['zstd'] if zstandard else []) + ['gzip']
+
+
+@contextlib.contextmanager
+def locked_log(path: str):
+    """
+    The change log opened for appending under an exclusive lock
+
+    Compaction replaces the file, so a handle that was waiting for the lock
+    on the old file is reopened on the new one.
+    """
+    while True:
+        log = open(path, 'a+', encoding='utf-8')
+        fcntl.flock(log, fcntl.LOCK_EX)
+        try:
+            current = os.fstat(log.fileno()).st_ino == os.stat(path).st_ino
+        except FileNotFoundError:
+            current = False
+        if current:
+            break
+        log.close()  # Releases the lock
+
+    try:
+        yield log
+    finally:
+        fcntl.flock(log, fcntl.LOCK_UN)
+        log.close()
+
+
+class CorpusGeneration:
+    """One version of the quotes file and its precompressed encodings"""
+
+    def __init__(self, number: int, digest: str, data: bytes):
+        self.number = number
+        self.digest = digest
+        self.encodings: Dict[str, bytes] = {'identity': data}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding: str) -> bytes:
+        """The file in a content encoding, compressed on first request"""
+        with self._lock:
+            if encoding not in self.encodings:
+                data = self.encodings['identity']
+                if encoding == 'gzip':
+                    self.encodings[encoding] = gzip.compress(data, compresslevel=9, mtime=0)
+                elif encoding == 'zstd' and zstandard:
+                    self.encodings[encoding] = zstandard.ZstdCompressor(level=19).compress(data)
+                else:
+                    raise ValueError(f"Unsupported encoding: {encoding}")
+            return self.encodings[encoding]
+
+    def etag(self, encoding: str) -> str:
+        """Strong ETag for one encoding of this generation"""
+        return self.digest if encoding == 'identity' else f"{self.digest}-{encoding}"
+
+
+class CorpusExport:
+    """
+    Tracks generations of the quotes file
+
+    Call current() to get the generation matching the file on disk; it is
+    cheap when the file hasn't changed (one stat).
+    """
+
+    def __init__(self, quotes_file: str = 'data/quotes.json', changes_file: Optional[str] = None):
+        self.quotes_file = quotes_file
+        self.changes_file = changes_file or os.path.splitext(quotes_file)[0] + '.changes.ndjson'
+        self.generation: Optional[CorpusGeneration] = None
+        self._file_state: Optional[Tuple[float, int]] = None
+        self._lock = threading.Lock()
+
+    def current(self) -> CorpusGeneration:
+        """Generation of the quotes file as it is now, logging its changes if it is new"""
+        stat = os.stat(self.quotes_file)
+        file_state = (stat.st_mtime, stat.st_size)
+        with self._lock:
+            if self.generation is not None and file_state == self._file_state:
+                return self.generation
+
+            with open(self.quotes_file, 'rb') as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()[:32]
+
+            if self.generation is None or digest != self.generation.digest:
+                number = self._sync_log(digest, json.loads(data))
+                self.generation = CorpusGeneration(number, digest, data)
+            self._file_state = file_state
+            return self.generation
+
+    def _replay(self, log) -> Tuple[int, Optional[str], Counter]:
+        """Head generation, its digest and its record keys, from the change log"""
+        number, digest, keys = 0, None, Counter()
+        log.seek(0)
+        for line in log:
+            entry = json.loads(line)
+            if entry['op'] == 'generation':
+                number, digest = entry['generation'], entry['digest']
+            elif entry['op'] == 'add':
+                keys[record_key(entry['quote'])] += 1
+            elif entry['op'] == 'remove':
+                keys[record_key(entry['quote'])] -= 1
+        return number, digest, +keys
+
+    def _sync_log(self, digest: str, quotes: List[Dict]) -> int:
+        """
+        Make sure the change log ends with this version, appending the diff
+        from the previous generation if not
+
+        Returns:
+            The version's generation number
+        """
+        os.makedirs(os.path.dirname(self.changes_file) or '.', exist_ok=True)
+        with locked_log(self.changes_file) as log:
+            number, head_digest, head_keys = self._replay(log)
+            if digest == head_digest:
+                return number
+
+            keyed = {record_key(quote): quote for quote in quotes}
+            keys = Counter(record_key(quote) for quote in quotes)
+            added = keys - head_keys
+            removed = head_keys - keys
+
+            number += 1
+            log.seek(0, os.SEEK_END)
+            log.write(json.dumps({
+                'op': 'generation', 'generation': number, 'digest': digest,
+                'added': sum(added.values()), 'removed': sum(removed.values()),
+            }) + '\n')
+            for key, count in removed.items():
+                line = json.dumps({'op': 'remove', 'generation': number, 'quote': json.loads(key)},
+                                  ensure_ascii=False) + '\n'
+                log.write(line * count)
+            for key, count in added.items():
+                line = json.dumps({'op': 'add', 'generation': number, 'quote': keyed[key]},
+                                  ensure_ascii=False) + '\n'
+                log.write(line * count)
+            log.flush()
+            os.fsync(log.fileno())
+            return number
+
+    def changes_since(self, since: int) -> Iterator[str]:
+        """
+        Change log lines (NDJSON) after generation since, up to the current one
+
+        Each generation starts with a {"op": "generation", ...} line followed
+        by its "remove" and "add" records
+        """
+        head = self.current().number
+        with open(self.changes_file, 'r', encoding='utf-8') as log:
+            for line in log:
+                if since < json.loads(line)['generation'] <= head:
+                    yield line
+
+    def base_generation(self) -> int:
+        """
+        Oldest generation the changefeed can bring a mirror forward from (0
+        unless the log has been compacted)
+        """
+        try:
+            with open(self.changes_file, 'r', encoding='utf-8') as log:
+                first = log.readline()
+        except FileNotFoundError:
+            return 0
+        entry = json.loads(first) if first else {}
+        return entry['generation'] if entry.get('base') else 0
+
+    def compact(self, keep: int = 10) -> Dict:
+        """
+        Fold all but the last `keep` generations of the change log into one
+        base generation
+
+        The base holds an "add" for each record present at that generation;
+        the "remove" records (tombstones) and the adds they cancel are
+        dropped. The log is streamed, so memory grows with the records at
+        the base, not with the length of the history.
+
+        Returns:
+            Base generation and line counts before and after
+        """
+        with locked_log(self.changes_file) as log:
+            log.seek(0)
+            head = 0
+            for line in log:
+                entry = json.loads(line)
+                if entry['op'] == 'generation':
+                    head = entry['generation']
+            base = head - keep
+            result = {'base': max(base, 0), 'lines_before': 0, 'lines_after': 0}
+
+            keys, digest = Counter(), None
+            temp_file = self.changes_file + '.tmp'
+            with open(temp_file, 'w', encoding='utf-8') as out:
+                log.seek(0)
+                for line in log:
+                    result['lines_before'] += 1
+                    entry = json.loads(line)
+                    if entry['generation'] > base:
+                        if keys is not None:
+                            self._write_base(out, base, digest, keys, result)
+                            keys = None
+                        out.write(line)
+                        result['lines_after'] += 1
+                    elif entry['op'] == 'generation':
+                        digest = entry['digest']
+                    elif entry['op'] == 'add':
+                        keys[record_key(entry['quote'])] += 1
+                    elif entry['op'] == 'remove':
+                        keys[record_key(entry['quote'])] -= 1
+                if keys is not None:
+                    self._write_base(out, base, digest, keys, result)
+                out.flush()
+                os.fsync(out.fileno())
+
+            if base <= 0 or result['lines_after'] >= result['lines_before']:
+                os.remove(temp_file)  # Nothing to fold
+                result['lines_after'] = result['lines_before']
+            else:
+                os.replace(temp_file, self.changes_file)
+            return result
+
+    @staticmethod
+    def _write_base(out, base: int, digest: Optional[str], keys: Counter, result: Dict):
+        """Write the base generation folded from the records present at it"""
+        if base <= 0:
+            return
+        keys = +keys
+        out.write(json.dumps({
+            'op': 'generation', 'generation': base, 'digest': digest,
+            'added': sum(keys.values()), 'removed': 0, 'base': True,
+        }) + '\n')
+        for key, count in keys.items():
+            line = json.dumps({'op': 'add', 'generation': base, 'quote': json.loads(key)},
+                              ensure_ascii=False) + '\n'
+            out.write(line * count)
+        result['lines_after'] += 1 + sum(keys.values())
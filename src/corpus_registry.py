@@ -0,0 +1,230 @@
+"""
+Corpus Registry
+Several quote collections served from one deployment
+
+The default collection is data/quotes.json. Other collections ("corpora")
+are files in data/corpora/<name>.json, in the same format, and users pick one
+with the plugin's corpus field. A collection is loaded into a
+QuoteDisplayManager the first time it is asked for, so a worker only holds
+the collections its users actually use. Every collection shares the same
+selection, text fit and rendering code.
+
+Loaded collections are kept in LRU order under a memory budget
+(TRMNL_CORPUS_MEMORY_MB, default 256). When loading one goes over the
+budget, the least recently used collections are dropped along with their
+text fit entries, and they are loaded again if someone asks for them.
+A collection whose file changes keeps being served while the new version
+loads in the background.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from display_manager import QuoteDisplayManager
+from text_fit import fit_table
+
+logger = logging.getLogger(__name__)
+
+# Name of the collection stored in data/quotes.json
+DEFAULT_CORPUS = 'default'
+
+# Collection names: lowercase file-name-safe slugs
+CORPUS_NAME = re.compile(r'[a-z0-9][a-z0-9_-]{0,63}')
+
+# Loaded size of a collection relative to its JSON file (quotes, length
+# buckets, candidate pools, search index and fit entries), measured on
+# data/quotes.json
+MEMORY_PER_FILE_BYTE = 24
+
+# Seconds between checks for a changed collection file
+RELOAD_CHECK_INTERVAL = 5
+
+
+def valid_corpus_name(name: str) -> bool:
+    """Whether a collection name is usable as a file name"""
+    return bool(CORPUS_NAME.fullmatch(name or ''))
+
+
+class LoadedCorpus:
+    """A collection in memory and what it was loaded from"""
+
+    __slots__ = ('manager', 'mtime', 'size', 'checked_at')
+
+    def __init__(self, manager: QuoteDisplayManager, mtime: float, size: int):
+        self.manager = manager
+        self.mtime = mtime
+        self.size = size
+        self.checked_at = time.monotonic()
+
+    @property
+    def estimated_bytes(self) -> int:
+        return self.size * MEMORY_PER_FILE_BYTE
+
+
+class CorpusRegistry:
+    """
+    Lazily loaded collections in data/corpora, evicted LRU under a memory budget
+
+    The default collection isn't managed here (the server keeps it loaded
+    and current), but its quotes count as in use when evicting fit entries.
+    """
+
+    def __init__(self, corpora_dir: str = 'data/corpora', memory_budget: Optional[int] = None,
+                 pinned: Optional[Callable[[], QuoteDisplayManager]] = None,
+                 on_load: Optional[Callable[[str, QuoteDisplayManager], None]] = None):
+        """
+        Args:
+            corpora_dir: Directory holding <name>.json collections
+            memory_budget: Bytes the loaded collections may take (default
+                TRMNL_CORPUS_MEMORY_MB)
+            pinned: Returns the default collection's manager, whose texts keep
+                their fit entries
+            on_load: Called with each (re)loaded collection before it is
+                served, e.g. to warm its caches
+        """
+        self.corpora_dir = corpora_dir
+        self.memory_budget = memory_budget or int(float(os.environ.get('TRMNL_CORPUS_MEMORY_MB', 256)) * 1024 * 1024)
+        self.pinned = pinned
+        self.on_load = on_load
+        self.loaded: 'OrderedDict[str, LoadedCorpus]' = OrderedDict()
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+
+    def path(self, name: str) -> str:
+        """File a collection is stored in"""
+        return os.path.join(self.corpora_dir, f'{name}.json')
+
+    def names(self) -> List[str]:
+        """Every available collection, loaded or not (the default first)"""
+        try:
+            files = sorted(os.listdir(self.corpora_dir))
+        except FileNotFoundError:
+            files = []
+        return [DEFAULT_CORPUS] + [
+            file[:-5] for file in files
+            if file.endswith('.json') and valid_corpus_name(file[:-5]) and file[:-5] != DEFAULT_CORPUS
+        ]
+
+    def get(self, name: str) -> QuoteDisplayManager:
+        """
+        A collection's manager, loading it if needed
+
+        A loaded collection whose file changed is reloaded in the background
+        and served as it was until the new version is ready.
+
+        Raises:
+            KeyError: If there is no such collection
+        """
+        if not valid_corpus_name(name) or name == DEFAULT_CORPUS:
+            raise KeyError(name)
+
+        with self._lock:
+            corpus = self.loaded.get(name)
+            if corpus is not None:
+                self.loaded.move_to_end(name)
+                if time.monotonic() - corpus.checked_at < RELOAD_CHECK_INTERVAL:
+                    return corpus.manager
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        if corpus is None:
+            # One thread loads a collection while others asking for it wait
+            with load_lock:
+                return self._load(name)
+
+        try:
+            stat = os.stat(self.path(name))
+        except FileNotFoundError:
+            self.unload(name)
+            raise KeyError(name)
+        corpus.checked_at = time.monotonic()
+        if (corpus.mtime, corpus.size) != (stat.st_mtime, stat.st_size) and load_lock.acquire(blocking=False):
+            threading.Thread(target=self._reload, args=(name, load_lock), daemon=True).start()
+        return corpus.manager
+
+    def _reload(self, name: str, load_lock: threading.Lock):
+        """Reload a changed collection (holding its load lock)"""
+        try:
+            self._load(name)
+        except Exception as e:
+            # Keeps serving the loaded version; tried again at the next check
+            logger.warning("Could not reload corpus %s: %s", name, e)
+        finally:
+            load_lock.release()
+
+    def _load(self, name: str) -> QuoteDisplayManager:
+        """Load a collection unless it is loaded and current (holding its load lock)"""
+        try:
+            stat = os.stat(self.path(name))
+        except FileNotFoundError:
+            self.unload(name)
+            raise KeyError(name)
+
+        with self._lock:
+            corpus = self.loaded.get(name)
+            if corpus is not None and (corpus.mtime, corpus.size) == (stat.st_mtime, stat.st_size):
+                corpus.checked_at = time.monotonic()
+                return corpus.manager
+
+        manager = QuoteDisplayManager(self.path(name))
+        logger.info("Loaded corpus %s: %d quotes", name, len(manager.quotes))
+        if self.on_load:
+            self.on_load(name, manager)
+        with self._lock:
+            replaced = self.loaded.pop(name, None)
+            self.loaded[name] = LoadedCorpus(manager, stat.st_mtime, stat.st_size)
+            evicted = self._evict_over_budget(keep=name)
+        self._discard_fits(([replaced.manager] if replaced else []) + evicted)
+        return manager
+
+    def _evict_over_budget(self, keep: str) -> List[QuoteDisplayManager]:
+        """Drop least recently used collections until the rest fit the budget"""
+        evicted = []
+        while self.memory_used() > self.memory_budget and len(self.loaded) > 1:
+            name, corpus = next(iter(self.loaded.items()))
+            if name == keep:
+                self.loaded.move_to_end(name)
+                continue
+            del self.loaded[name]
+            evicted.append(corpus.manager)
+            self.evictions += 1
+            logger.info("Evicted corpus %s (%d quotes) to stay under the memory budget",
+                        name, len(corpus.manager.quotes))
+        return evicted
+
+    def _discard_fits(self, managers: List[QuoteDisplayManager]):
+        """Drop fit entries of unloaded managers' texts that no loaded collection uses"""
+        if not managers:
+            return
+        texts = {quote['text'] for manager in managers for quote in manager.quotes}
+        with self._lock:
+            in_use = [corpus.manager for corpus in self.loaded.values()]
+        for manager in in_use + ([self.pinned()] if self.pinned else []):
+            texts.difference_update(quote['text'] for quote in manager.quotes)
+        fit_table.discard(texts)
+
+    def unload(self, name: str):
+        """Forget a loaded collection (it is loaded again on next use)"""
+        with self._lock:
+            corpus = self.loaded.pop(name, None)
+        if corpus:
+            self._discard_fits([corpus.manager])
+
+    def memory_used(self) -> int:
+        """Estimated bytes held by loaded collections"""
+        return sum(corpus.estimated_bytes for corpus in self.loaded.values())
+
+    def stats(self) -> Dict:
+        """Loaded collections and memory use, for /corpora"""
+        with self._lock:
+            return {
+                'loaded': list(self.loaded),
+                'memory_used_mb': round(self.memory_used() / 1024 / 1024, 1),
+                'memory_budget_mb': round(self.memory_budget / 1024 / 1024, 1),
+                'evictions': self.evictions,
+            }
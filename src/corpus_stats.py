@@ -0,0 +1,202 @@
+"""
+Corpus Statistics
+Aggregates over the quote database, maintained as quotes are added or removed
+
+Every counter is keyed by something bounded (category, length in characters,
+newsletter date, ingestion day), so updates are O(1) per quote and a
+snapshot costs the same however many quotes there are. Snapshots are cached
+until the corpus changes (or the day rolls over, for ingestion rates).
+"""
+
+import re
+import threading
+import uuid
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, Optional
+
+# Category the 3-2-1 newsletter ideas are stored under
+NEWSLETTER_CATEGORY = '3-2-1-newsletter'
+
+# Width of the length histogram bins, in characters
+HISTOGRAM_BIN = 50
+
+# Percentiles reported for quote lengths
+PERCENTILES = (50, 90, 99)
+
+# Ingestion rate windows, in days (ending today)
+RATE_WINDOWS = (1, 7, 30)
+
+# Sources written by the scrapers: "3-2-1 Newsletter - 2024-01-04", "October 16, 2018"
+_ISO_DATE = re.compile(r'\b(\d{4}-\d{2}-\d{2})\b')
+_LONG_DATE = re.compile(r'\b([A-Z][a-z]+ \d{1,2}, \d{4})\b')
+
+
+def quote_date(quote: Dict) -> Optional[date]:
+    """Publication date of a quote, from its date field or its source"""
+    for value, pattern, fmt in (
+        (quote.get('date'), _ISO_DATE, '%Y-%m-%d'),
+        (quote.get('source'), _ISO_DATE, '%Y-%m-%d'),
+        (quote.get('source'), _LONG_DATE, '%B %d, %Y'),
+    ):
+        match = pattern.search(value) if isinstance(value, str) else None
+        if match:
+            try:
+                return datetime.strptime(match.group(1), fmt).date()
+            except ValueError:
+                continue
+    return None
+
+
+def ingestion_day(quote: Dict) -> Optional[str]:
+    """Day (YYYY-MM-DD) a quote was scraped or imported"""
+    scraped_at = quote.get('scraped_at')
+    return scraped_at[:10] if isinstance(scraped_at, str) and len(scraped_at) >= 10 else None
+
+
+class CorpusStats:
+    """
+    Counts per category, length bucket, exact length, newsletter date and
+    ingestion day
+
+    Args:
+        quotes: Initial quotes
+        length_bucket: Maps a length to its bucket name (the display
+            manager's length categories)
+    """
+
+    def __init__(self, quotes: Iterable[Dict] = (), length_bucket: Optional[Callable[[int], str]] = None):
+        self.length_bucket = length_bucket or (lambda length: 'all')
+        self.total = 0
+        self.by_category: Counter = Counter()
+        self.by_bucket: Counter = Counter()
+        self.lengths: Counter = Counter()
+        self.newsletter_dates: Counter = Counter()
+        self.newsletter_undated = 0
+        self.ingested: Counter = Counter()
+        self.version = 0
+        self._instance = uuid.uuid4().hex[:8]  # Tells apart versions of different loads
+        self._snapshot = None
+        self._snapshot_key = None
+        self._lock = threading.Lock()
+
+        for quote in quotes:
+            self._count(quote, 1)
+
+    @staticmethod
+    def _bump(counter: Counter, key, sign: int):
+        counter[key] += sign
+        if counter[key] <= 0:
+            del counter[key]  # Keep counters bounded by what is actually present
+
+    def _count(self, quote: Dict, sign: int):
+        length = quote.get('length', len(quote['text']))
+        category = quote.get('category', '')
+        self.total += sign
+        self._bump(self.by_category, category, sign)
+        self._bump(self.by_bucket, self.length_bucket(length), sign)
+        self._bump(self.lengths, length, sign)
+
+        if category == NEWSLETTER_CATEGORY:
+            published = quote_date(quote)
+            if published:
+                self._bump(self.newsletter_dates, published, sign)
+            else:
+                self.newsletter_undated += sign
+
+        day = ingestion_day(quote)
+        if day:
+            self._bump(self.ingested, day, sign)
+        self.version += 1
+
+    def add(self, quote: Dict):
+        """Count a newly added quote"""
+        with self._lock:
+            self._count(quote, 1)
+
+    def remove(self, quote: Dict):
+        """Stop counting a removed quote"""
+        with self._lock:
+            self._count(quote, -1)
+
+    def length_summary(self) -> Dict:
+        """Min, max, mean, percentiles and a histogram of quote lengths"""
+        if not self.total:
+            return {}
+
+        ordered = sorted(self.lengths)
+        targets = [(p, max(1, -(-self.total * p // 100))) for p in PERCENTILES]
+        percentiles = {}
+        seen = 0
+        for length in ordered:
+            seen += self.lengths[length]
+            while targets and seen >= targets[0][1]:
+                percentiles[f'p{targets.pop(0)[0]}'] = length
+
+        histogram = Counter()
+        for length in ordered:
+            histogram[length // HISTOGRAM_BIN * HISTOGRAM_BIN] += self.lengths[length]
+
+        return {
+            'min': ordered[0],
+            'max': ordered[-1],
+            'mean': round(sum(length * count for length, count in self.lengths.items()) / self.total, 1),
+            **percentiles,
+            'histogram': [
+                {'from': start, 'to': start + HISTOGRAM_BIN - 1, 'count': histogram[start]}
+                for start in sorted(histogram)
+            ],
+        }
+
+    def newsletter_coverage(self) -> Dict:
+        """Which weekly newsletter issues (Thursdays) have ideas in the database"""
+        dates = sorted(self.newsletter_dates)
+        coverage = {
+            'quotes': self.by_category.get(NEWSLETTER_CATEGORY, 0),
+            'undated': self.newsletter_undated,
+            'issues': len(dates),
+        }
+        if dates:
+            # Issues are weekly, so every week between the first and last should have one
+            expected = (dates[-1] - dates[0]).days // 7 + 1
+            coverage.update({
+                'first': dates[0].isoformat(),
+                'last': dates[-1].isoformat(),
+                'expected_issues': expected,
+                'missing_issues': max(0, expected - len(dates)),
+            })
+        return coverage
+
+    def ingestion_rates(self, today: date) -> Dict:
+        """Quotes added in the last 1, 7 and 30 days (by scraped_at day)"""
+        rates = {}
+        for days in RATE_WINDOWS:
+            window = [(today - timedelta(days=offset)).isoformat() for offset in range(days)]
+            rates[f'last_{days}d'] = sum(self.ingested.get(day, 0) for day in window)
+        if self.ingested:
+            rates['last_ingested'] = max(self.ingested)
+        return rates
+
+    def etag(self, today: Optional[date] = None) -> str:
+        """ETag of the snapshot: changes whenever the snapshot would"""
+        return f"{self._instance}-{self.version}-{(today or date.today()).isoformat()}"
+
+    def snapshot(self, today: Optional[date] = None) -> Dict:
+        """
+        Every aggregate as a dict, cached until the corpus changes or the day
+        rolls over
+        """
+        today = today or date.today()
+        with self._lock:
+            key = (self.version, today)
+            if key != self._snapshot_key:
+                self._snapshot = {
+                    'total_quotes': self.total,
+                    'by_category': dict(sorted(self.by_category.items())),
+                    'by_length': dict(self.by_bucket),
+                    'length': self.length_summary(),
+                    'newsletter': self.newsletter_coverage(),
+                    'ingestion': self.ingestion_rates(today),
+                }
+                self._snapshot_key = key
+            return self._snapshot
@@ -0,0 +1,361 @@
+"""
+Corpus Tool
+Maintenance commands for a quotes database
+
+Commands:
+- build-index: Length buckets, the candidate pool of every layout and device
+  profile, and the search index, saved next to the file as <name>.index.json.
+  The server loads them from there instead of computing them in every worker
+- compact: Fold old generations of the change log (<name>.changes.ndjson)
+  into one base generation, dropping removed records (see corpus_export.py)
+- verify: Schema, length field, duplicate and change log checks
+- bench: Selection, formatting and rendering micro-benchmarks on the data
+
+Records are read from the file one at a time, so build-index, compact and
+verify use memory for their indexes only, not for the whole file. bench
+loads the collection the way the server does.
+
+Usage:
+    python src/corpus_tool.py build-index
+    python src/corpus_tool.py compact --keep 10
+    python src/corpus_tool.py verify --near
+    python src/corpus_tool.py bench --corpus books    # data/corpora/books.json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+# Add src directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bitmap_renderer import is_available, render_quote
+from canonicalize import canonical_text, canonicalize_quote, leftovers
+from corpus_export import CorpusExport
+from corpus_registry import DEFAULT_CORPUS, valid_corpus_name
+from dedup import NearDuplicateIndex, normalize_words
+from display_manager import DEVICE_PROFILES, INDEX_VERSION, QuoteDisplayManager, index_path
+from ingest import MIN_TEXT_LENGTH
+from search_index import QuoteSearchIndex
+from text_fit import FONT_RANGES
+
+# Bytes read from the quotes file at a time
+CHUNK_SIZE = 1024 * 1024
+
+# Device profiles and layouts bench measures
+BENCH_PROFILES = [(800, 480), (1872, 1404)]
+BENCH_LAYOUTS = ['full', 'half_vertical', 'half_horizontal', 'quadrant']
+
+
+def iter_quotes(path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[Dict]:
+    """
+    Records of a quotes file (a JSON array), one at a time
+
+    Raises:
+        ValueError: If the file isn't a JSON array
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer, pos, eof = '', 0, False
+        started = False
+        while True:
+            # Skip whitespace and separators, reading more as needed
+            while True:
+                while pos < len(buffer) and (buffer[pos].isspace() or (started and buffer[pos] == ',')):
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    break
+                buffer, pos = f.read(chunk_size), 0
+                eof = not buffer
+
+            if not started:
+                if buffer[pos:pos + 1] != '[':
+                    raise ValueError(f"{path} is not a JSON array")
+                started = True
+                pos += 1
+                continue
+            if pos >= len(buffer):
+                raise ValueError(f"{path} ends before the closing ]")
+            if buffer[pos] == ']':
+                return
+
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+                complete = end < len(buffer) or eof
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                complete = False
+            if not complete:
+                # The record runs past what has been read so far
+                more = f.read(chunk_size)
+                eof = not more
+                buffer, pos = buffer[pos:] + more, 0
+                continue
+
+            yield record
+            pos = end
+
+
+def file_digest(path: str) -> str:
+    """Digest of a quotes file, as QuoteDisplayManager computes it when loading"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()[:32]
+
+
+def index_is_current(path: str) -> bool:
+    """Whether the saved index matches the quotes file and this build's fit metrics"""
+    try:
+        with open(index_path(path), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return False
+    return (index.get('digest') == file_digest(path)
+            and index.get('signature') == QuoteDisplayManager.index_signature())
+
+
+def build_index(path: str) -> Dict:
+    """
+    What QuoteDisplayManager would otherwise build at load or on first use:
+    quote ids (positions, as the server numbers them) per length bucket and
+    in the pool for all categories of each layout and device profile, and
+    the search index
+    """
+    digest = file_digest(path)
+    by_length: Dict[str, List[int]] = defaultdict(list)
+    pools = {(layout, width, height): [] for width, height in DEVICE_PROFILES for layout in FONT_RANGES}
+    search = QuoteSearchIndex()
+
+    count = 0
+    for quote_id, quote in enumerate(iter_quotes(path)):
+        count += 1
+        # Loaded quotes are canonicalized, so index the canonical text
+        quote = canonicalize_quote(quote)
+        by_length[QuoteDisplayManager.length_bucket(quote['length'])].append(quote_id)
+        search.add(quote_id, quote['text'])
+        for (layout, width, height), quote_ids in pools.items():
+            if QuoteDisplayManager.fits_layout(quote, layout, width, height):
+                quote_ids.append(quote_id)
+
+    if file_digest(path) != digest:
+        raise SystemExit(f"{path} changed while it was being indexed; run build-index again")
+
+    return {
+        'version': INDEX_VERSION,
+        'file': os.path.basename(path),
+        'digest': digest,
+        'signature': QuoteDisplayManager.index_signature(),
+        'built_at': datetime.now().isoformat(),
+        'quotes': count,
+        'length_buckets': dict(by_length),
+        'pools': [[layout, width, height, quote_ids] for (layout, width, height), quote_ids in pools.items()],
+        'search': search.to_dict(),
+    }
+
+
+def verify(path: str, near: bool = False) -> Dict[str, List[str]]:
+    """
+    Check a quotes file record by record
+
+    Returns:
+        Problem descriptions by check (empty if the file passed)
+    """
+    problems: Dict[str, List[str]] = defaultdict(list)
+    seen: Dict[bytes, int] = {}
+    near_index = NearDuplicateIndex() if near else None
+    count = 0
+
+    try:
+        for quote_id, quote in enumerate(iter_quotes(path)):
+            count += 1
+            if not isinstance(quote, dict):
+                problems['schema'].append(f"#{quote_id}: not an object")
+                continue
+            text = quote.get('text')
+            if not isinstance(text, str) or not text.strip():
+                problems['schema'].append(f"#{quote_id}: missing text")
+                continue
+            for field in ('category', 'source', 'scraped_at', 'date'):
+                if field in quote and not isinstance(quote[field], str):
+                    problems['schema'].append(f"#{quote_id}: {field} is not a string")
+            if not quote.get('category'):
+                problems['schema'].append(f"#{quote_id}: missing category")
+            for field in ('scraped_at', 'date'):
+                try:
+                    if isinstance(quote.get(field), str):
+                        datetime.fromisoformat(quote[field])
+                except ValueError:
+                    problems['schema'].append(f"#{quote_id}: {field} {quote[field]!r} is not an ISO date")
+
+            canonical = canonical_text(text)
+            if canonical != text:
+                problems['canonical'].append(f"#{quote_id}: text is not canonical (src/canonicalize.py --apply)")
+            for leftover in leftovers(text):
+                problems['leftovers'].append(f"#{quote_id}: {leftover} (src/canonicalize.py --apply)")
+            if len(canonical) < MIN_TEXT_LENGTH:
+                problems['schema'].append(f"#{quote_id}: text is shorter than {MIN_TEXT_LENGTH} characters")
+            if quote.get('length') != len(text):
+                problems['length'].append(f"#{quote_id}: length {quote.get('length')!r}, text has {len(text)}")
+
+            key = hashlib.blake2b(' '.join(normalize_words(text)).encode('utf-8'), digest_size=16).digest()
+            if key in seen:
+                problems['duplicates'].append(f"#{quote_id}: duplicate of #{seen[key]}")
+                continue
+            seen[key] = quote_id
+            if near_index is not None:
+                original = near_index.find_duplicate(text)
+                if original is not None:
+                    problems['duplicates'].append(f"#{quote_id}: near-duplicate of #{original} (src/dedup.py)")
+                else:
+                    near_index.add(quote_id, text)
+    except ValueError as e:
+        problems['schema'].append(f"unreadable after #{count}: {e}")
+
+    if os.path.exists(index_path(path)) and not index_is_current(path):
+        problems['index'].append(f"{index_path(path)} is out of date (run build-index)")
+
+    export = CorpusExport(path)
+    if os.path.exists(export.changes_file):
+        previous = 0
+        with open(export.changes_file, 'r', encoding='utf-8') as log:
+            for line_number, line in enumerate(log, 1):
+                try:
+                    entry = json.loads(line)
+                    generation = entry['generation']
+                    if entry['op'] not in ('generation', 'add', 'remove') or generation < previous:
+                        raise ValueError(f"unexpected {entry['op']} in generation {generation}")
+                    previous = generation
+                except (ValueError, KeyError, TypeError) as e:
+                    problems['change_log'].append(f"{export.changes_file}:{line_number}: {e}")
+
+    print(f"Checked {count} quotes in {path}")
+    return dict(problems)
+
+
+def timed(func, iterations: int) -> float:
+    """Mean microseconds per call"""
+    started = time.perf_counter()
+    for i in range(iterations):
+        func(i)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def bench(path: str, iterations: int, render: bool) -> List[Dict]:
+    """Time loading, candidate pools, selection, formatting and rendering"""
+    started = time.perf_counter()
+    manager = QuoteDisplayManager(path)
+    results = [{'step': 'load', 'quotes': len(manager.quotes),
+                'ms': round((time.perf_counter() - started) * 1000, 1)}]
+    if not manager.quotes:
+        return results
+
+    minute = int(time.time() / 60)
+    for width, height in BENCH_PROFILES:
+        for layout in BENCH_LAYOUTS:
+            started = time.perf_counter()
+            pool = manager.candidate_pool(layout, width, height)
+            result = {
+                'step': f'{layout} {width}x{height}',
+                'pool': len(pool),
+                'pool_ms': round((time.perf_counter() - started) * 1000, 1),
+            }
+            if pool:
+                pick = lambda i: manager.pick_quote_for_user(layout, f'bench-{i}', width, height, minute=minute + i)
+                result['select_us'] = round(timed(pick, iterations), 1)
+                quotes = [pick(i) for i in range(min(iterations, 100))]
+                result['format_us'] = round(timed(
+                    lambda i: manager.format_for_display(quotes[i % len(quotes)], layout, width, height),
+                    iterations), 1)
+                if render:
+                    result['render_ms'] = round(timed(
+                        lambda i: render_quote(quotes[i % len(quotes)]['text'], layout, width, height),
+                        max(iterations // 100, 5)) / 1000, 2)
+            results.append(result)
+    return results
+
+
+def quotes_path(args) -> str:
+    """Quotes file a command works on"""
+    if args.file:
+        return args.file
+    if args.corpus in ('', DEFAULT_CORPUS):
+        return 'data/quotes.json'
+    if not valid_corpus_name(args.corpus):
+        raise SystemExit(f"Invalid corpus name: {args.corpus}")
+    return os.path.join('data/corpora', f'{args.corpus}.json')
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Maintenance commands for a quotes database')
+    parser.add_argument('--corpus', default='', help='Collection in data/corpora (default data/quotes.json)')
+    parser.add_argument('--file', help='Quotes file to work on instead of a collection')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    index_parser = commands.add_parser('build-index', help='Save length buckets, candidate pools and search index')
+    index_parser.add_argument('--force', action='store_true', help='Rebuild even if the index is current')
+    compact_parser = commands.add_parser('compact', help='Fold old change log generations into a base')
+    compact_parser.add_argument('--keep', type=int, default=10, help='Latest generations to keep as they are')
+    verify_parser = commands.add_parser('verify', help='Check schema, length fields, duplicates and change log')
+    verify_parser.add_argument('--near', action='store_true', help='Also look for near-duplicates (slower)')
+    verify_parser.add_argument('--limit', type=int, default=10, help='Problems to list per check')
+    bench_parser = commands.add_parser('bench', help='Time selection and rendering on the data')
+    bench_parser.add_argument('--iterations', type=int, default=2000, help='Selections timed per layout')
+    bench_parser.add_argument('--no-render', action='store_true', help='Skip bitmap rendering')
+    bench_parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args(argv)
+
+    path = quotes_path(args)
+    if not os.path.exists(path):
+        raise SystemExit(f"{path} not found")
+
+    if args.command == 'build-index':
+        if not args.force and index_is_current(path):
+            print(f"{index_path(path)} is up to date")
+            return
+        index = build_index(path)
+        temp_file = index_path(path) + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temp_file, index_path(path))
+        buckets = ', '.join(f"{name} {len(ids)}" for name, ids in index['length_buckets'].items())
+        print(f"Indexed {index['quotes']} quotes ({buckets}) in {len(index['pools'])} pools")
+        print(f"Saved {index_path(path)}")
+
+    elif args.command == 'compact':
+        export = CorpusExport(path)
+        if not os.path.exists(export.changes_file):
+            print(f"No change log for {path}")
+            return
+        result = export.compact(args.keep)
+        print(f"{export.changes_file}: base generation {result['base']}, "
+              f"{result['lines_before']} -> {result['lines_after']} lines")
+
+    elif args.command == 'verify':
+        problems = verify(path, args.near)
+        for check, found in problems.items():
+            print(f"{check}: {len(found)} problem(s)")
+            for problem in found[:args.limit]:
+                print(f"  {problem}")
+        if problems:
+            sys.exit(1)
+        print("OK")
+
+    elif args.command == 'bench':
+        results = bench(path, args.iterations, not args.no_render and is_available())
+        if args.json:
+            print(json.dumps(results, indent=2))
+            return
+        for result in results:
+            print('  '.join(f"{key}={value}" for key, value in result.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+"""
+Near-Duplicate Detection
+Finds quotes that differ only in punctuation, quote marks or scraper leftovers
+
+The same idea often appears both on the website quote pages and in the
+3-2-1 newsletter archive with slightly different punctuation, so exact text
+comparison misses it. Each quote is reduced to word shingles, summarized with
+MinHash, and bucketed with LSH so a lookup only compares against a handful
+of candidates instead of the whole database.
+
+Run directly to clean up an existing database:
+    python src/dedup.py                # report duplicate groups
+    python src/dedup.py --apply        # drop duplicates from data/quotes.json
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import re
+import zlib
+from typing import Dict, Hashable, List, Optional, Set
+
+from canonicalize import canonical_text
+
+
+# Mersenne prime used for the MinHash permutations
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def normalize_words(text: str) -> List[str]:
+    """
+    Reduce a quote to lowercase words for matching
+
+    Works on the canonical text (see canonicalize.py), ignoring case, quote
+    marks and punctuation
+    """
+    return re.findall(r'\w+', canonical_text(text).lower())
+
+
+def shingles(text: str, size: int = 3) -> Set[str]:
+    """Set of overlapping word n-grams (the whole text if it is shorter)"""
+    words = normalize_words(text)
+    if len(words) <= size:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    """Jaccard similarity of two shingle sets"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class NearDuplicateIndex:
+    """
+    MinHash/LSH index over quote texts
+
+    Candidates come from LSH band collisions and are confirmed with the
+    exact shingle Jaccard similarity, so results have no false positives.
+    With the defaults (32 hashes in 8 bands of 4) a pair at 0.8 similarity
+    collides in at least one band ~98% of the time.
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 32, bands: int = 8, shingle_size: int = 3):
+        """
+        Args:
+            threshold: Minimum Jaccard similarity to count as a duplicate
+            num_perm: Number of MinHash functions
+            bands: Number of LSH bands (must divide num_perm)
+            shingle_size: Words per shingle
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        # Fixed seed so signatures are comparable across runs
+        rng = random.Random(1)
+        self._perms = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+        self.buckets: List[Dict[tuple, List[Hashable]]] = [{} for _ in range(bands)]
+        self.shingle_sets: Dict[Hashable, Set[str]] = {}
+
+    @classmethod
+    def from_quotes(cls, quotes: List[Dict], **kwargs) -> 'NearDuplicateIndex':
+        """Build an index over quote dicts, keyed by their position in the list"""
+        index = cls(**kwargs)
+        for i, quote in enumerate(quotes):
+            index.add(i, quote['text'])
+        return index
+
+    def signature(self, shingle_set: Set[str]) -> List[int]:
+        """MinHash signature of a shingle set"""
+        hashes = [zlib.crc32(s.encode('utf-8')) for s in shingle_set]
+        return [
+            min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+            for a, b in self._perms
+        ]
+
+    def _band_keys(self, signature: List[int]) -> List[tuple]:
+        return [tuple(signature[band * self.rows:(band + 1) * self.rows]) for band in range(self.bands)]
+
+    def add(self, key: Hashable, text: str):
+        """Add a quote to the index"""
+        shingle_set = shingles(text, self.shingle_size)
+        if not shingle_set:
+            return
+
+        self.shingle_sets[key] = shingle_set
+        for band, band_key in enumerate(self._band_keys(self.signature(shingle_set))):
+            self.buckets[band].setdefault(band_key, []).append(key)
+
+    def query(self, text: str) -> List[Hashable]:
+        """Keys of indexed quotes that are near-duplicates of text, most similar first"""
+        shingle_set = shingles(text, self.shingle_size)
+        if not shingle_set:
+            return []
+
+        candidates = set()
+        for band, band_key in enumerate(self._band_keys(self.signature(shingle_set))):
+            candidates.update(self.buckets[band].get(band_key, ()))
+
+        scored = [(jaccard(shingle_set, self.shingle_sets[key]), key) for key in candidates]
+        matches = [(score, key) for score, key in scored if score >= self.threshold]
+        matches.sort(key=lambda match: -match[0])
+        return [key for _, key in matches]
+
+    def find_duplicate(self, text: str) -> Optional[Hashable]:
+        """Key of the closest near-duplicate of text, or None"""
+        matches = self.query(text)
+        return matches[0] if matches else None
+
+
+def find_duplicate_groups(quotes: List[Dict], threshold: float = 0.8) -> List[List[int]]:
+    """
+    Group near-duplicate quotes
+
+    Returns lists of positions in quotes; the first position in each group
+    is the earliest occurrence, which is the one to keep
+    """
+    index = NearDuplicateIndex(threshold=threshold)
+    groups: Dict[int, List[int]] = {}
+
+    for i, quote in enumerate(quotes):
+        original = index.find_duplicate(quote['text'])
+        if original is None:
+            index.add(i, quote['text'])
+        else:
+            groups.setdefault(original, [original]).append(i)
+
+    return list(groups.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Find and remove near-duplicate quotes')
+    parser.add_argument('--file', default='data/quotes.json', help='Quotes database to clean up')
+    parser.add_argument('--threshold', type=float, default=0.8, help='Minimum similarity (0-1)')
+    parser.add_argument('--apply', action='store_true', help='Rewrite the file without the duplicates')
+    args = parser.parse_args()
+
+    # ingest imports this module, so its lock is imported here
+    from ingest import locked
+
+    # Hold the writers' lock from read to rewrite so a concurrent ingest isn't lost
+    with locked(args.file) if args.apply else contextlib.nullcontext():
+        with open(args.file, 'r', encoding='utf-8') as f:
+            quotes = json.load(f)
+
+        groups = find_duplicate_groups(quotes, args.threshold)
+        duplicates = {i for group in groups for i in group[1:]}
+
+        for group in groups:
+            keep = quotes[group[0]]
+            print(f"KEEP [{keep.get('category', '')}] {keep['text'][:90]}")
+            for i in group[1:]:
+                print(f"  DROP [{quotes[i].get('category', '')}] {quotes[i]['text'][:90]}")
+
+        print(f"\nFound {len(groups)} groups, {len(duplicates)} duplicates in {len(quotes)} quotes")
+
+        if args.apply and duplicates:
+            kept = [quote for i, quote in enumerate(quotes) if i not in duplicates]
+            temp_file = args.file + '.tmp'
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(kept, f, indent=2, ensure_ascii=False)
+            os.replace(temp_file, args.file)
+            print(f"Saved {len(kept)} quotes to {args.file}")
+        elif duplicates:
+            print("Dry run. Re-run with --apply to remove them.")
+
+
+if __name__ == '__main__':
+    main()
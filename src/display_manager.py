@@ -3,32 +3,219 @@ Quote Display Manager
 Handles smart display of quotes based on length and e-ink constraints
 """
 
+import hashlib
 import json
-from typing import List, Dict, Optional
+import logging
+import os
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import List, Dict, Iterable, Optional, Tuple
 import random
+import threading
 from datetime import datetime
 
+from canonicalize import canonical_key, canonicalize_quote
+from category_weights import AliasTable, normalize_weights
+from corpus_stats import CorpusStats
+from search_index import QuoteSearchIndex
+from user_store import advance_history, to_bitmap
+from text_fit import DEFAULT_HEIGHT, DEFAULT_WIDTH, fit_table, metrics_signature
+
+logger = logging.getLogger(__name__)
+
+
+def _mix(value: int) -> int:
+    """32-bit integer hash (murmur3 finalizer)"""
+    value ^= value >> 16
+    value = (value * 0x85ebca6b) & 0xFFFFFFFF
+    value ^= value >> 13
+    value = (value * 0xc2b2ae35) & 0xFFFFFFFF
+    return value ^ (value >> 16)
+
+
+class Permutation:
+    """
+    Pseudorandom permutation of range(size) chosen by seed
+
+    A 4-round Feistel network over the smallest even-bit domain covering
+    size, cycle-walking until the result lands in range. Any one position
+    costs O(1), so selecting a quote never shuffles the whole pool.
+    """
+
+    __slots__ = ('size', 'half_bits', 'mask', 'round_keys')
+
+    def __init__(self, seed: int, size: int):
+        self.size = size
+        self.half_bits = max(1, ((size - 1).bit_length() + 1) // 2)
+        self.mask = (1 << self.half_bits) - 1
+        self.round_keys = [_mix(seed + round_number) for round_number in range(4)]
+
+    def __getitem__(self, index: int) -> int:
+        half_bits, mask = self.half_bits, self.mask
+        value = index
+        while True:
+            left, right = value >> half_bits, value & mask
+            for round_key in self.round_keys:
+                left, right = right, left ^ (_mix(right ^ round_key) & mask)
+            value = (left << half_bits) | right
+            if value < self.size:
+                return value
+
+
+def ingestion_minute(quote: Dict) -> int:
+    """Minute since epoch a quote was added (its scraped_at), 0 if unknown"""
+    try:
+        return int(datetime.fromisoformat(quote['scraped_at']).timestamp() // 60)
+    except (KeyError, TypeError, ValueError, OverflowError, OSError):
+        return 0
+
+
+class RotationPlan:
+    """
+    Where a pool's rotation cycles start, anchored to when its quotes were added
+
+    A cycle shows each quote in the pool once, one per minute, in a per-user
+    shuffled order; it is as long as the pool was when it started. The pool
+    is ordered by ingestion minute, and cycles are laid out from the minute
+    its first quotes were added. Quotes added during a cycle are appended to
+    it as a layer of their own, shuffled among themselves, so positions the
+    cycle has already given out stay the same; the next cycle starts after
+    them and shuffles the whole pool.
+
+    Everything is derived from the quotes' scraped_at, so every worker and
+    replica agrees, and the cycle for a minute doesn't change when quotes are
+    added after it.
+    """
+
+    __slots__ = ('starts', 'layers')
+
+    def __init__(self, ingested: List[int]):
+        """
+        Args:
+            ingested: Ingestion minute of each quote in the pool, ascending
+        """
+        # Per segment: start of its first cycle, and the pool size at the
+        # end of each layer of that cycle. Later cycles in the segment are
+        # a single layer of the final size.
+        self.starts: List[int] = []
+        self.layers: List[List[int]] = []
+        for position, minute in enumerate(ingested):
+            if position + 1 < len(ingested) and ingested[position + 1] == minute:
+                continue
+            size = position + 1
+            if not self.starts:
+                self.starts.append(minute)
+                self.layers.append([size])
+                continue
+            start, layers = self.starts[-1], self.layers[-1]
+            if minute < start + layers[-1]:
+                layers.append(size)
+            else:
+                # A new segment from the cycle the quotes arrived in; its
+                # first layer matches what that cycle was before they did
+                start += (minute - start) // layers[-1] * layers[-1]
+                self.starts.append(start)
+                self.layers.append([layers[-1], size])
+
+    def cycle(self, minute: int) -> Tuple[int, List[int], int]:
+        """(cycle start, layer sizes ending each layer, position) at a minute"""
+        segment = max(bisect_right(self.starts, minute) - 1, 0)
+        start, layers = self.starts[segment], self.layers[segment]
+        offset = minute - start
+        if 0 <= offset < layers[-1]:
+            return start, layers, offset
+        length = layers[-1]
+        return start + offset // length * length, [length], offset % length
+
+
+class RotationCycle:
+    """One user's order for one cycle: position -> index in the pool"""
+
+    __slots__ = ('layers', 'orders')
+
+    def __init__(self, layers: List[int], orders: List[Permutation]):
+        self.layers = layers
+        self.orders = orders
+
+    def __len__(self) -> int:
+        return self.layers[-1]
+
+    def __getitem__(self, position: int) -> int:
+        previous = 0
+        for end, order in zip(self.layers, self.orders):
+            if position < end:
+                return previous + order[position - previous]
+            previous = end
+        raise IndexError(position)
+
+
+# Device size classes (width, height). Candidate pools and fits are built
+# per class, so any reported size maps onto one of a few of each.
+DEVICE_PROFILES = [
+    (100, 100),
+    (400, 300), (300, 400),
+    (600, 448), (448, 600),
+    (800, 480), (480, 800),
+    (800, 600), (600, 800),
+    (1024, 758), (758, 1024),
+    (1448, 1072), (1072, 1448),
+    (1872, 1404), (1404, 1872),
+]
+
+
+def device_profile(width, height) -> Tuple[int, int]:
+    """
+    Device size class (width, height) for reported dimensions: the largest
+    class that fits within them, so text sized for it fits the device too
+    """
+    def dimension(value, default):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return default
+
+    width, height = dimension(width, DEFAULT_WIDTH), dimension(height, DEFAULT_HEIGHT)
+    fitting = [(w * h, (w, h)) for w, h in DEVICE_PROFILES if w <= width and h <= height]
+    return max(fitting)[1] if fitting else DEVICE_PROFILES[0]
+
+
+# Format of the prebuilt index written by corpus_tool build-index
+INDEX_VERSION = 1
+
+
+def index_path(quotes_file: str) -> str:
+    """Prebuilt index for a quotes file (see corpus_tool build-index)"""
+    return os.path.splitext(quotes_file)[0] + '.index.json'
+
 
 class QuoteDisplayManager:
     """
     Manages quote selection and formatting for e-ink display
     
     TRMNL standard display: 800x480 pixels
-    Approximate character limits by layout:
-    - Full screen: ~500 characters (ideal: 200-400)
-    - Half vertical: ~250 characters (ideal: 100-200)
-    - Half horizontal: ~250 characters (ideal: 100-200)
-    - Quadrant: ~150 characters (ideal: 50-100)
+    Font size and truncation for each layout come from the text fit table
+    (see text_fit.py), computed from real font metrics when quotes are loaded
+
+    Candidate pools are built per (categories, layout, device profile) on
+    first use and kept in a bounded LRU, so a request only indexes a list.
+    A pool is never changed once built; add_quotes swaps in a new one
+
+    If corpus_tool build-index has saved an index for the file, the length
+    buckets, the pools of every device profile and the search index are
+    loaded from it instead of being computed
     """
-    
-    # Character limits for different layouts
-    LIMITS = {
-        'full': {'min': 0, 'ideal_max': 800, 'absolute_max': 1200},  # Allow longer quotes
-        'half_vertical': {'min': 0, 'ideal_max': 200, 'absolute_max': 300},
-        'half_horizontal': {'min': 0, 'ideal_max': 200, 'absolute_max': 300},
-        'quadrant': {'min': 0, 'ideal_max': 100, 'absolute_max': 150},
+
+    # Smallest fitted font size at which a quote counts as sized for a layout.
+    # The full layout takes every quote.
+    POOL_MIN_FONT_SIZE = {
+        'half_vertical': 24,
+        'half_horizontal': 20,
+        'quadrant': 28,
     }
 
+    # Number of candidate pools (and weighted category samplers) kept
+    MAX_POOLS = 128
+
     def __init__(self, quotes_file: str = 'data/quotes.json'):
         """
         Initialize with quotes database
@@ -38,19 +225,61 @@ class QuoteDisplayManager:
         """
         self.quotes_file = quotes_file
         self.quotes = self.load_quotes(quotes_file)
+        self._lock = threading.RLock()
         self.categorize_by_length()
 
     def load_quotes(self, filename: str) -> List[Dict]:
-        """Load quotes from JSON file"""
+        """Load quotes from JSON file, canonicalizing records saved by older versions"""
+        self.digest = None
         try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            with open(filename, 'rb') as f:
+                data = f.read()
         except FileNotFoundError:
-            print(f"Quote file {filename} not found")
+            logger.warning("Quote file %s not found", filename)
             return []
+        # A prebuilt index is only used for the file it was built from
+        self.digest = hashlib.sha256(data).hexdigest()[:32]
+        return [canonicalize_quote(quote) for quote in json.loads(data)]
+
+    @classmethod
+    def index_signature(cls) -> str:
+        """What a prebuilt index depends on besides the quotes: font metrics, pool rules, profiles"""
+        payload = json.dumps([INDEX_VERSION, metrics_signature(), cls.POOL_MIN_FONT_SIZE, DEVICE_PROFILES])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+    def load_index(self) -> Optional[Dict]:
+        """The prebuilt index of the loaded file, if there is one and it is current"""
+        path = index_path(self.quotes_file)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            logger.warning("Ignoring unreadable index %s: %s", path, e)
+            return None
+
+        if index.get('digest') != self.digest or index.get('signature') != self.index_signature():
+            logger.info("Index %s is out of date; building pools as needed (run corpus_tool.py build-index)",
+                        path)
+            return None
+        return index
+
+    @staticmethod
+    def length_bucket(length: int) -> str:
+        """Name of the length category a quote of this length belongs to"""
+        if length < 100:
+            return 'short'
+        elif length < 250:
+            return 'medium'
+        elif length < 500:
+            return 'long'
+        return 'very_long'
 
     def categorize_by_length(self):
         """Categorize quotes by length for efficient selection"""
+        index = self.load_index() if self.quotes else None
+
         self.by_length = {
             'short': [],      # < 100 chars
             'medium': [],     # 100-250 chars
@@ -58,17 +287,311 @@ class QuoteDisplayManager:
             'very_long': [],  # > 500 chars
         }
 
+        if index:
+            for bucket, quote_ids in index['length_buckets'].items():
+                self.by_length[bucket] = [self.quotes[quote_id] for quote_id in quote_ids]
+        else:
+            for quote in self.quotes:
+                length = quote.get('length', len(quote['text']))
+                self.by_length[self.length_bucket(length)].append(quote)
+
+        # Quote ids are positions in self.quotes (pools hold the same dicts)
+        self._quote_ids = {id(quote): i for i, quote in enumerate(self.quotes)}
+
+        # Stable keys (canonical_key) by quote id, and the quote ids of each
+        # key as a bitmap, for storing user history that survives edits to the file
+        self._keys: List[int] = []
+        self._key_bits: Dict[int, int] = {}
         for quote in self.quotes:
-            length = quote.get('length', len(quote['text']))
-
-            if length < 100:
-                self.by_length['short'].append(quote)
-            elif length < 250:
-                self.by_length['medium'].append(quote)
-            elif length < 500:
-                self.by_length['long'].append(quote)
+            self._add_key(quote)
+
+        # Rotation cycles are anchored to when quotes were added
+        self._ingested = {id(quote): ingestion_minute(quote) for quote in self.quotes}
+
+        # Aggregates for /stats, kept current by add_quotes
+        self.stats = CorpusStats(self.quotes, self.length_bucket)
+
+        # Size every quote for the standard display up front (the index
+        # has the pools; fits of the quotes shown are computed as needed)
+        if not index:
+            fit_table.precompute([quote['text'] for quote in self.quotes])
+
+        # Full-text index is built on first search, then kept current by add_quotes
+        self._search_index = QuoteSearchIndex.from_dict(index['search']) if index else None
+
+        # (categories, layout, width, height) -> candidate quotes, least recently used first
+        self._pools: 'OrderedDict[tuple, List[Dict]]' = OrderedDict()
+        if index:
+            for layout, width, height, quote_ids in index['pools']:
+                self._pools[(None, layout, width, height)] = sorted(
+                    (self.quotes[quote_id] for quote_id in quote_ids),
+                    key=lambda quote: self._ingested[id(quote)])
+
+        # (weight spec, layout, width, height) -> (alias table, categories, pools)
+        self._samplers: 'OrderedDict[tuple, tuple]' = OrderedDict()
+
+        # id(pool) -> (pool, bitmap of the pool's quote ids)
+        self._pool_bitmaps: Dict[int, Tuple[List[Dict], int]] = {}
+
+        # id(pool) -> (pool, rotation plan)
+        self._plans: Dict[int, Tuple[List[Dict], RotationPlan]] = {}
+
+        # Keys of pools being built -> set once the pool is in _pools
+        self._building: Dict[tuple, threading.Event] = {}
+
+        # Bumped by add_quotes, so samplers built from older pools aren't cached
+        self._version = 0
+
+    def quote_id(self, quote: Dict) -> int:
+        """Id of a loaded quote: its position in the database"""
+        return self._quote_ids[id(quote)]
+
+    def _add_key(self, quote: Dict):
+        key = canonical_key(quote['text'])
+        self._key_bits[key] = self._key_bits.get(key, 0) | 1 << len(self._keys)
+        self._keys.append(key)
+
+    def bitmap_of_keys(self, keys: Iterable[int]) -> Tuple[int, List[int]]:
+        """Bitmap of the quote ids with these stable keys, and the keys not in the database"""
+        bitmap = 0
+        missing = []
+        for key in keys:
+            bits = self._key_bits.get(key)
+            if bits is None:
+                missing.append(key)
             else:
-                self.by_length['very_long'].append(quote)
+                bitmap |= bits
+        return bitmap, missing
+
+    def keys_of_bitmap(self, bitmap: int) -> List[int]:
+        """Stable keys of the quote ids in a bitmap"""
+        keys = self._keys
+        bits = bin(bitmap)[:1:-1]  # Lowest bit first
+        return sorted({keys[quote_id] for quote_id, bit in enumerate(bits[:len(keys)]) if bit == '1'})
+
+    @classmethod
+    def fits_layout(cls, quote: Dict, layout: str, width: int = DEFAULT_WIDTH, height: int = DEFAULT_HEIGHT) -> bool:
+        """Whether a quote is displayed at a readable size in a layout on a device"""
+        min_size = cls.POOL_MIN_FONT_SIZE.get(layout)
+        if min_size is None:
+            return True
+        fit = fit_table.get(quote['text'], layout, width, height)
+        return not fit.truncated and fit.font_size >= min_size
+
+    def candidate_pool(self, layout: str = 'full', width: int = DEFAULT_WIDTH, height: int = DEFAULT_HEIGHT,
+                       categories: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Quotes suited to a layout on a device profile, optionally limited to categories
+
+        Built on first sight of the (categories, layout, profile) combination.
+        Sizing every quote for a new profile takes a while, so it happens
+        outside the lock (once, however many requests want the pool) and the
+        finished pool is swapped in. A category pool is taken from the pool
+        for all categories instead when that one is cached.
+        """
+        key = (frozenset(categories) if categories else None, layout, width, height)
+        while True:
+            with self._lock:
+                pool = self._pools.get(key)
+                if pool is not None:
+                    self._pools.move_to_end(key)
+                    return pool
+                building = self._building.get(key)
+                if building is None:
+                    building = self._building[key] = threading.Event()
+                    count = len(self.quotes)
+                    base = self._pools.get((None, layout, width, height)) if categories else None
+                    break
+            building.wait()
+
+        try:
+            if base is not None:
+                pool = [quote for quote in base if quote.get('category', '') in categories]
+            else:
+                pool = self._matching(self.quotes[:count], layout, width, height, categories)
+            with self._lock:
+                # Quotes added while the pool was being built
+                pool += self._matching(self.quotes[count:], layout, width, height, categories)
+                # In ingestion order, so quotes added later extend the pool (see RotationPlan)
+                pool.sort(key=lambda quote: self._ingested[id(quote)])
+                self._pools[key] = pool
+                while len(self._pools) > self.MAX_POOLS:
+                    _, evicted = self._pools.popitem(last=False)
+                    self._forget_pool(evicted)
+            return pool
+        finally:
+            with self._lock:
+                del self._building[key]
+            building.set()
+
+    def _matching(self, quotes: List[Dict], layout: str, width: int, height: int,
+                  categories: Optional[List[str]]) -> List[Dict]:
+        """The quotes in categories (if given) that fit a layout"""
+        return [
+            quote for quote in quotes
+            if (not categories or quote.get('category', '') in categories)
+            and self.fits_layout(quote, layout, width, height)
+        ]
+
+    def _forget_pool(self, pool: List[Dict]):
+        """Drop what is cached for a pool that was evicted or replaced"""
+        self._pool_bitmaps.pop(id(pool), None)
+        self._plans.pop(id(pool), None)
+
+    def rotation_plan(self, pool: List[Dict]) -> RotationPlan:
+        """Rotation cycles of a candidate pool, built once per pool"""
+        with self._lock:
+            # The entry holds the pool, so its id can't be reused while cached
+            cached, plan = self._plans.get(id(pool), (None, None))
+            if cached is not pool:
+                plan = RotationPlan([self._ingested[id(quote)] for quote in pool])
+                self._plans[id(pool)] = (pool, plan)
+            return plan
+
+    def category_sampler(self, weights: Dict[str, float], layout: str = 'full',
+                         width: int = DEFAULT_WIDTH, height: int = DEFAULT_HEIGHT) -> Optional[tuple]:
+        """
+        Alias table over the weighted categories that have quotes for this layout
+
+        Cached by the normalized weight spec, so equivalent weightings share
+        one table. Returns (table, categories, pools), or None if no weighted
+        category has a suitable quote.
+        """
+        key = (normalize_weights(weights), layout, width, height)
+        with self._lock:
+            sampler = self._samplers.get(key)
+            if sampler is not None:
+                self._samplers.move_to_end(key)
+                return sampler
+            version = self._version
+
+        entries = [
+            (category, weight, self.candidate_pool(layout, width, height, [category]))
+            for category, weight in key[0]
+        ]
+        entries = [entry for entry in entries if entry[2]]
+        if not entries:
+            return None
+
+        sampler = (
+            AliasTable([weight for _, weight, _ in entries]),
+            [category for category, _, _ in entries],
+            [pool for _, _, pool in entries],
+        )
+        with self._lock:
+            # Pools replaced by add_quotes in the meantime would be stale
+            if self._version == version:
+                self._samplers[key] = sampler
+                while len(self._samplers) > self.MAX_POOLS:
+                    self._samplers.popitem(last=False)
+        return sampler
+
+    @property
+    def search_index(self) -> QuoteSearchIndex:
+        """Inverted index over quote texts, keyed by position in self.quotes"""
+        with self._lock:
+            if self._search_index is None:
+                index = QuoteSearchIndex()
+                for doc_id, quote in enumerate(self.quotes):
+                    index.add(doc_id, quote['text'])
+                self._search_index = index
+            return self._search_index
+
+    def add_quotes(self, new_quotes: List[Dict]):
+        """
+        Add freshly ingested quotes without reloading the database
+
+        Updates the length buckets, candidate pools and search index incrementally
+        """
+        fit_table.precompute([quote['text'] for quote in new_quotes])
+
+        with self._lock:
+            additions: Dict[tuple, List[Dict]] = {}
+            for quote in new_quotes:
+                doc_id = len(self.quotes)
+                self.quotes.append(quote)
+                self._quote_ids[id(quote)] = doc_id
+                self._add_key(quote)
+                self._ingested[id(quote)] = ingestion_minute(quote)
+                length = quote.get('length', len(quote['text']))
+                self.by_length[self.length_bucket(length)].append(quote)
+                self.stats.add(quote)
+                if self._search_index is not None:
+                    self._search_index.add(doc_id, quote['text'])
+
+                for key in self._pools:
+                    categories, layout, width, height = key
+                    if categories and quote.get('category', '') not in categories:
+                        continue
+                    if self.fits_layout(quote, layout, width, height):
+                        additions.setdefault(key, []).append(quote)
+
+            # Pools are never changed once handed out, since requests index
+            # them without the lock: grown pools are replaced by new lists,
+            # kept in ingestion order (sorting only matters if a quote was
+            # stamped earlier than ones already there)
+            for key, added in additions.items():
+                pool = self._pools[key]
+                self._pools[key] = sorted(pool + added, key=lambda quote: self._ingested[id(quote)])
+                self._forget_pool(pool)
+
+            # A category that had no quotes for a layout may have some now
+            self._samplers.clear()
+            self._version += 1
+
+    def search(self, query: str, categories: Optional[List[str]] = None, length: Optional[str] = None,
+               min_length: Optional[int] = None, max_length: Optional[int] = None,
+               page: int = 1, per_page: int = 10) -> Dict:
+        """
+        Full-text search over the quotes, ranked by BM25
+
+        Args:
+            query: Search terms
+            categories: Only include quotes in these categories
+            length: Only include quotes in this length category (short, medium, long, very_long)
+            min_length: Minimum quote length in characters
+            max_length: Maximum quote length in characters
+            page: 1-based results page
+            per_page: Results per page
+
+        Returns:
+            Total match count and the requested page of results
+        """
+        with self._lock:
+            ranked = self.search_index.search(query)
+
+            matches = []
+            for doc_id, score in ranked:
+                quote = self.quotes[doc_id]
+                quote_length = quote.get('length', len(quote['text']))
+                if categories and quote.get('category', '') not in categories:
+                    continue
+                if length and self.length_bucket(quote_length) != length:
+                    continue
+                if min_length is not None and quote_length < min_length:
+                    continue
+                if max_length is not None and quote_length > max_length:
+                    continue
+                matches.append((doc_id, score, quote))
+
+        start = (page - 1) * per_page
+        return {
+            'query': query,
+            'total': len(matches),
+            'page': page,
+            'per_page': per_page,
+            'results': [
+                {
+                    'id': doc_id,
+                    'score': round(score, 4),
+                    'text': quote['text'],
+                    'category': quote.get('category', ''),
+                    'source': quote.get('source'),
+                    'length': quote.get('length', len(quote['text'])),
+                }
+                for doc_id, score, quote in matches[start:start + per_page]
+            ],
+        }
 
     def select_quote_for_layout(self, layout: str = 'full', random_selection: bool = True) -> Optional[Dict]:
         """
@@ -81,25 +604,7 @@ class QuoteDisplayManager:
         Returns:
             Selected quote dict
         """
-        limits = self.LIMITS.get(layout, self.LIMITS['full'])
-        ideal_max = limits['ideal_max']
-
-        # Determine which length categories to use
-        suitable_quotes = []
-
-        if layout == 'full':
-            # FULL SCREEN: Include ALL quotes regardless of length
-            suitable_quotes = self.quotes
-        elif layout in ['half_vertical', 'half_horizontal']:
-            # Prefer short to medium
-            suitable_quotes = (
-                self.by_length['short'] +
-                self.by_length['medium']
-            )
-        elif layout == 'quadrant':
-            # Only short quotes
-            suitable_quotes = self.by_length['short']
-
+        suitable_quotes = self.candidate_pool(layout)
         if not suitable_quotes:
             return None
 
@@ -109,128 +614,261 @@ class QuoteDisplayManager:
             # Could implement rotation logic here
             return suitable_quotes[0]
 
-    def truncate_quote(self, quote_text: str, max_length: int) -> str:
-        """
-        Intelligently truncate a quote that's too long
-
-        Tries to break at sentence boundaries
-        """
-        if len(quote_text) <= max_length:
-            return quote_text
-
-        # Try to find last sentence boundary before max_length
-        truncated = quote_text[:max_length]
-
-        # Look for last period, exclamation, or question mark
-        for char in ['. ', '! ', '? ']:
-            last_sentence = truncated.rfind(char)
-            if last_sentence > max_length * 0.6:  # At least 60% of desired length
-                return quote_text[:last_sentence + 1].strip()
-
-        # If no good sentence break, truncate at word boundary
-        last_space = truncated.rfind(' ')
-        if last_space > 0:
-            return truncated[:last_space] + '...'
-
-        return truncated + '...'
-
-    def format_for_display(self, quote: Dict, layout: str = 'full') -> Dict:
+    def format_for_display(self, quote: Dict, layout: str = 'full',
+                           width: int = DEFAULT_WIDTH, height: int = DEFAULT_HEIGHT) -> Dict:
         """
         Format quote for TRMNL display
 
-        Returns formatted data ready for markup template
+        Returns formatted data ready for markup template, including the font
+        size that fits this layout on a device of the given size. The display
+        text and its HTML-escaped form are looked up, not computed.
         """
-        text = quote['text']
-        limits = self.LIMITS.get(layout, self.LIMITS['full'])
-
-        # For full screen, show entire quote without truncation
-        if layout == 'full':
-            # Only truncate if EXTREMELY long (over absolute max)
-            if len(text) > limits['absolute_max']:
-                text = self.truncate_quote(text, limits['absolute_max'])
-        else:
-            # For other layouts, truncate if needed
-            if len(text) > limits['absolute_max']:
-                text = self.truncate_quote(text, limits['ideal_max'])
+        fit = fit_table.get(quote['text'], layout, width, height)
 
         return {
-            'text': text,
+            'id': self._quote_ids.get(id(quote)),
+            'text': fit.text,
+            'html': fit.html,
             'category': quote.get('category', ''),
             'source': quote.get('source', 'James Clear'),
-            'length': len(text),
+            'length': len(fit.text),
             'layout': layout,
+            'font_size': fit.font_size,
+            'line_height': fit.line_height,
+            'truncated': fit.truncated,
             'formatted_at': datetime.now().isoformat()
         }
 
-    def get_quote_for_user(self, layout: str = 'full', user_uuid: str = None) -> Dict:
+    def pool_bitmap(self, layout: str = 'full', width: int = DEFAULT_WIDTH, height: int = DEFAULT_HEIGHT,
+                    categories: Optional[List[str]] = None, weights: Optional[Dict[str, float]] = None) -> int:
+        """Bitmap of the quote ids a user with these settings can be shown in a layout"""
+        if weights:
+            sampler = self.category_sampler(weights, layout, width, height)
+            pools = sampler[2] if sampler else []
+        else:
+            pools = [self.candidate_pool(layout, width, height, categories)]
+
+        bitmap = 0
+        for pool in pools:
+            # Pools never change, and the entry holds the pool so its id isn't reused
+            cached, pool_bits = self._pool_bitmaps.get(id(pool), (None, 0))
+            if cached is not pool:
+                pool_bits = to_bitmap(self._quote_ids[id(quote)] for quote in pool)
+                self._pool_bitmaps[id(pool)] = (pool, pool_bits)
+            bitmap |= pool_bits
+        return bitmap
+
+    def get_quote_for_user(self, layout: str = 'full', user_uuid: str = None,
+                           width: int = DEFAULT_WIDTH, height: int = DEFAULT_HEIGHT,
+                           categories: Optional[List[str]] = None,
+                           weights: Optional[Dict[str, float]] = None,
+                           history: int = 0, exclude: int = 0, minute: Optional[int] = None) -> Dict:
         """
         Get a quote for a specific user with no repeats until all quotes shown
 
-        Uses user_uuid + current cycle to deterministically select quotes
-        Each user gets quotes in a shuffled order unique to them
+        Formatted for display; see pick_quote_for_user for the selection
         """
-        # Get suitable quotes for this layout
-        suitable_quotes = []
+        quote = self.pick_quote_for_user(layout, user_uuid, width, height, categories, weights,
+                                         history, exclude, minute)
+        if quote:
+            return self.format_for_display(quote, layout, width, height)
+        return None
 
-        if layout == 'full':
-            suitable_quotes = self.quotes
-        elif layout in ['half_vertical', 'half_horizontal']:
-            suitable_quotes = self.by_length['short'] + self.by_length['medium']
-        elif layout == 'quadrant':
-            suitable_quotes = self.by_length['short']
+    def pick_quote_for_user(self, layout: str = 'full', user_uuid: str = None,
+                            width: int = DEFAULT_WIDTH, height: int = DEFAULT_HEIGHT,
+                            categories: Optional[List[str]] = None,
+                            weights: Optional[Dict[str, float]] = None,
+                            history: int = 0, exclude: int = 0, minute: Optional[int] = None,
+                            permutations: Optional[Dict] = None,
+                            cursors: Optional[Dict] = None) -> Optional[Dict]:
+        """
+        Select a user's quote record for a layout
+
+        Each user sees the pool in a shuffled order unique to them, one quote
+        per minute, without repeats until the cycle ends. Cycles are anchored
+        to when quotes were added (see RotationPlan), so adding quotes
+        doesn't reshuffle anyone: they join the end of the current cycle.
+
+        With category weights, each minute's category is drawn from an alias
+        table (seeded by user_uuid + minute), then the quote comes from that
+        category's own no-repeat rotation
+
+        history and exclude are bitmaps of quote ids (see user_store.py):
+        the rotation moves on past quotes in history, and never shows
+        excluded ones
+
+        minute (minutes since epoch) defaults to now; callers selecting for
+        many devices pass one value so the whole batch sees the same minute.
+        permutations caches rotation orders, and cursors how far the rotation
+        has moved on past seen quotes, across calls for one user (see
+        schedule_for_user).
+        """
+        # Calculate minutes since epoch
+        minutes_since_epoch = minute if minute is not None else int(datetime.now().timestamp() / 60)
+        rotation_key = user_uuid
+
+        if weights:
+            sampler = self.category_sampler(weights, layout, width, height)
+            if sampler is None:
+                return None
+            table, sampled_categories, pools = sampler
+
+            if user_uuid:
+                digest = hashlib.md5(f"{user_uuid}-{minutes_since_epoch}".encode()).hexdigest()
+                draw = int(digest[:8], 16) / 2 ** 32
+            else:
+                draw = random.random()
+            slot = table.pick(draw)
+            suitable_quotes = pools[slot]
+            rotation_key = f"{user_uuid}-{sampled_categories[slot]}"
+        else:
+            # Get suitable quotes for this layout and device
+            suitable_quotes = self.candidate_pool(layout, width, height, categories)
 
         if not suitable_quotes:
             return None
 
         # If no user_uuid provided, use timestamp (legacy behavior)
         if not user_uuid:
-            import random
-            quote = random.choice(suitable_quotes)
-            if quote:
-                return self.format_for_display(quote, layout)
-            return None
-
-        # Calculate minutes since epoch
-        minutes_since_epoch = int(datetime.now().timestamp() / 60)
-        total_quotes = len(suitable_quotes)
-
-        # Determine cycle and position
-        cycle_number = minutes_since_epoch // total_quotes
-        position_in_cycle = minutes_since_epoch % total_quotes
+            return random.choice(suitable_quotes)
 
-        # Create deterministic shuffle based on user_uuid + cycle
-        # Each user gets their own unique shuffle order
-        import random
-        import hashlib
+        # Current cycle and position in it. Each user gets their own order
+        # (per weighted category too); only the current position of it is computed
+        cycle_start, layers, position_in_cycle = self.rotation_plan(suitable_quotes).cycle(minutes_since_epoch)
+        order = self._rotation(rotation_key, cycle_start, layers, permutations)
 
-        # Create seed from user_uuid and cycle_number
-        seed_string = f"{user_uuid}-{cycle_number}"
-        seed = int(hashlib.md5(seed_string.encode()).hexdigest()[:8], 16)
+        # Get quote at current position
+        quote = suitable_quotes[order[position_in_cycle]]
+
+        # Move on past quotes the user has recently seen or excluded
+        if history or exclude:
+            cursor_key = (id(suitable_quotes), rotation_key, cycle_start)
+            quote = self._next_unseen(suitable_quotes, order, position_in_cycle, history | exclude,
+                                      cursors, cursor_key + (False,))
+            if quote is None:
+                quote = self._next_unseen(suitable_quotes, order, position_in_cycle, exclude,
+                                          cursors, cursor_key + (True,))
+
+        return quote
+
+    @staticmethod
+    def _rotation(rotation_key: str, cycle_start: int, layers: List[int],
+                  permutations: Optional[Dict] = None) -> RotationCycle:
+        """
+        A user's order for one cycle of a pool: each layer is shuffled on its
+        own (reusing permutations across calls if given)
+        """
+        orders = []
+        previous = 0
+        for layer, end in enumerate(layers):
+            key = (rotation_key, cycle_start, layer, end - previous)
+            order = permutations.get(key) if permutations is not None else None
+            if order is None:
+                # The first layer's seed doesn't depend on the layers after it
+                seed_string = f"{rotation_key}-{cycle_start}" + (f"-{layer}" if layer else "")
+                seed = int(hashlib.md5(seed_string.encode()).hexdigest()[:8], 16)
+                order = Permutation(seed, end - previous)
+                if permutations is not None:
+                    permutations[key] = order
+            orders.append(order)
+            previous = end
+        return RotationCycle(layers, orders)
+
+    def _next_unseen(self, pool: List[Dict], order: RotationCycle, start: int, skip: int,
+                     cursors: Optional[Dict] = None, cursor_key: Optional[tuple] = None) -> Optional[Dict]:
+        """
+        First quote in rotation order from start on (wrapping around within
+        the cycle) whose id isn't in the skip bitmap
+
+        With cursors, each scan remembers where it started and stopped. A
+        later scan of the same cycle that starts within that stretch, with
+        every bit skipped then still set, resumes where the last one stopped
+        (or gives up straight away if the last one found nothing), so a
+        schedule walks each cycle about once instead of once per slot.
+        """
+        length = len(order)
+        begin = 0
+        if cursors is not None:
+            cached = cursors.get(cursor_key)
+            if cached is not None and cached[0] is pool and skip & cached[3] == cached[3]:
+                _, last_start, last_found, _ = cached
+                if last_found is None:
+                    return None
+                moved = (start - last_start) % length
+                reached = (last_found - last_start) % length
+                if moved <= reached:
+                    begin = reached - moved
+
+        found = None
+        for offset in range(begin, length):
+            position = (start + offset) % length
+            if not skip >> self._quote_ids[id(pool[order[position]])] & 1:
+                found = position
+                break
+        if cursors is not None:
+            cursors[cursor_key] = (pool, start, found, skip)
+        return None if found is None else pool[order[found]]
+
+    def schedule_for_user(self, user_uuid: str, layouts: List[str], start_minute: int, slots: int,
+                          step: int = 1, width: int = DEFAULT_WIDTH, height: int = DEFAULT_HEIGHT,
+                          categories: Optional[List[str]] = None, weights: Optional[Dict[str, float]] = None,
+                          history: int = 0, exclude: int = 0) -> List[Dict]:
+        """
+        The quotes a user will be shown at upcoming minutes
 
-        # Shuffle quotes deterministically
-        shuffled = suitable_quotes.copy()
-        random.seed(seed)
-        random.shuffle(shuffled)
-        random.seed()  # Reset
+        Runs the same selection as get_quote_for_user for every slot, reusing
+        each cycle's rotation, and how far into it the user has seen, across
+        slots. History is carried forward as if
+        the device polled at every slot, so the result matches what /plugin
+        returns when polled on that schedule.
 
-        # Get quote at current position
-        quote = shuffled[position_in_cycle]
+        Args:
+            layouts: Layouts to include in each slot
+            start_minute: First slot, in minutes since epoch
+            slots: Number of slots
+            step: Minutes between slots
+            history, exclude: The user's current history and exclusion bitmaps
 
-        if quote:
-            return self.format_for_display(quote, layout)
-        return None
+        Returns:
+            One dict per slot: its minute and {layout: quote record or None}
+        """
+        # Excluded quotes are never shown, so history starts over without them
+        pool = self.pool_bitmap('full', width, height, categories, weights) & ~exclude
+        permutations: Dict = {}
+        cursors: Dict = {}
+        schedule = []
+
+        for slot in range(slots):
+            minute = start_minute + slot * step
+            picks = {}
+            # The full layout is always selected since it drives the history
+            for layout in ['full'] + [layout for layout in layouts if layout != 'full']:
+                picks[layout] = self.pick_quote_for_user(layout, user_uuid, width, height, categories, weights,
+                                                         history, exclude, minute, permutations, cursors)
+
+            if user_uuid:
+                shown = [self.quote_id(picks['full'])] if picks['full'] else []
+                history = advance_history(history, to_bitmap(shown), pool)
+
+            schedule.append({
+                'minute': minute,
+                'quotes': {layout: picks[layout] for layout in layouts},
+            })
+
+        return schedule
 
     def get_stats(self) -> Dict:
-        """Get statistics about the quote database"""
+        """
+        Get statistics about the quote database
+
+        Served from the incrementally maintained aggregates (see
+        corpus_stats.py), so the cost doesn't grow with the corpus
+        """
+        stats = self.stats.snapshot()
         return {
-            'total_quotes': len(self.quotes),
-            'by_length': {
-                'short': len(self.by_length['short']),
-                'medium': len(self.by_length['medium']),
-                'long': len(self.by_length['long']),
-                'very_long': len(self.by_length['very_long']),
-            },
-            'categories': list(set(q.get('category', '') for q in self.quotes)),
+            **stats,
+            'by_length': {bucket: stats['by_length'].get(bucket, 0) for bucket in self.by_length},
+            'categories': list(stats['by_category']),
         }
 
 
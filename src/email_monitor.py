@@ -5,17 +5,128 @@ Monitors email inbox for Tuesday newsletter and extracts the 3 quotes from James
 
 import imaplib
 import email
-from email.header import decode_header
+from email.header import decode_header, make_header
+import base64
+import os
+import quopri
 import re
-from datetime import datetime
-from typing import List, Dict, Optional
+import select
+import ssl
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List, Dict, Optional, Tuple
 import json
+import logging
+
+from canonicalize import canonical_text
+
+logger = logging.getLogger(__name__)
+
+
+# Sentinels used while tokenizing IMAP responses
+_CLOSE_PAREN = object()
+_END_OF_DATA = object()
+
+
+class IMAPResponseParser:
+    """
+    Minimal parser for IMAP FETCH responses
+
+    Turns the parenthesized response syntax into nested lists of bytes
+    (atoms and strings), None (NIL) and lists. Literals ({n} followed by n
+    bytes) are read inline, and section specs like BODY[HEADER.FIELDS (DATE)]
+    stay a single atom.
+    """
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+
+    def parse(self) -> list:
+        """Parse the whole response into a list of tokens"""
+        tokens = []
+        while True:
+            token = self._next_token()
+            if token is _END_OF_DATA:
+                return tokens
+            tokens.append(token)
+
+    def _next_token(self):
+        data = self.data
+        while self.pos < len(data) and data[self.pos:self.pos + 1] in (b' ', b'\r', b'\n'):
+            self.pos += 1
+        if self.pos >= len(data):
+            return _END_OF_DATA
+
+        char = data[self.pos:self.pos + 1]
+
+        if char == b'(':
+            self.pos += 1
+            items = []
+            while True:
+                token = self._next_token()
+                if token is _END_OF_DATA or token is _CLOSE_PAREN:
+                    return items
+                items.append(token)
+
+        if char == b')':
+            self.pos += 1
+            return _CLOSE_PAREN
+
+        if char == b'"':
+            self.pos += 1
+            value = bytearray()
+            while self.pos < len(data) and data[self.pos:self.pos + 1] != b'"':
+                if data[self.pos:self.pos + 1] == b'\\':
+                    self.pos += 1
+                value += data[self.pos:self.pos + 1]
+                self.pos += 1
+            self.pos += 1
+            return bytes(value)
+
+        if char == b'{':
+            end = data.index(b'}', self.pos)
+            size = int(data[self.pos + 1:end])
+            # imaplib has already dropped the CRLF after the literal size
+            start = end + 1
+            self.pos = start + size
+            return data[start:start + size]
+
+        start = self.pos
+        depth = 0
+        while self.pos < len(data):
+            char = data[self.pos:self.pos + 1]
+            if char == b'[':
+                depth += 1
+            elif char == b']':
+                depth -= 1
+            elif depth == 0 and char in (b' ', b'(', b')', b'\r', b'\n'):
+                break
+            self.pos += 1
+        atom = data[start:self.pos]
+        return None if atom.upper() == b'NIL' else atom
 
 
 class NewsletterMonitor:
     """Monitor email for James Clear's 3-2-1 newsletter"""
     
-    def __init__(self, email_address: str, password: str, imap_server: str = 'imap.gmail.com'):
+    # Search criteria for 3-2-1 newsletters (adjust the sender email as needed)
+    SEARCH_CRITERIA = ['FROM', '"james@jamesclear.com"', 'SUBJECT', '"3-2-1"']
+
+    # How many messages to process on the very first check
+    INITIAL_FETCH_LIMIT = 10
+
+    # Re-issue IDLE before servers drop idle clients (RFC 2177 allows 30 min)
+    IDLE_TIMEOUT = 29 * 60
+
+    # Reconnect backoff for the IDLE listener, in seconds
+    RECONNECT_BACKOFF_MIN = 1
+    RECONNECT_BACKOFF_MAX = 300
+
+    def __init__(self, email_address: str, password: str, imap_server: str = 'imap.gmail.com',
+                 imap_port: Optional[int] = None, use_ssl: bool = True,
+                 state_file: str = 'data/email_state.json'):
         """
         Initialize email monitor
         
@@ -23,16 +134,72 @@ class NewsletterMonitor:
             email_address: Your email address
             password: App-specific password (not your regular password)
             imap_server: IMAP server address
+            imap_port: IMAP port (defaults to 993 with SSL, 143 without)
+            use_ssl: Set to False to talk plain IMAP, e.g. to a local test server
+            state_file: Where the last processed UID and UIDVALIDITY are kept
         """
         self.email_address = email_address
         self.password = password
         self.imap_server = imap_server
+        self.imap_port = imap_port
+        self.use_ssl = use_ssl
+        self.state_file = state_file
+        self.state = self.load_state()
+        self.mail = None
     
-    def connect(self) -> imaplib.IMAP4_SSL:
+    def connect(self) -> imaplib.IMAP4:
         """Connect to email server"""
-        mail = imaplib.IMAP4_SSL(self.imap_server)
+        if self.use_ssl:
+            mail = imaplib.IMAP4_SSL(self.imap_server, self.imap_port or imaplib.IMAP4_SSL_PORT)
+        else:
+            mail = imaplib.IMAP4(self.imap_server, self.imap_port or imaplib.IMAP4_PORT)
         mail.login(self.email_address, self.password)
         return mail
+
+    def get_connection(self) -> imaplib.IMAP4:
+        """Return the open connection, reconnecting if the server dropped it"""
+        if self.mail is not None:
+            try:
+                self.mail.noop()
+                return self.mail
+            except (imaplib.IMAP4.error, OSError):
+                self.mail = None
+
+        self.mail = self.connect()
+        return self.mail
+
+    def disconnect(self):
+        """Log out and drop the cached connection"""
+        if self.mail is not None:
+            try:
+                self.mail.logout()
+            except (imaplib.IMAP4.error, OSError):
+                pass
+            self.mail = None
+
+    def load_state(self) -> Dict:
+        """Load the last processed UID and the UIDVALIDITY it belongs to"""
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {'uidvalidity': None, 'last_uid': 0}
+
+    def save_state(self):
+        """Persist the last processed UID"""
+        directory = os.path.dirname(self.state_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_file = self.state_file + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(temp_file, self.state_file)
+
+    def commit_uid(self, uid: int):
+        """Mark every message up to uid as processed, once its newsletters are handled"""
+        if uid != self.state['last_uid']:
+            self.state['last_uid'] = uid
+            self.save_state()
     
     def extract_quotes_from_email(self, email_body: str) -> List[str]:
         """
@@ -58,64 +225,334 @@ class NewsletterMonitor:
             found_quotes = re.findall(idea_pattern, ideas_section)
             
             for quote in found_quotes:
-                cleaned = quote.strip()
+                cleaned = canonical_text(quote)
                 if len(cleaned) > 10:  # Basic validation
                     quotes.append(cleaned)
         
         return quotes
     
-    def get_recent_newsletters(self, days: int = 7) -> List[Dict]:
+    def get_recent_newsletters(self, days: int = 7) -> Tuple[List[Dict], int]:
         """
-        Get recent 3-2-1 newsletters
+        Get 3-2-1 newsletters that arrived since the last check
+        
+        Only UIDs above the last processed one are fetched, in one batched
+        FETCH of the text/plain part (BODY.PEEK, so nothing is marked read
+        and attachments/images are never downloaded). The connection is
+        kept open and reused across checks. Nothing is marked processed:
+        call commit_uid with the returned UID once the quotes are stored.
         
         Args:
             days: Number of days to look back
             
         Returns:
-            List of newsletter data with extracted quotes
+            (newsletter data with extracted quotes, highest UID checked)
         """
         try:
-            mail = self.connect()
-            mail.select('INBOX')
-            
-            # Search for emails from James Clear
-            # Adjust the sender email as needed
-            search_criteria = '(FROM "james@jamesclear.com" SUBJECT "3-2-1")'
-            _, message_numbers = mail.search(None, search_criteria)
-            
-            newsletters = []
-            
-            for num in message_numbers[0].split()[-10:]:  # Get last 10
-                _, msg_data = mail.fetch(num, '(RFC822)')
-                email_body = msg_data[0][1]
-                email_message = email.message_from_bytes(email_body)
-                
-                # Get email date
-                date_str = email_message['Date']
-                # Parse date (simplified)
-                
-                # Get email body
-                body = self.get_email_body(email_message)
-                
-                # Extract quotes
-                quotes = self.extract_quotes_from_email(body)
-                
-                if quotes:
-                    newsletters.append({
-                        'date': date_str,
-                        'subject': email_message['Subject'],
-                        'quotes': quotes,
-                        'extracted_at': datetime.now().isoformat()
-                    })
-            
-            mail.close()
-            mail.logout()
-            
-            return newsletters
+            return self.check_new_newsletters(days)
             
         except Exception as e:
-            print(f"Error monitoring email: {e}")
+            logger.error("Error monitoring email: %s", e)
+            self.disconnect()
+            return [], self.state['last_uid']
+
+    def check_new_newsletters(self, days: int = 7) -> Tuple[List[Dict], int]:
+        """
+        Newsletters that arrived since the last processed UID
+
+        Nothing is marked processed: pass the returned UID to commit_uid
+        once the newsletters are handled, so a failure fetches them again.
+        IMAP/socket errors propagate.
+
+        Returns:
+            (newsletters, highest UID checked)
+        """
+        mail = self.get_connection()
+        mail.select('INBOX', readonly=True)
+
+        # A new UIDVALIDITY means old UIDs are meaningless; start over
+        _, uidvalidity = mail.response('UIDVALIDITY')
+        uidvalidity = int(uidvalidity[0]) if uidvalidity and uidvalidity[0] else None
+        if uidvalidity != self.state.get('uidvalidity'):
+            self.state = {'uidvalidity': uidvalidity, 'last_uid': 0}
+
+        last_uid = self.state['last_uid']
+        since = (datetime.now() - timedelta(days=days)).strftime('%d-%b-%Y')
+        _, data = mail.uid('SEARCH', None, 'UID', f'{last_uid + 1}:*',
+                           *self.SEARCH_CRITERIA, 'SINCE', since)
+
+        # "n:*" always matches the highest UID, even when it is below n
+        uids = sorted(uid for uid in (int(x) for x in data[0].split()) if uid > last_uid)
+        if not last_uid:
+            uids = uids[-self.INITIAL_FETCH_LIMIT:]
+
+        newsletters = []
+        for uid, message in self.fetch_text_parts(mail, uids):
+            # Extract quotes
+            quotes = self.extract_quotes_from_email(message['body'])
+
+            if quotes:
+                newsletters.append({
+                    'uid': uid,
+                    'date': message['date'],
+                    'subject': message['subject'],
+                    'quotes': quotes,
+                    'extracted_at': datetime.now().isoformat()
+                })
+
+        return newsletters, uids[-1] if uids else last_uid
+
+    def idle(self, mail: imaplib.IMAP4, timeout: float) -> bool:
+        """
+        Wait in IMAP IDLE (RFC 2177) until new mail arrives or timeout passes
+
+        imaplib has no IDLE support before Python 3.14, so the command is
+        driven by hand on the selected connection.
+
+        Returns:
+            True if the server announced new messages
+        """
+        tag = mail._new_tag()
+        mail.send(tag + b' IDLE\r\n')
+        response = mail.readline()
+        if not response.startswith(b'+'):
+            raise imaplib.IMAP4.error(f"Server refused IDLE: {response.decode(errors='replace').strip()}")
+
+        new_mail = False
+        sock = mail.socket()
+        deadline = time.monotonic() + timeout
+
+        while not new_mail:
+            # Lines already read into imaplib's buffer never make the socket
+            # readable again, so only wait once they are used up
+            if not self._buffered(mail):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                # Wait on the socket rather than a socket timeout, which would
+                # leave imaplib's buffered file object unusable
+                readable, _, _ = select.select([sock], [], [], min(remaining, 60))
+                if not readable:
+                    continue
+
+            line = mail.readline()
+            if not line:
+                raise imaplib.IMAP4.abort('Connection closed during IDLE')
+            if re.match(rb'\* \d+ EXISTS', line):
+                new_mail = True
+
+        mail.send(b'DONE\r\n')
+        while True:
+            line = mail.readline()
+            if not line:
+                raise imaplib.IMAP4.abort('Connection closed while ending IDLE')
+            if re.match(rb'\* \d+ EXISTS', line):
+                new_mail = True
+            if line.startswith(tag + b' '):
+                if not line[len(tag) + 1:].upper().startswith(b'OK'):
+                    raise imaplib.IMAP4.error(f"IDLE failed: {line.decode(errors='replace').strip()}")
+                return new_mail
+
+    @staticmethod
+    def _buffered(mail: imaplib.IMAP4) -> bool:
+        """Whether data is waiting in imaplib's or the TLS layer's buffer"""
+        sock = mail.socket()
+        if getattr(sock, 'pending', lambda: 0)():
+            return True
+
+        # peek returns what the buffered reader holds, and only touches the
+        # socket when that is empty, so make that read non-blocking
+        timeout = sock.gettimeout()
+        sock.setblocking(False)
+        try:
+            return bool(mail.file.peek(1))
+        except (BlockingIOError, ssl.SSLWantReadError):
+            return False
+        finally:
+            sock.settimeout(timeout)
+
+    def listen(self, on_newsletters: Callable[[List[Dict]], None], days: int = 7,
+               stop_event: Optional[threading.Event] = None):
+        """
+        Long-lived listener: push new newsletters to on_newsletters as they arrive
+
+        Checks once, then sits in IDLE and checks again as soon as the server
+        announces new mail (and at least every IDLE_TIMEOUT, as RFC 2177
+        asks clients to re-issue IDLE). Messages are only marked processed
+        once on_newsletters returns; if it raises, or the connection fails,
+        the check is retried with exponential backoff.
+
+        Args:
+            on_newsletters: Called with the newsletters from check_new_newsletters
+            days: Number of days to look back on each check
+            stop_event: Set it to make the listener return
+        """
+        stop_event = stop_event or threading.Event()
+        backoff = self.RECONNECT_BACKOFF_MIN
+
+        while not stop_event.is_set():
+            try:
+                newsletters, uid = self.check_new_newsletters(days)
+
+                if newsletters:
+                    try:
+                        on_newsletters(newsletters)
+                    except Exception as e:
+                        logger.exception("Error handling new newsletters, retrying in %ss: %s", backoff, e)
+                        stop_event.wait(backoff)
+                        backoff = min(backoff * 2, self.RECONNECT_BACKOFF_MAX)
+                        continue
+
+                self.commit_uid(uid)
+                backoff = self.RECONNECT_BACKOFF_MIN
+                if stop_event.is_set():
+                    break
+                self.idle(self.mail, self.IDLE_TIMEOUT)
+
+            except (imaplib.IMAP4.error, OSError) as e:
+                logger.warning("IMAP listener error: %s. Reconnecting in %ss", e, backoff)
+                self.disconnect()
+                stop_event.wait(backoff)
+                backoff = min(backoff * 2, self.RECONNECT_BACKOFF_MAX)
+
+        self.disconnect()
+
+    def fetch_text_parts(self, mail: imaplib.IMAP4, uids: List[int]) -> List[Tuple[int, Dict]]:
+        """
+        Fetch date, subject and decoded text/plain body for a batch of UIDs
+
+        One FETCH reads every message's BODYSTRUCTURE, then one FETCH per
+        distinct text part section (usually just "1") pulls the bodies.
+        Messages without a text/plain part are skipped.
+        """
+        if not uids:
             return []
+
+        uid_set = ','.join(str(uid) for uid in uids)
+        _, data = mail.uid('FETCH', uid_set, '(UID BODYSTRUCTURE)')
+
+        by_section = {}
+        for uid, fields in self.parse_fetch_response(data).items():
+            text_part = self.find_text_part(fields.get('BODYSTRUCTURE') or [])
+            if text_part:
+                by_section.setdefault(text_part[0], {})[uid] = text_part
+
+        messages = {}
+        for section, parts in by_section.items():
+            uid_set = ','.join(str(uid) for uid in sorted(parts))
+            _, data = mail.uid(
+                'FETCH', uid_set,
+                f'(UID BODY.PEEK[HEADER.FIELDS (DATE SUBJECT)] BODY.PEEK[{section}])'
+            )
+
+            for uid, fields in self.parse_fetch_response(data).items():
+                if uid not in parts:
+                    continue
+                _, encoding, charset = parts[uid]
+
+                headers = b''
+                payload = b''
+                for key, value in fields.items():
+                    if key.startswith('BODY[HEADER'):
+                        headers = value or b''
+                    elif key == f'BODY[{section}]':
+                        payload = value or b''
+
+                header_message = email.message_from_bytes(headers)
+                messages[uid] = {
+                    'date': header_message['Date'],
+                    'subject': self.decode_header_value(header_message['Subject']),
+                    'body': self.decode_payload(payload, encoding, charset),
+                }
+
+        return sorted(messages.items())
+
+    def parse_fetch_response(self, data: list) -> Dict[int, Dict]:
+        """Turn imaplib FETCH data into {uid: {item name: value}}"""
+        # imaplib splits each message into (prefix, literal) tuples and
+        # trailing byte strings; glue them back together per message
+        chunks = []
+        for item in data:
+            if item is None:
+                continue
+            piece = item[0] + item[1] if isinstance(item, tuple) else item
+            starts_message = re.match(rb'\d+ \(', item[0] if isinstance(item, tuple) else item)
+            if starts_message or not chunks:
+                chunks.append(piece)
+            else:
+                chunks[-1] += piece
+
+        messages = {}
+        for chunk in chunks:
+            tokens = IMAPResponseParser(chunk).parse()
+            if len(tokens) < 2 or not isinstance(tokens[1], list):
+                continue
+            items = tokens[1]
+            fields = {
+                items[i].decode('ascii', 'replace').upper(): items[i + 1]
+                for i in range(0, len(items) - 1, 2)
+                if isinstance(items[i], bytes)
+            }
+            if 'UID' in fields:
+                messages[int(fields['UID'])] = fields
+
+        return messages
+
+    def find_text_part(self, structure: list, section: str = '') -> Optional[Tuple[str, str, str]]:
+        """
+        Find the first text/plain part in a parsed BODYSTRUCTURE
+
+        Returns (section, transfer encoding, charset), or None
+        """
+        if not structure:
+            return None
+
+        if isinstance(structure[0], list):
+            # Multipart: child parts come first, then the subtype and extensions
+            index = 0
+            for part in structure:
+                if not isinstance(part, list):
+                    break
+                index += 1
+                found = self.find_text_part(part, f'{section}.{index}' if section else str(index))
+                if found:
+                    return found
+            return None
+
+        if len(structure) < 6 or not isinstance(structure[0], bytes) or not isinstance(structure[1], bytes):
+            return None
+
+        if structure[0].lower() == b'text' and structure[1].lower() == b'plain':
+            params = structure[2] if isinstance(structure[2], list) else []
+            charset = 'utf-8'
+            for i in range(0, len(params) - 1, 2):
+                if isinstance(params[i], bytes) and params[i].lower() == b'charset' and params[i + 1]:
+                    charset = params[i + 1].decode('ascii', 'replace')
+            encoding = (structure[5] or b'7bit').decode('ascii', 'replace').lower()
+            return (section or '1', encoding, charset)
+
+        return None
+
+    def decode_payload(self, payload: bytes, encoding: str, charset: str) -> str:
+        """Undo the transfer encoding and charset of a fetched body part"""
+        if encoding == 'base64':
+            payload = base64.b64decode(payload)
+        elif encoding == 'quoted-printable':
+            payload = quopri.decodestring(payload)
+
+        try:
+            return payload.decode(charset, errors='replace')
+        except LookupError:
+            return payload.decode('utf-8', errors='replace')
+
+    def decode_header_value(self, value: Optional[str]) -> Optional[str]:
+        """Decode RFC 2047 encoded words in a header"""
+        if value is None:
+            return None
+        try:
+            return str(make_header(decode_header(value)))
+        except Exception:
+            return value
     
     def get_email_body(self, email_message) -> str:
         """Extract text body from email message"""
@@ -127,12 +564,12 @@ class NewsletterMonitor:
                     try:
                         body = part.get_payload(decode=True).decode()
                         break
-                    except:
+                    except (AttributeError, UnicodeDecodeError):  # No payload, or not UTF-8
                         pass
         else:
             try:
                 body = email_message.get_payload(decode=True).decode()
-            except:
+            except (AttributeError, UnicodeDecodeError):
                 pass
         
         return body
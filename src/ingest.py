@@ -0,0 +1,506 @@
+"""
+Ingestion Pipeline
+One path for quotes from every source into a quotes file
+
+Each source (see quote_sources.py) says what to fetch and how to parse it;
+everything after that is shared:
+
+    source -> fetch -> parse -> normalize -> dedup -> store
+
+Each stage runs in its own threads (as many as its concurrency limit) and
+hands items to the next through a bounded queue. A slow stage therefore
+holds back the stages before it instead of letting work pile up in memory.
+Every stage counts the items it took in and passed on, its errors, the time
+it spent working and the time it spent blocked on a full queue, so a run's
+summary shows where the time went.
+
+normalize_record applies one set of conventions (canonical text, minimum
+length, category, source, date) for every source, including bulk imports.
+QuoteStore is the only writer of quotes files: it appends in batches under
+an exclusive lock, with write-then-rename, copying the stored quotes as
+bytes and encoding only the new ones.
+"""
+
+import contextvars
+import fcntl
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from canonicalize import canonical_text
+from dedup import NearDuplicateIndex
+
+logger = logging.getLogger(__name__)
+
+# Shorter texts are scraper leftovers (section numbers, "Share this")
+MIN_TEXT_LENGTH = 11
+
+# Quotes appended to the file per commit
+STORE_BATCH_SIZE = 500
+
+# Items waiting between two stages; beyond this the upstream stage waits
+QUEUE_SIZE = 100
+
+# Threads per stage. Fetching waits on the network, so it gets several;
+# dedup and store keep one so decisions and writes happen in order.
+STAGE_WORKERS = {'fetch': 4, 'parse': 2, 'normalize': 1, 'dedup': 1, 'store': 1}
+
+# Marks the end of a stage's input
+_DONE = object()
+
+
+class IngestFailed(Exception):
+    """A run had items that couldn't be fetched, parsed or stored"""
+
+
+@contextmanager
+def locked(quotes_file: str):
+    """Exclusive lock for writers of a quotes file (shared by all processes)"""
+    os.makedirs(os.path.dirname(quotes_file) or '.', exist_ok=True)
+    with open(quotes_file + '.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def normalize_record(record: Dict, category: Optional[str] = None, source: Optional[str] = None) -> Dict:
+    """
+    Quote as stored, from a record with text and optional category, source
+    and date
+
+    Args:
+        category: Category when the record has none
+        source: Source when the record has none
+
+    Raises:
+        ValueError: If the record is not a valid quote
+    """
+    text = record.get('text')
+    category = record.get('category') or category
+    source = record.get('source') or source or 'Imported'
+    if not isinstance(text, str):
+        raise ValueError("text must be a string")
+    if not isinstance(category, str) or not category.strip():
+        raise ValueError("category must be a non-empty string")
+    if not isinstance(source, str):
+        raise ValueError("source must be a string")
+
+    text = canonical_text(text)
+    if len(text) < MIN_TEXT_LENGTH:
+        raise ValueError(f"text must be at least {MIN_TEXT_LENGTH} characters")
+
+    quote = {
+        'text': text,
+        'category': category.strip(),
+        'source': source.strip() or 'Imported',
+        'length': len(text),
+    }
+    if record.get('date') is not None:
+        try:
+            value = record['date']
+            quote['date'] = (date.fromisoformat(value) if len(value) == 10
+                             else datetime.fromisoformat(value)).isoformat()
+        except (TypeError, ValueError):
+            raise ValueError("date must be an ISO 8601 date")
+    quote['scraped_at'] = datetime.now().isoformat()
+    return quote
+
+
+class QuoteStore:
+    """
+    Appends quotes to a quotes file, skipping near-duplicates
+
+    claim() reserves a text that is new to the file and to earlier claims;
+    commit() appends claimed quotes in a batch. If another process wrote
+    the file in between, commit reloads it and drops the claims that now
+    duplicate its quotes, so concurrent writers never lose or duplicate
+    each other's quotes.
+
+    Args:
+        quotes_file: Database to append to
+        on_commit: Called with (new_quotes, loaded_mtime) after each commit,
+            as apply_new_quotes in the server expects
+    """
+
+    def __init__(self, quotes_file: str = 'data/quotes.json',
+                 on_commit: Optional[Callable[[List[Dict], Optional[float]], None]] = None):
+        self.quotes_file = quotes_file
+        self.on_commit = on_commit
+        self.quotes: List[Dict] = []
+        self.duplicate_index = NearDuplicateIndex()
+        self.loaded_mtime: Optional[float] = None
+        self.pending: Dict[Tuple[str, int], str] = {}  # Claimed, not yet committed
+        self.stale = set()  # Claims that duplicate quotes another writer stored
+        self._keys = itertools.count()
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        """Read the database and index it (and the pending claims) for duplicate checks"""
+        self.loaded_mtime = None
+        self.quotes = []
+        if os.path.exists(self.quotes_file):
+            self.loaded_mtime = os.path.getmtime(self.quotes_file)
+            with open(self.quotes_file, 'r', encoding='utf-8') as f:
+                self.quotes = json.load(f)
+        self.duplicate_index = NearDuplicateIndex.from_quotes(self.quotes)
+
+        for key, text in self.pending.items():
+            if self.duplicate_index.find_duplicate(text) is not None:
+                self.stale.add(key)
+            else:
+                self.duplicate_index.add(key, text)
+
+    def claim(self, text: str) -> Optional[Tuple[str, int]]:
+        """
+        Reserve a text unless it duplicates a stored quote or an earlier claim
+
+        Returns:
+            The claim (pass it to commit with the quote), or None for a
+            near-duplicate
+        """
+        with self._lock:
+            if self.duplicate_index.find_duplicate(text) is not None:
+                return None
+            key = ('pending', next(self._keys))
+            self.duplicate_index.add(key, text)
+            self.pending[key] = text
+            return key
+
+    def commit(self, batch: List[Tuple[Dict, Tuple[str, int]]]) -> List[Dict]:
+        """
+        Append (quote, claim) pairs to the database
+
+        The batch's claims are released whether or not the write succeeds.
+
+        Returns:
+            The quotes added; the rest turned out to duplicate quotes
+            another writer stored since they were claimed
+        """
+        with self._lock, locked(self.quotes_file):
+            try:
+                added, loaded_mtime = self._append(batch)
+            except BaseException:
+                self._settle(batch)
+                try:
+                    self._load()  # Rebuild the index without the failed claims
+                except (OSError, ValueError):
+                    self.loaded_mtime = None
+                raise
+            self._settle(batch)
+            if not added:
+                return []
+
+        if self.on_commit:
+            self.on_commit(added, loaded_mtime)
+        return added
+
+    def _append(self, batch: List[Tuple[Dict, Tuple[str, int]]]) -> Tuple[List[Dict], Optional[float]]:
+        """Write the quotes in batch that are still new; returns them and the mtime checked against"""
+        mtime = os.path.getmtime(self.quotes_file) if os.path.exists(self.quotes_file) else None
+        if mtime != self.loaded_mtime:
+            self._load()
+
+        added = [quote for quote, key in batch if key not in self.stale]
+        loaded_mtime = self.loaded_mtime
+        if added:
+            temp_file = self.quotes_file + '.tmp'
+            with open(temp_file, 'wb') as f:
+                self._write(f, added)
+            os.replace(temp_file, self.quotes_file)
+            self.quotes.extend(added)
+            self.loaded_mtime = os.path.getmtime(self.quotes_file)
+        return added, loaded_mtime
+
+    def _write(self, f, added: List[Dict]):
+        """
+        Write the stored quotes plus added to f, as json.dump(indent=2) would
+
+        The stored quotes are copied from the file as bytes, up to its closing
+        bracket, and only the added ones are encoded, so a commit costs a
+        file copy rather than re-encoding the whole database.
+        """
+        encoded = json.dumps(added, indent=2, ensure_ascii=False).encode('utf-8')
+        end = self._last_item_end() if self.quotes else None
+        if end is None:
+            if self.quotes:
+                # Not a file we can append to in place; encode it all
+                encoded = json.dumps(self.quotes + added, indent=2, ensure_ascii=False).encode('utf-8')
+            f.write(encoded)
+            return
+
+        with open(self.quotes_file, 'rb') as source:
+            remaining = end
+            while remaining:
+                chunk = source.read(min(remaining, 1024 * 1024))
+                if not chunk:
+                    raise OSError(f"{self.quotes_file} changed while appending")
+                f.write(chunk)
+                remaining -= len(chunk)
+        # "[\n  {...}\n]" continues the array as ",\n  {...}\n]"
+        f.write(b',' + encoded[1:])
+
+    def _last_item_end(self) -> Optional[int]:
+        """Offset just past the last item of the file's array, or None if it doesn't end in ']'"""
+        with open(self.quotes_file, 'rb') as f:
+            start = max(0, f.seek(0, os.SEEK_END) - 4096)
+            f.seek(start)
+            tail = f.read().rstrip()
+        if not tail.endswith(b']'):
+            return None
+        last = tail[:-1].rstrip()
+        if not last or last.endswith(b'['):
+            return None
+        return start + len(last)
+
+    def _settle(self, batch: List[Tuple[Dict, Tuple[str, int]]]):
+        """Forget the batch's claims, committed or not"""
+        for _, key in batch:
+            self.pending.pop(key, None)
+            self.stale.discard(key)
+
+
+class StageMetrics:
+    """Counters for one pipeline stage"""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.items_in = 0
+        self.items_out = 0
+        self.errors = 0
+        self.busy = 0.0     # Seconds spent processing
+        self.blocked = 0.0  # Seconds spent waiting for room downstream
+        self.max_queue = 0
+        self._lock = threading.Lock()
+
+    def as_dict(self) -> Dict:
+        return {
+            'workers': self.workers,
+            'in': self.items_in,
+            'out': self.items_out,
+            'errors': self.errors,
+            'busy_s': round(self.busy, 3),
+            'blocked_s': round(self.blocked, 3),
+            'max_queue': self.max_queue,
+        }
+
+
+class Stage:
+    """
+    Worker threads applying a function to items from a bounded queue
+
+    The function returns the items to pass on (any number). finish, if
+    given, runs once after the last item, on the last worker to stop.
+    """
+
+    def __init__(self, name: str, func: Callable[[object], Iterable], workers: int = 1,
+                 queue_size: int = QUEUE_SIZE, finish: Optional[Callable[[], Iterable]] = None):
+        self.name = name
+        self.func = func
+        self.finish = finish
+        self.inbox: queue.Queue = queue.Queue(queue_size)
+        self.metrics = StageMetrics(workers)
+        self.next: Optional['Stage'] = None
+        self._running = workers
+        self._threads: List[threading.Thread] = []
+
+    def put(self, item, metrics: Optional[StageMetrics] = None):
+        """Queue an item, counting the wait against the sending stage"""
+        started = time.monotonic()
+        self.inbox.put(item)
+        if metrics is not None:
+            metrics.blocked += time.monotonic() - started
+        depth = self.inbox.qsize()
+        if depth > self.metrics.max_queue:
+            self.metrics.max_queue = depth
+
+    def start(self, context: contextvars.Context):
+        """Start the workers, each in a copy of context"""
+        for number in range(self.metrics.workers):
+            thread = threading.Thread(target=context.copy().run, args=(self._work,),
+                                      name=f'ingest-{self.name}-{number}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _emit(self, items: Iterable):
+        for item in items or ():
+            with self.metrics._lock:
+                self.metrics.items_out += 1
+            if self.next is not None:
+                self.next.put(item, self.metrics)
+
+    def _work(self):
+        metrics = self.metrics
+        while True:
+            item = self.inbox.get()
+            if item is _DONE:
+                break
+            with metrics._lock:
+                metrics.items_in += 1
+            started = time.monotonic()
+            try:
+                outputs = list(self.func(item) or ())
+            except Exception as e:
+                with metrics._lock:
+                    metrics.errors += 1
+                logger.warning("Ingest %s failed: %s", self.name, e)
+                outputs = []
+            with metrics._lock:
+                metrics.busy += time.monotonic() - started
+            self._emit(outputs)
+
+        with metrics._lock:
+            self._running -= 1
+            last = self._running == 0
+        if last:
+            if self.finish:
+                started = time.monotonic()
+                try:
+                    outputs = list(self.finish() or ())
+                except Exception as e:
+                    with metrics._lock:
+                        metrics.errors += 1
+                    logger.warning("Ingest %s failed: %s", self.name, e)
+                    outputs = []
+                with metrics._lock:
+                    metrics.busy += time.monotonic() - started
+                self._emit(outputs)
+            if self.next is not None:
+                for _ in range(self.next.metrics.workers):
+                    self.next.put(_DONE)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+
+class IngestPipeline:
+    """
+    Runs sources through fetch, parse, normalize, dedup and store
+
+    Args:
+        store: Where new quotes go
+        workers: Threads per stage, overriding STAGE_WORKERS
+        queue_size: Items allowed to wait between stages
+        batch_size: Quotes per commit
+    """
+
+    def __init__(self, store: QuoteStore, workers: Optional[Dict[str, int]] = None,
+                 queue_size: int = QUEUE_SIZE, batch_size: int = STORE_BATCH_SIZE):
+        self.store = store
+        self.workers = {**STAGE_WORKERS, **(workers or {})}
+        # Decisions and writes happen in one thread each
+        self.workers['dedup'] = self.workers['store'] = 1
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+
+    def run(self, sources: List) -> Dict:
+        """
+        Ingest every source and return a summary with per-stage metrics
+
+        Every stage's threads run in the caller's context (request id).
+        """
+        summary = {'sources': [source.name for source in sources],
+                   'added': 0, 'duplicates': 0, 'invalid': 0, 'failed': 0, 'batches': 0}
+        batch: List[Tuple[Dict, Tuple[str, int]]] = []
+        counter_lock = threading.Lock()
+
+        def fetch(item):
+            source, task = item
+            source.wait_turn()
+            raw = source.fetch(task)
+            return [] if raw is None else [(source, task, raw)]
+
+        def parse(item):
+            source, task, raw = item
+            return [(source, record) for record in source.parse(raw, task)]
+
+        def normalize(item):
+            source, record = item
+            try:
+                return [normalize_record(record, source.category, source.label(record))]
+            except ValueError:
+                with counter_lock:
+                    summary['invalid'] += 1
+                return []
+
+        def dedup(quote):
+            claim = self.store.claim(quote['text'])
+            if claim is None:
+                with counter_lock:
+                    summary['duplicates'] += 1
+                return []
+            return [(quote, claim)]
+
+        def commit():
+            if not batch:
+                return []
+            size = len(batch)
+            try:
+                added = self.store.commit(batch)
+            except Exception:
+                with counter_lock:
+                    summary['failed'] += size
+                raise
+            finally:
+                # A failed batch is dropped, not retried with the next one
+                batch.clear()
+            with counter_lock:
+                summary['duplicates'] += size - len(added)
+                summary['added'] += len(added)
+                summary['batches'] += 1
+            return []
+
+        def store(item):
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                commit()
+            return []
+
+        stages = [
+            Stage('fetch', fetch, self.workers['fetch'], self.queue_size),
+            Stage('parse', parse, self.workers['parse'], self.queue_size),
+            Stage('normalize', normalize, self.workers['normalize'], self.queue_size),
+            Stage('dedup', dedup, self.workers['dedup'], self.queue_size),
+            Stage('store', store, self.workers['store'], self.queue_size, finish=commit),
+        ]
+        for stage, next_stage in zip(stages, stages[1:]):
+            stage.next = next_stage
+
+        started = time.monotonic()
+        context = contextvars.copy_context()
+        for stage in stages:
+            stage.start(context)
+
+        # The source stage: this thread lists each source's tasks
+        source_metrics = StageMetrics(1)
+        for source in sources:
+            try:
+                for task in source.tasks():
+                    source_metrics.items_in += 1
+                    source_metrics.items_out += 1
+                    stages[0].put((source, task), source_metrics)
+            except Exception as e:
+                source_metrics.errors += 1
+                logger.warning("Ingest source %s failed: %s", source.name, e)
+        for _ in range(stages[0].metrics.workers):
+            stages[0].put(_DONE)
+        for stage in stages:
+            stage.join()
+
+        summary['seconds'] = round(time.monotonic() - started, 3)
+        summary['stages'] = {'source': source_metrics.as_dict(),
+                             **{stage.name: stage.metrics.as_dict() for stage in stages}}
+        logger.info("Ingested %d quotes from %s (%d duplicates, %d invalid) in %.1fs",
+                    summary['added'], ', '.join(summary['sources']), summary['duplicates'],
+                    summary['invalid'], summary['seconds'])
+        return summary
@@ -6,9 +6,17 @@ Scrapes the 3 ideas from the web version of the 3-2-1 newsletter
 import requests
 from bs4 import BeautifulSoup
 import json
+import logging
 import re
-from datetime import datetime
-from typing import List, Dict
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Tuple
+
+from canonicalize import canonical_text
+
+logger = logging.getLogger(__name__)
+
+# First 3-2-1 newsletter
+FIRST_ISSUE = datetime(2019, 11, 7)
 
 
 class NewsletterWebScraper:
@@ -41,7 +49,7 @@ class NewsletterWebScraper:
             return None
 
         except Exception as e:
-            print(f"Error getting latest newsletter: {e}")
+            logger.error("Error getting latest newsletter: %s", e)
             return None
 
     def extract_ideas_from_newsletter(self, url: str) -> List[str]:
@@ -58,79 +66,86 @@ class NewsletterWebScraper:
         etc.
         """
         try:
-            response = self.session.get(url)
-            response.raise_for_status()
-
-            soup = BeautifulSoup(response.text, 'html.parser')
-            ideas = []
+            html = self.fetch_newsletter(url)
+            return self.parse_ideas_from_html(html) if html else []
 
-            # Find the "3 IDEAS FROM ME" heading
-            ideas_heading = soup.find('h2', string=re.compile(r'3 IDEAS FROM ME', re.IGNORECASE))
-
-            if not ideas_heading:
-                print("Could not find '3 IDEAS FROM ME' section")
-                return []
+        except Exception as e:
+            logger.warning("Error extracting ideas from %s: %s", url, e)
+            return []
 
-            # Get all content between "3 IDEAS FROM ME" and "2 QUOTES FROM OTHERS"
-            current = ideas_heading.find_next_sibling()
-            idea_text = []
+    def fetch_newsletter(self, url: str) -> Optional[str]:
+        """HTML of a newsletter page, or None if there is no issue at that URL"""
+        response = self.session.get(url, timeout=10)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.text
 
-            while current:
-                # Stop when we hit "2 QUOTES FROM OTHERS"
-                if current.name == 'h2' and '2 QUOTES' in current.get_text().upper():
-                    break
+    def parse_ideas_from_html(self, html: str) -> List[str]:
+        """
+        Extract the 3 ideas from the HTML of a newsletter page
 
-                # Collect paragraph text
-                if current.name == 'p':
-                    text = current.get_text(strip=True)
+        Kept separate from the HTTP fetch so the parser can be benchmarked
+        offline (see benchmarks/parser_benchmark.py)
+        """
+        soup = BeautifulSoup(html, 'html.parser')
+        ideas = []
 
-                    # Skip the Roman numerals (I., II., III.)
-                    if text and not re.match(r'^I{1,3}\.$', text):
-                        # Filter out "Share on Twitter" or similar social media mentions
-                        if not re.search(r'share on twitter|tweet|click to share', text, re.IGNORECASE):
-                            idea_text.append(text)
+        # Find the "3 IDEAS FROM ME" heading
+        ideas_heading = soup.find('h2', string=re.compile(r'3 IDEAS FROM ME', re.IGNORECASE))
 
-                # If we hit an <hr>, we've completed an idea
-                elif current.name == 'hr' and idea_text:
-                    # Join the accumulated text for this idea
-                    full_idea = ' '.join(idea_text).strip()
+        if not ideas_heading:
+            logger.warning("Could not find '3 IDEAS FROM ME' section")
+            return []
 
-                    # Clean up quotes
-                    full_idea = full_idea.strip('"').strip('"').strip('"')
+        # Get all content between "3 IDEAS FROM ME" and "2 QUOTES FROM OTHERS"
+        current = ideas_heading.find_next_sibling()
+        idea_text = []
 
-                    # Final filter: Remove any trailing Twitter mentions
-                    full_idea = re.sub(r'\s*\(?\s*share on twitter.*$', '', full_idea, flags=re.IGNORECASE).strip()
+        while current:
+            # Stop when we hit "2 QUOTES FROM OTHERS"
+            if current.name == 'h2' and '2 QUOTES' in current.get_text().upper():
+                break
 
-                    if len(full_idea) > 10:
-                        ideas.append(full_idea)
+            # Collect paragraph text
+            if current.name == 'p':
+                text = current.get_text(strip=True)
 
-                    idea_text = []  # Reset for next idea
+                # Skip the Roman numerals (I., II., III.)
+                if text and not re.match(r'^I{1,3}\.$', text):
+                    # Filter out "Share on Twitter" or similar social media mentions
+                    if not re.search(r'share on twitter|tweet|click to share', text, re.IGNORECASE):
+                        idea_text.append(text)
 
-                current = current.find_next_sibling()
+            # If we hit an <hr>, we've completed an idea
+            elif current.name == 'hr' and idea_text:
+                # Join the accumulated text for this idea and clean it up
+                full_idea = canonical_text(' '.join(idea_text))
 
-            # Don't forget the last idea if there's no final <hr>
-            if idea_text:
-                full_idea = ' '.join(idea_text).strip()
-                full_idea = full_idea.strip('"').strip('"').strip('"')
-                full_idea = re.sub(r'\s*\(?\s*share on twitter.*$', '', full_idea, flags=re.IGNORECASE).strip()
                 if len(full_idea) > 10:
                     ideas.append(full_idea)
 
-            return ideas[:3]  # Only return first 3
+                idea_text = []  # Reset for next idea
 
-        except Exception as e:
-            print(f"Error extracting ideas from {url}: {e}")
-            return []
+            current = current.find_next_sibling()
+
+        # Don't forget the last idea if there's no final <hr>
+        if idea_text:
+            full_idea = canonical_text(' '.join(idea_text))
+            if len(full_idea) > 10:
+                ideas.append(full_idea)
+
+        return ideas[:3]  # Only return first 3
 
     def get_latest_ideas(self) -> Dict:
         """Get the 3 ideas from the most recent newsletter"""
         url = self.get_latest_newsletter_url()
 
         if not url:
-            print("Could not find latest newsletter")
+            logger.warning("Could not find latest newsletter")
             return None
 
-        print(f"Scraping latest newsletter: {url}")
+        logger.info("Scraping latest newsletter: %s", url)
         ideas = self.extract_ideas_from_newsletter(url)
 
         if ideas:
@@ -161,7 +176,7 @@ class NewsletterWebScraper:
                 if not url.startswith('http'):
                     url = 'https://jamesclear.com' + url
 
-                print(f"Scraping: {url}")
+                logger.info("Scraping: %s", url)
                 ideas = self.extract_ideas_from_newsletter(url)
 
                 if ideas:
@@ -175,78 +190,34 @@ class NewsletterWebScraper:
             return newsletters
 
         except Exception as e:
-            print(f"Error scraping recent newsletters: {e}")
+            logger.error("Error scraping recent newsletters: %s", e)
             return []
 
-    def scrape_all_newsletters(self) -> List[Dict]:
-        """
-        Scrape ALL 3-2-1 newsletters going back to 2019
-
-        The newsletters follow a pattern:
-        https://jamesclear.com/3-2-1/december-25-2025
-        https://jamesclear.com/3-2-1/december-18-2025
-        etc.
-
-        Published every Thursday since November 2019
-        """
-        import time
-        from datetime import timedelta
-
-        newsletters = []
-
-        # Start from today and go back to November 2019
-        start_date = datetime(2019, 11, 7)  # First 3-2-1 newsletter
-        current_date = datetime.now()
-
-        print(f"Scraping newsletters from {start_date.date()} to {current_date.date()}...")
-        print("This will take a few minutes (respecting rate limits)...")
-
-        # Generate all Thursday dates
+    @staticmethod
+    def newsletter_urls(start_date: datetime, end_date: datetime) -> List[Tuple[str, datetime]]:
+        """(URL, date) of every Thursday between two dates, when issues come out"""
         date = start_date
-        urls_to_try = []
-
-        while date <= current_date:
+        urls = []
+        while date <= end_date:
             # 3-2-1 is published on Thursdays (weekday 3)
             if date.weekday() == 3:  # Thursday
                 # Format: december-25-2025
                 url = f"https://jamesclear.com/3-2-1/{date.strftime('%B').lower()}-{date.day}-{date.year}"
-                urls_to_try.append((url, date))
+                urls.append((url, date))
             date += timedelta(days=1)
+        return urls
 
-        print(f"Found {len(urls_to_try)} potential newsletter dates")
-
-        successful = 0
-        failed = 0
-
-        for url, date in urls_to_try:
-            try:
-                # Rate limiting - be respectful
-                time.sleep(0.5)  # Half second between requests
-
-                ideas = self.extract_ideas_from_newsletter(url)
-
-                if ideas:
-                    newsletters.append({
-                        'url': url,
-                        'date': date.strftime('%Y-%m-%d'),
-                        'ideas': ideas,
-                        'scraped_at': datetime.now().isoformat()
-                    })
-                    successful += 1
-                    print(f"✓ {date.strftime('%Y-%m-%d')}: {len(ideas)} ideas")
-                else:
-                    failed += 1
-
-            except Exception as e:
-                failed += 1
-                # Don't print errors for every 404 (newsletter might not exist for that date)
-                if failed % 10 == 0:
-                    print(f"  Checked {successful + failed} dates so far...")
-
-        print(f"\n✅ Successfully scraped {successful} newsletters")
-        print(f"   Total ideas: {sum(len(n['ideas']) for n in newsletters)}")
+    @staticmethod
+    def newsletter_date(url: str) -> Optional[str]:
+        """Issue date (YYYY-MM-DD) from a newsletter URL like /3-2-1/december-25-2025"""
+        match = re.search(r'/3-2-1/([a-z]+-\d{1,2}-\d{4})', url or '')
+        if not match:
+            return None
+        try:
+            return datetime.strptime(match.group(1), '%B-%d-%Y').strftime('%Y-%m-%d')
+        except ValueError:
+            return None
 
-        return newsletters
     def save_newsletter_ideas(self, newsletters: List[Dict], filename: str = 'data/newsletter_ideas.json'):
         """Save newsletter ideas to file"""
         import os
@@ -254,10 +225,12 @@ class NewsletterWebScraper:
 
         with open(filename, 'w', encoding='utf-8') as f:
             json.dump(newsletters, f, indent=2, ensure_ascii=False)
-        print(f"Saved {len(newsletters)} newsletters to {filename}")
+        logger.info("Saved %d newsletters to %s", len(newsletters), filename)
 
 
 if __name__ == '__main__':
+    from structured_log import setup_logging
+    setup_logging()
     scraper = NewsletterWebScraper()
 
     # Get latest newsletter
@@ -0,0 +1,231 @@
+"""
+Request Profiler
+Opt-in sampling profiler for the request hot path
+
+A background thread samples the stacks of threads serving profiled requests
+every few milliseconds and counts them as folded stacks
+("GET /plugin;server.py:plugin_endpoint;display_manager.py:pick_quote_for_user 42"),
+the input format of flamegraph.pl, speedscope and inferno.
+
+Requests are profiled when:
+- TRMNL_PROFILE_RATE is set to a fraction of requests to sample (e.g. 0.01), or
+- they carry an X-Profile header matching TRMNL_PROFILE_TOKEN
+
+When neither is set the server's hooks reduce to one attribute check, so the
+profiler can stay deployed. Each worker flushes its counts to
+data/profiles/<pid>.folded; GET /admin/profile merges them.
+
+Other settings:
+- TRMNL_PROFILE_INTERVAL_MS: Sampling interval (default 5)
+- TRMNL_PROFILE_DIR: Where workers write their folded stacks (default data/profiles)
+"""
+
+import contextvars
+import glob
+import hmac
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Seconds between flushes of a worker's counts to its folded file
+FLUSH_INTERVAL = 10
+
+# Root label of the request being profiled, carried into work it hands to
+# other threads with the context (see current_label)
+_label: contextvars.ContextVar = contextvars.ContextVar('profile_label', default=None)
+
+
+def fold_stack(frame, root: str) -> str:
+    """Folded form of a stack, outermost frame first, under a root label"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    names.append(root)
+    return ';'.join(reversed(names))
+
+
+def merge_folded(paths) -> Counter:
+    """Sum the counts of folded stack files"""
+    counts: Counter = Counter()
+    for path in paths:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    stack, _, count = line.rstrip('\n').rpartition(' ')
+                    if stack and count.isdigit():
+                        counts[stack] += int(count)
+        except OSError:
+            continue
+    return counts
+
+
+def format_folded(counts: Counter) -> str:
+    """Folded stack text, heaviest stacks first"""
+    return ''.join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of registered threads
+
+    Call begin(label) on the thread serving a request to start sampling it
+    and end() when it is done. Work the request hands to another thread
+    (in a copy of its context) is sampled by calling begin(current_label())
+    and end() there too. The sampler thread starts with the first profiled
+    request, so workers that never profile never run it.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, token: str = '', interval: float = 0.005,
+                 output_dir: str = 'data/profiles'):
+        self.sample_rate = sample_rate
+        self.token = token
+        self.interval = interval
+        self.output_dir = output_dir
+        self.enabled = sample_rate > 0 or bool(token)
+
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self.active: Dict[int, str] = {}  # thread ident -> root label
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = os.getpid()
+        try:
+            self._reset_seen = os.path.getmtime(self._reset_file())
+        except OSError:
+            self._reset_seen = 0.0
+
+    @classmethod
+    def from_env(cls) -> 'SamplingProfiler':
+        """Profiler configured from TRMNL_PROFILE_* environment variables"""
+        return cls(
+            sample_rate=float(os.environ.get('TRMNL_PROFILE_RATE', 0) or 0),
+            token=os.environ.get('TRMNL_PROFILE_TOKEN', ''),
+            interval=float(os.environ.get('TRMNL_PROFILE_INTERVAL_MS', 5) or 5) / 1000,
+            output_dir=os.environ.get('TRMNL_PROFILE_DIR', 'data/profiles'),
+        )
+
+    def authorized(self, header_value: Optional[str]) -> bool:
+        """Whether a header value matches the profiling token"""
+        return bool(self.token and header_value) and hmac.compare_digest(header_value, self.token)
+
+    def wants(self, header_value: Optional[str]) -> bool:
+        """Whether to profile a request, given its X-Profile header"""
+        return self.authorized(header_value) or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def begin(self, label: str):
+        """Start sampling the current thread"""
+        self._ensure_thread()
+        _label.set(label)
+        with self._lock:
+            self.active[threading.get_ident()] = label
+
+    def end(self):
+        """Stop sampling the current thread"""
+        _label.set(None)
+        with self._lock:
+            self.active.pop(threading.get_ident(), None)
+
+    @staticmethod
+    def current_label() -> Optional[str]:
+        """Label of the profiled request this context belongs to, if any"""
+        return _label.get()
+
+    def _ensure_thread(self):
+        # A forked worker inherits the object but not the thread
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self.counts.clear()
+                self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            time.sleep(self.interval)
+            if self.active:
+                self.sample()
+            if time.monotonic() - last_flush >= FLUSH_INTERVAL:
+                last_flush = time.monotonic()
+                self.flush()
+
+    def sample(self):
+        """Count the current stack of every profiled thread"""
+        frames = sys._current_frames()
+        with self._lock:
+            for ident, label in self.active.items():
+                frame = frames.get(ident)
+                if frame is not None:
+                    self.counts[fold_stack(frame, label)] += 1
+                    self.samples += 1
+
+    def snapshot(self) -> Counter:
+        """This worker's counts so far"""
+        with self._lock:
+            return Counter(self.counts)
+
+    def output_file(self) -> str:
+        return os.path.join(self.output_dir, f'{os.getpid()}.folded')
+
+    def _reset_file(self) -> str:
+        return os.path.join(self.output_dir, 'RESET')
+
+    def flush(self):
+        """Write this worker's counts to its folded file (write-then-rename)"""
+        # Another worker handled a reset since our last flush: start over too
+        try:
+            reset_at = os.path.getmtime(self._reset_file())
+        except OSError:
+            reset_at = 0.0
+        if reset_at > self._reset_seen:
+            self._reset_seen = reset_at
+            with self._lock:
+                self.counts.clear()
+                self.samples = 0
+
+        counts = self.snapshot()
+        if not counts:
+            return
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            path = self.output_file()
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                f.write(format_folded(counts))
+            os.replace(path + '.tmp', path)
+        except OSError as e:
+            logger.warning("Could not write profile: %s", e)
+
+    def merged(self) -> Counter:
+        """Counts of every worker: the flushed files, with this worker's live counts"""
+        own = self.output_file()
+        others = [path for path in glob.glob(os.path.join(self.output_dir, '*.folded')) if path != own]
+        return merge_folded(others) + self.snapshot()
+
+    def reset(self):
+        """
+        Start a new profile: drops this worker's counts and the flushed files,
+        and the other workers drop theirs at their next flush
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(self._reset_file(), 'w'):
+            pass
+        self._reset_seen = os.path.getmtime(self._reset_file())
+        with self._lock:
+            self.counts.clear()
+            self.samples = 0
+        for path in glob.glob(os.path.join(self.output_dir, '*.folded')):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
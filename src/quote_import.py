@@ -0,0 +1,169 @@
+"""
+Quote Import
+Bulk import of curated quotes from NDJSON, one record per line:
+
+    {"text": "...", "category": "atomic-habits", "source": "Atomic Habits", "date": "2018-10-16"}
+
+Records stream through validate -> canonicalize -> deduplicate and are
+committed to data/quotes.json in fixed-size batches, so memory stays bounded
+by the database plus one batch however large the import is. A commit copies
+the stored quotes as bytes and encodes only the batch. Records are normalized
+and stored by the same code as scraped quotes (normalize_record and
+QuoteStore in ingest.py): commits take an exclusive lock on
+data/quotes.json.lock and write-then-rename, so concurrent writers don't
+lose each other's quotes and readers never see a partial file.
+
+Run directly to import a file without going through the server:
+    python src/quote_import.py curated.ndjson
+"""
+
+import argparse
+import json
+import os
+import sys
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Add src directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from ingest import QuoteStore, normalize_record
+
+# Records written to the database per commit
+IMPORT_BATCH_SIZE = 500
+
+# Longest accepted line; longer lines are rejected without being held in memory
+MAX_LINE_BYTES = 64 * 1024
+
+# Line errors kept in the import summary
+MAX_REPORTED_ERRORS = 20
+
+
+def parse_record(line: bytes) -> Dict:
+    """
+    Quote record from one NDJSON line, with canonical text
+
+    Raises:
+        ValueError: If the line is not a valid quote record
+    """
+    try:
+        record = json.loads(line)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid JSON: {e}")
+    if not isinstance(record, dict):
+        raise ValueError("Record must be a JSON object")
+    return normalize_record(record)
+
+
+def read_lines(stream: BinaryIO) -> Iterator[Tuple[int, Optional[bytes]]]:
+    """
+    (line number, line) for each non-blank line of a binary stream
+
+    Lines over MAX_LINE_BYTES come back as None and are skipped through
+    without being held in memory.
+    """
+    number = 0
+    while True:
+        line = stream.readline(MAX_LINE_BYTES + 1)
+        if not line:
+            return
+        number += 1
+        if len(line) > MAX_LINE_BYTES and not line.endswith(b'\n'):
+            while line and not line.endswith(b'\n'):
+                line = stream.readline(MAX_LINE_BYTES)
+            yield number, None
+        elif line.strip():
+            yield number, line
+
+
+class QuoteImporter:
+    """
+    Streams NDJSON records into a quotes file
+
+    Args:
+        quotes_file: Database to append to
+        batch_size: Records per commit
+        on_commit: Called with (new_quotes, loaded_mtime) after each commit,
+            as apply_new_quotes in the server expects
+        on_progress: Called with the summary after each commit
+    """
+
+    def __init__(self, quotes_file: str = 'data/quotes.json', batch_size: int = IMPORT_BATCH_SIZE,
+                 on_commit: Optional[Callable[[List[Dict], Optional[float]], None]] = None,
+                 on_progress: Optional[Callable[[Dict], None]] = None):
+        self.store = QuoteStore(quotes_file, on_commit)
+        self.batch_size = batch_size
+        self.on_progress = on_progress
+        self.summary = {'lines': 0, 'added': 0, 'duplicates': 0, 'invalid': 0, 'batches': 0, 'errors': []}
+
+    def _error(self, line_number: int, message: str):
+        self.summary['invalid'] += 1
+        if len(self.summary['errors']) < MAX_REPORTED_ERRORS:
+            self.summary['errors'].append({'line': line_number, 'error': message})
+
+    def validated(self, lines: Iterable[Tuple[int, Optional[bytes]]]) -> Iterator[Dict]:
+        """Stage 1: parse, validate and canonicalize, counting rejected lines"""
+        for line_number, line in lines:
+            self.summary['lines'] += 1
+            if line is None:
+                self._error(line_number, f"Line longer than {MAX_LINE_BYTES} bytes")
+                continue
+            try:
+                yield parse_record(line)
+            except ValueError as e:
+                self._error(line_number, str(e))
+
+    def unique(self, quotes: Iterable[Dict]) -> Iterator[Tuple[Dict, Tuple]]:
+        """Stage 2: drop near-duplicates of stored quotes and of earlier records"""
+        for quote in quotes:
+            claim = self.store.claim(quote['text'])
+            if claim is None:
+                self.summary['duplicates'] += 1
+                continue
+            yield quote, claim
+
+    def commit(self, batch: List[Tuple[Dict, Tuple]]):
+        """Stage 3: append a batch to the database"""
+        added = self.store.commit(batch)
+        self.summary['duplicates'] += len(batch) - len(added)
+        if not added:
+            return
+        self.summary['added'] += len(added)
+        self.summary['batches'] += 1
+        if self.on_progress:
+            self.on_progress(self.summary)
+
+    def run(self, stream: BinaryIO) -> Dict:
+        """Import every record in an NDJSON stream and return the summary"""
+        batch: List[Tuple[Dict, Tuple]] = []
+        for quote in self.unique(self.validated(read_lines(stream))):
+            batch.append(quote)
+            if len(batch) >= self.batch_size:
+                self.commit(batch)
+                batch = []
+        if batch:
+            self.commit(batch)
+        return self.summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import curated quotes from an NDJSON file')
+    parser.add_argument('input', help="NDJSON file ('-' for stdin)")
+    parser.add_argument('--file', default='data/quotes.json', help='Quotes database to append to')
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help='Records per commit')
+    args = parser.parse_args()
+
+    importer = QuoteImporter(args.file, args.batch_size,
+                             on_progress=lambda s: print(f"  {s['added']} added after {s['lines']} lines"))
+    if args.input == '-':
+        summary = importer.run(sys.stdin.buffer)
+    else:
+        with open(args.input, 'rb') as f:
+            summary = importer.run(f)
+
+    for error in summary['errors']:
+        print(f"line {error['line']}: {error['error']}")
+    print(f"Added {summary['added']} quotes ({summary['duplicates']} duplicates, "
+          f"{summary['invalid']} invalid) from {summary['lines']} lines")
+
+
+if __name__ == '__main__':
+    main()
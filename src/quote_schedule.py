@@ -0,0 +1,138 @@
+"""
+Quote Schedule
+What a user's screen will show over a time range ("what will I see tomorrow at 9:00?")
+
+Uses the same selection as /plugin (QuoteDisplayManager.schedule_for_user),
+so it doubles as a correctness oracle: polled at the listed times, /plugin
+returns exactly these quotes.
+
+Usage:
+    python src/quote_schedule.py --user abc123 --start 2025-01-16T09:00 --hours 8 --step 15
+    python src/quote_schedule.py --user abc123 --layouts full,quadrant --json
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+# Add src directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from category_weights import parse_categories
+from display_manager import QuoteDisplayManager, device_profile
+from text_fit import FONT_RANGES
+from user_store import UserStore
+
+# Most slots one schedule may contain (a week of minutes)
+MAX_SLOTS = 7 * 24 * 60
+
+
+def parse_time(value: Optional[str]) -> datetime:
+    """Local time from an ISO 8601 string (now if empty)"""
+    if not value:
+        return datetime.now()
+    return datetime.fromisoformat(value)
+
+
+def build_schedule(manager: QuoteDisplayManager, user_uuid: str, layouts: List[str],
+                   start: datetime, end: datetime, step: int = 1,
+                   width: int = 800, height: int = 480, selected_categories: str = '',
+                   user_store: Optional[UserStore] = None, store_key: Optional[str] = None) -> Dict:
+    """
+    A user's quotes for every step minutes from start up to (not including) end
+
+    The user's current history and exclusions are taken from user_store if
+    given, from the record under store_key (default user_uuid)
+
+    Raises:
+        ValueError: For an invalid layout, range, step or categories field
+    """
+    unknown = [layout for layout in layouts if layout not in FONT_RANGES]
+    if unknown or not layouts:
+        raise ValueError(f"Unknown layouts: {', '.join(unknown) or '(none)'}")
+    if step < 1:
+        raise ValueError("step must be at least 1 minute")
+
+    start_minute = int(start.timestamp() / 60)
+    end_minute = int(end.timestamp() / 60)
+    slots = max(0, -(-(end_minute - start_minute) // step))
+    if slots > MAX_SLOTS:
+        raise ValueError(f"At most {MAX_SLOTS} slots per schedule")
+
+    width, height = device_profile(width, height)
+    categories, weights = parse_categories(selected_categories)
+
+    history = exclude = 0
+    if user_store and user_uuid:
+        user = user_store.get(store_key or user_uuid, manager)
+        history = user.recent_history(start_minute)
+        exclude = user.exclusions
+
+    rows = manager.schedule_for_user(user_uuid, layouts, start_minute, slots, step, width, height,
+                                     categories, weights, history, exclude)
+    return {
+        'user_uuid': user_uuid,
+        'layouts': layouts,
+        'width': width,
+        'height': height,
+        'step': step,
+        'slots': [
+            {
+                'time': datetime.fromtimestamp(row['minute'] * 60).isoformat(),
+                'minute': row['minute'],
+                **{
+                    layout: {
+                        'id': manager.quote_id(quote),
+                        'text': quote['text'],
+                        'category': quote.get('category', ''),
+                    } if quote else None
+                    for layout, quote in row['quotes'].items()
+                },
+            }
+            for row in rows
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the quotes a user will see over a time range")
+    parser.add_argument('--user', required=True, help='user_uuid')
+    parser.add_argument('--start', help='Start time, ISO 8601 local time (default now)')
+    parser.add_argument('--hours', type=float, default=24, help='Length of the range in hours')
+    parser.add_argument('--step', type=int, default=15, help='Minutes between slots (the refresh rate)')
+    parser.add_argument('--layouts', default='full', help='Comma-separated layouts')
+    parser.add_argument('--categories', default='', help='Categories field, as in the plugin settings')
+    parser.add_argument('--width', type=int, default=800)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--file', default='data/quotes.json', help='Quotes database')
+    parser.add_argument('--users-db', default='data/users.db',
+                        help='User store for history and exclusions (ignored if missing)')
+    parser.add_argument('--json', action='store_true', help='Print JSON instead of a table')
+    args = parser.parse_args()
+
+    manager = QuoteDisplayManager(args.file)
+    user_store = UserStore(args.users_db) if os.path.exists(args.users_db) else None
+    start = parse_time(args.start)
+    layouts = [layout.strip() for layout in args.layouts.split(',') if layout.strip()]
+
+    try:
+        schedule = build_schedule(manager, args.user, layouts, start, start + timedelta(hours=args.hours),
+                                  args.step, args.width, args.height, args.categories, user_store)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.json:
+        print(json.dumps(schedule, indent=2, ensure_ascii=False))
+        return
+
+    for slot in schedule['slots']:
+        for layout in layouts:
+            quote = slot[layout]
+            text = f"[{quote['category']}] {quote['text'][:90]}" if quote else '(no quote)'
+            print(f"{slot['time'][:16]}  {layout:15} {text}")
+
+
+if __name__ == '__main__':
+    main()
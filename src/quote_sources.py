@@ -0,0 +1,207 @@
+"""
+Quote Sources
+The scrapers, the email monitor and the webhook as ingestion pipeline sources
+
+A source lists tasks (pages, messages, posted texts), fetches each one and
+parses what it fetched into records ({"text", and optionally "category",
+"source", "date"}). The pipeline in ingest.py does the rest, so a new source
+only needs these three methods.
+
+Newsletter ideas from every source are stored under the 3-2-1-newsletter
+category, with "3-2-1 Newsletter - <issue date>" as the source when the
+issue date is known.
+"""
+
+import threading
+import time
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterable, List, Optional
+
+from corpus_stats import NEWSLETTER_CATEGORY
+
+
+def issue_date(value) -> Optional[str]:
+    """YYYY-MM-DD from an ISO date or timestamp or an email Date header"""
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        return datetime.fromisoformat(value[:10]).strftime('%Y-%m-%d')
+    except ValueError:
+        pass
+    try:
+        return parsedate_to_datetime(value).strftime('%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
+
+
+class Source:
+    """
+    Base class: what to fetch and how to parse it
+
+    category and source fill in records that don't have their own.
+    fetch_interval spaces out this source's fetches (in seconds) however
+    many fetch workers there are, to stay polite to the sites scraped.
+    """
+
+    name = 'source'
+    category: Optional[str] = None
+    source: Optional[str] = None
+    fetch_interval = 0.0
+
+    def __init__(self):
+        self._next_fetch = 0.0
+        self._lock = threading.Lock()
+
+    def tasks(self) -> Iterable:
+        """Work items to fetch"""
+        return []
+
+    def fetch(self, task):
+        """Raw content for a task (None to skip it)"""
+        return task
+
+    def parse(self, raw, task) -> List[Dict]:
+        """Records in fetched content"""
+        return [raw]
+
+    def label(self, record: Dict) -> Optional[str]:
+        """Source for a record without one"""
+        return self.source
+
+    def wait_turn(self):
+        """Sleep until this source may fetch again"""
+        if not self.fetch_interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_fetch - now
+            self._next_fetch = max(now, self._next_fetch) + self.fetch_interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class WebsiteSource(Source):
+    """Quote pages on jamesclear.com, one task per category"""
+
+    name = 'website'
+    source = 'James Clear'
+    fetch_interval = 2.0
+
+    def __init__(self, scraper=None):
+        super().__init__()
+        from scraper import JamesClearScraper
+        self.scraper = scraper or JamesClearScraper()
+
+    def tasks(self) -> Iterable:
+        return self.scraper.QUOTE_CATEGORIES
+
+    def fetch(self, category: str) -> str:
+        return self.scraper.fetch_category(category)
+
+    def parse(self, html: str, category: str) -> List[Dict]:
+        return self.scraper.parse_category_html(html, category)
+
+
+class _NewsletterIdeas(Source):
+    """Newsletter ideas, labelled with their issue date"""
+
+    category = NEWSLETTER_CATEGORY
+
+    def label(self, record: Dict) -> str:
+        if record.get('date'):
+            return f"3-2-1 Newsletter - {record['date']}"
+        return 'James Clear - 3-2-1 Newsletter'
+
+    @staticmethod
+    def ideas(texts: Iterable[str], date: Optional[str]) -> List[Dict]:
+        records = []
+        for text in texts:
+            record = {'text': text}
+            if date:
+                record['date'] = date
+            records.append(record)
+        return records
+
+
+class NewsletterArchiveSource(_NewsletterIdeas):
+    """Every 3-2-1 issue on the web since the first one, by issue date"""
+
+    name = 'newsletter-archive'
+    fetch_interval = 0.5
+
+    def __init__(self, scraper=None, start: Optional[datetime] = None, end: Optional[datetime] = None):
+        super().__init__()
+        from newsletter_scraper import FIRST_ISSUE, NewsletterWebScraper
+        self.scraper = scraper or NewsletterWebScraper()
+        self.start = start or FIRST_ISSUE
+        self.end = end
+
+    def tasks(self) -> Iterable:
+        return self.scraper.newsletter_urls(self.start, self.end or datetime.now())
+
+    def fetch(self, task) -> Optional[str]:
+        url, _ = task
+        return self.scraper.fetch_newsletter(url)
+
+    def parse(self, html: str, task) -> List[Dict]:
+        _, date = task
+        return self.ideas(self.scraper.parse_ideas_from_html(html), date.strftime('%Y-%m-%d'))
+
+
+class LatestNewsletterSource(_NewsletterIdeas):
+    """The most recent 3-2-1 issue on the web"""
+
+    name = 'newsletter-latest'
+
+    def __init__(self, scraper=None):
+        super().__init__()
+        from newsletter_scraper import NewsletterWebScraper
+        self.scraper = scraper or NewsletterWebScraper()
+
+    def tasks(self) -> Iterable:
+        url = self.scraper.get_latest_newsletter_url()
+        return [url] if url else []
+
+    def fetch(self, url: str) -> Optional[str]:
+        return self.scraper.fetch_newsletter(url)
+
+    def parse(self, html: str, url: str) -> List[Dict]:
+        return self.ideas(self.scraper.parse_ideas_from_html(html), self.scraper.newsletter_date(url))
+
+
+class NewsletterSource(_NewsletterIdeas):
+    """
+    Newsletters already fetched: NewsletterMonitor results ("quotes" and an
+    email Date header) or web scraper results ("ideas" and an ISO date)
+    """
+
+    name = 'newsletter'
+
+    def __init__(self, newsletters: List[Dict], name: Optional[str] = None):
+        super().__init__()
+        self.newsletters = newsletters
+        self.name = name or self.name
+
+    def tasks(self) -> Iterable:
+        return self.newsletters
+
+    def parse(self, newsletter: Dict, task) -> List[Dict]:
+        texts = newsletter.get('ideas', newsletter.get('quotes', []))
+        return self.ideas(texts, issue_date(newsletter.get('date')))
+
+
+class WebhookSource(_NewsletterIdeas):
+    """Newsletter idea texts posted to /webhook/newsletter"""
+
+    name = 'webhook'
+
+    def __init__(self, texts: List[str]):
+        super().__init__()
+        self.texts = texts
+
+    def tasks(self) -> Iterable:
+        return self.texts
+
+    def parse(self, text: str, task) -> List[Dict]:
+        return [{'text': text}]
@@ -0,0 +1,176 @@
+"""
+Snapshot Replica
+Keeps a serving node's quotes in sync with a primary node
+
+One node (the primary) runs the updater and scrapers and publishes every
+version of its quotes through /download-quotes: gzip-compressed, with a
+strong ETag and a digest per generation (see corpus_export.py). Replicas
+run this process instead of the updater. It polls the primary with
+If-None-Match, so an unchanged corpus costs a 304. When a new generation
+arrives it is checked against its digest and swapped in by write-then-rename.
+The replica's server workers then reload it the same way they pick up
+updater writes. Collections in data/corpora are mirrored the same way.
+
+Adding replicas adds serving capacity without adding any scraping.
+
+Usage:
+    python src/replica.py --primary http://primary:5000            # poll every 30s
+    python src/replica.py --primary http://primary:5000 --once     # sync once and exit
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from typing import List, Optional
+
+import requests
+
+# Add src directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from corpus_registry import DEFAULT_CORPUS, valid_corpus_name
+from structured_log import setup_logging
+
+logger = logging.getLogger('replica')
+
+# Seconds between polls of the primary
+POLL_INTERVAL = 30
+
+
+def file_digest(path: str) -> Optional[str]:
+    """Digest of a local file, as the primary computes it for its generations"""
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()[:32]
+    except FileNotFoundError:
+        return None
+
+
+class SnapshotReplica:
+    """Mirrors the primary's quotes and collections into local files"""
+
+    def __init__(self, primary_url: str, quotes_file: str = 'data/quotes.json',
+                 corpora_dir: str = 'data/corpora', timeout: float = 30):
+        self.primary_url = primary_url.rstrip('/')
+        self.quotes_file = quotes_file
+        self.corpora_dir = corpora_dir
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def path(self, corpus: str) -> str:
+        """Local file a collection is mirrored to"""
+        if corpus == DEFAULT_CORPUS:
+            return self.quotes_file
+        return os.path.join(self.corpora_dir, f'{corpus}.json')
+
+    def primary_corpora(self) -> List[str]:
+        """Collections the primary serves"""
+        response = self.session.get(f'{self.primary_url}/corpora', timeout=self.timeout)
+        response.raise_for_status()
+        return [name for name in response.json().get('corpora', [])
+                if name == DEFAULT_CORPUS or valid_corpus_name(name)]
+
+    def sync_corpus(self, corpus: str) -> bool:
+        """
+        Fetch a collection if the primary has a newer generation
+
+        Returns:
+            Whether the local file was replaced
+        """
+        path = self.path(corpus)
+        headers = {'Accept-Encoding': 'gzip'}
+        local_digest = file_digest(path)
+        if local_digest:
+            # The primary's ETag for a gzip download is "<digest>-gzip"
+            headers['If-None-Match'] = f'"{local_digest}-gzip", "{local_digest}"'
+
+        params = {} if corpus == DEFAULT_CORPUS else {'corpus': corpus}
+        response = self.session.get(f'{self.primary_url}/download-quotes', params=params,
+                                    headers=headers, timeout=self.timeout)
+        if response.status_code == 304:
+            return False
+        response.raise_for_status()
+
+        # requests has already undone the gzip encoding
+        data = response.content
+        digest = hashlib.sha256(data).hexdigest()[:32]
+        expected = response.headers.get('X-Corpus-Digest')
+        if expected and digest != expected:
+            raise ValueError(f"Snapshot of {corpus} failed verification ({digest} != {expected})")
+        if not isinstance(json.loads(data), list):
+            raise ValueError(f"Snapshot of {corpus} is not a list of quotes")
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        temp_file = path + '.tmp'
+        with open(temp_file, 'wb') as f:
+            f.write(data)
+        os.replace(temp_file, path)
+
+        logger.info("Swapped in %s generation %s (%d bytes)",
+                    corpus, response.headers.get('X-Corpus-Generation'), len(data))
+        return True
+
+    def sync_once(self) -> int:
+        """
+        Bring every collection up to date with the primary, dropping local
+        collections the primary no longer has
+
+        Returns:
+            Number of collections replaced
+        """
+        corpora = self.primary_corpora()
+        replaced = 0
+        for corpus in corpora:
+            try:
+                replaced += self.sync_corpus(corpus)
+            except (requests.RequestException, ValueError) as e:
+                logger.warning("Could not sync %s from %s: %s", corpus, self.primary_url, e)
+
+        try:
+            local = [file[:-5] for file in os.listdir(self.corpora_dir)
+                     if file.endswith('.json') and valid_corpus_name(file[:-5])]
+        except FileNotFoundError:
+            local = []
+        for corpus in set(local) - set(corpora):
+            os.remove(self.path(corpus))
+            logger.info("Removed %s (no longer on the primary)", corpus)
+        return replaced
+
+    def run(self, interval: float = POLL_INTERVAL):
+        """Poll the primary forever"""
+        logger.info("Replicating %s every %ss", self.primary_url, interval)
+        while True:
+            try:
+                self.sync_once()
+            except (requests.RequestException, ValueError) as e:
+                logger.warning("Primary %s unavailable: %s", self.primary_url, e)
+            time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mirror quotes from a primary node')
+    parser.add_argument('--primary', default=os.environ.get('TRMNL_PRIMARY_URL'),
+                        help='Base URL of the primary (default TRMNL_PRIMARY_URL)')
+    parser.add_argument('--interval', type=float, default=POLL_INTERVAL, help='Seconds between polls')
+    parser.add_argument('--once', action='store_true', help='Sync once and exit')
+    args = parser.parse_args()
+    if not args.primary:
+        parser.error('--primary or TRMNL_PRIMARY_URL is required')
+
+    setup_logging()
+    replica = SnapshotReplica(args.primary)
+    if args.once:
+        try:
+            replica.sync_once()
+        except (requests.RequestException, ValueError) as e:
+            logger.error("Primary %s unavailable: %s", args.primary, e)
+            sys.exit(1)
+    else:
+        replica.run(args.interval)
+
+
+if __name__ == '__main__':
+    main()
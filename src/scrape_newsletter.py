@@ -3,54 +3,35 @@ Local Newsletter Scraper
 Run this locally to scrape all newsletters and save to data/quotes.json
 """
 
-from src.newsletter_scraper import NewsletterWebScraper
-import json
-from datetime import datetime
+import os
+import sys
 
-print("🚀 Starting newsletter scraper...")
-print("⏱️  This will take 5-10 minutes...\n")
-
-# Create scraper
-scraper = NewsletterWebScraper()
-
-# Scrape ALL newsletters
-newsletters = scraper.scrape_all_newsletters()
+# Scraper modules import each other by module name
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from ingest import IngestPipeline, QuoteStore
+from quote_sources import NewsletterArchiveSource
+from structured_log import setup_logging
 
-print(f"\n✅ Scraped {len(newsletters)} newsletters")
-print(f"📊 Total ideas: {sum(len(n['ideas']) for n in newsletters)}")
+# Readable progress from the scraper (it logs through structured_log)
+setup_logging(fmt='text')
 
-# Load existing quotes
-print("\n📂 Loading existing quotes...")
-with open('../data/quotes.json', 'r', encoding='utf-8') as f:
-    quotes = json.load(f)
-
-print(f"   Found {len(quotes)} existing quotes")
+print("🚀 Starting newsletter scraper...")
+print("⏱️  This will take 5-10 minutes...\n")
 
-# Add newsletter ideas
-added = 0
-for newsletter in newsletters:
-    for idea in newsletter['ideas']:
-        # Check if already exists
-        if not any(q['text'] == idea for q in quotes):
-            quotes.append({
-                'text': idea,
-                'category': '3-2-1-newsletter',
-                'source': 'James Clear - 3-2-1 Newsletter',
-                'length': len(idea),
-                'scraped_at': datetime.now().isoformat()
-            })
-            added += 1
+# Scrape ALL newsletters into the existing quotes, skipping ones we already
+# have (ignoring punctuation/quote mark differences)
+store = QuoteStore(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'quotes.json'))
+print(f"📂 Found {len(store.quotes)} existing quotes")
 
-print(f"\n✨ Added {added} new newsletter quotes")
+summary = IngestPipeline(store).run([NewsletterArchiveSource()])
 
-# Save
-print("\n💾 Saving to data/quotes.json...")
-with open('../data/quotes.json', 'w', encoding='utf-8') as f:
-    json.dump(quotes, f, indent=2, ensure_ascii=False)
+print(f"\n✅ Scraped {summary['stages']['parse']['in']} newsletters")
+print(f"📊 Total ideas: {summary['stages']['parse']['out']}")
+print(f"\n✨ Added {summary['added']} new newsletter quotes")
 
 print(f"\n✅ COMPLETE!")
-print(f"📊 Total quotes: {len(quotes)}")
+print(f"📊 Total quotes: {len(store.quotes)}")
 print(f"\nNext steps:")
 print(f"  1. git add data/quotes.json")
 print(f"  2. git commit -m 'Add all newsletter quotes'")
-print(f"  3. git push")
\ No newline at end of file
+print(f"  3. git push")
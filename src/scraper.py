@@ -5,12 +5,16 @@ Scrapes quotes from jamesclear.com quote pages
 
 import requests
 from bs4 import BeautifulSoup
-import json
-import time
+import logging
 from datetime import datetime
 from typing import List, Dict
 import re
 
+from canonicalize import canonical_text
+from structured_log import setup_logging
+
+logger = logging.getLogger(__name__)
+
 
 class JamesClearScraper:
     """Scrapes quotes from James Clear's website"""
@@ -34,84 +38,66 @@ class JamesClearScraper:
     
     def scrape_category(self, category: str) -> List[Dict]:
         """Scrape all quotes from a specific category page"""
-        url = f"{self.BASE_URL}/{category}"
-        print(f"Scraping {url}...")
-        
         try:
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            quotes = []
-            
-            # Find all quote blocks - they're typically in blockquotes or specific divs
-            # This is a generic approach - may need adjustment based on actual HTML structure
-            quote_elements = soup.find_all(['blockquote', 'p'])
-            
-            for element in quote_elements:
-                text = element.get_text(strip=True)
-                
-                # Filter out navigation, headers, and very short text
-                if len(text) < 20 or len(text) > 1000:
-                    continue
-                
-                # Skip common non-quote patterns
-                if any(skip in text.lower() for skip in [
-                    'read more', 'click here', 'subscribe', 'newsletter',
-                    'james clear', 'atomic habits', 'buy now', 'get the'
-                ]):
-                    continue
-                
-                # Clean up the quote
-                text = text.strip('"').strip()
-                
-                # Try to find source/date if available
-                source_elem = element.find_next(['cite', 'span', 'small'])
-                source = source_elem.get_text(strip=True) if source_elem else None
-                
-                quotes.append({
-                    'text': text,
-                    'category': category,
-                    'source': source,
-                    'length': len(text),
-                    'scraped_at': datetime.now().isoformat()
-                })
-            
-            print(f"Found {len(quotes)} quotes in {category}")
+            quotes = self.parse_category_html(self.fetch_category(category), category)
+            logger.info("Found %d quotes in %s", len(quotes), category)
             return quotes
-            
+
         except Exception as e:
-            print(f"Error scraping {category}: {e}")
+            logger.error("Error scraping %s: %s", category, e)
             return []
-    
-    def scrape_all_categories(self) -> List[Dict]:
-        """Scrape quotes from all categories"""
-        all_quotes = []
-        
-        for category in self.QUOTE_CATEGORIES:
-            quotes = self.scrape_category(category)
-            all_quotes.extend(quotes)
-            time.sleep(2)  # Be respectful with rate limiting
-        
-        # Deduplicate by text
-        seen = set()
-        unique_quotes = []
-        for quote in all_quotes:
-            if quote['text'] not in seen:
-                seen.add(quote['text'])
-                unique_quotes.append(quote)
-        
-        print(f"\nTotal unique quotes: {len(unique_quotes)}")
-        return unique_quotes
-    
-    def save_quotes(self, quotes: List[Dict], filename: str = 'quotes.json'):
-        """Save quotes to JSON file"""
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(quotes, f, indent=2, ensure_ascii=False)
-        print(f"Saved {len(quotes)} quotes to {filename}")
 
+    def fetch_category(self, category: str) -> str:
+        """HTML of a category page"""
+        url = f"{self.BASE_URL}/{category}"
+        logger.info("Scraping %s...", url)
+        response = self.session.get(url, timeout=10)
+        response.raise_for_status()
+        return response.text
+
+    def parse_category_html(self, html: str, category: str) -> List[Dict]:
+        """Quotes on a category page"""
+        soup = BeautifulSoup(html, 'html.parser')
+        quotes = []
+
+        # Find all quote blocks - they're typically in blockquotes or specific divs
+        # This is a generic approach - may need adjustment based on actual HTML structure
+        quote_elements = soup.find_all(['blockquote', 'p'])
 
+        for element in quote_elements:
+            text = element.get_text(strip=True)
+
+            # Filter out navigation, headers, and very short text
+            if len(text) < 20 or len(text) > 1000:
+                continue
+
+            # Skip common non-quote patterns
+            if any(skip in text.lower() for skip in [
+                'read more', 'click here', 'subscribe', 'newsletter',
+                'james clear', 'atomic habits', 'buy now', 'get the'
+            ]):
+                continue
+
+            # Clean up the quote
+            text = canonical_text(text)
+
+            # Try to find source/date if available
+            source_elem = element.find_next(['cite', 'span', 'small'])
+            source = source_elem.get_text(strip=True) if source_elem else None
+
+            quotes.append({
+                'text': text,
+                'category': category,
+                'source': source,
+                'length': len(text),
+                'scraped_at': datetime.now().isoformat()
+            })
+
+        return quotes
+    
 if __name__ == '__main__':
-    scraper = JamesClearScraper()
-    quotes = scraper.scrape_all_categories()
-    scraper.save_quotes(quotes)
+    from ingest import IngestPipeline, QuoteStore
+    from quote_sources import WebsiteSource
+
+    setup_logging()
+    IngestPipeline(QuoteStore('data/quotes.json')).run([WebsiteSource(JamesClearScraper())])
@@ -0,0 +1,108 @@
+"""
+Quote Search Index
+Inverted index with BM25 ranking for full-text quote search
+"""
+
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Tuple
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens, ignoring punctuation and Unicode variants"""
+    return re.findall(r'\w+', unicodedata.normalize('NFKC', text).lower())
+
+
+class QuoteSearchIndex:
+    """
+    Inverted index over quote texts
+
+    Maps each term to {doc_id: term frequency}. Documents can be added one
+    at a time, so the index stays current as quotes are ingested without a
+    rebuild.
+    """
+
+    # BM25 parameters
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.doc_lengths: Dict[int, int] = {}
+        self.doc_terms: Dict[int, List[str]] = {}
+        self.total_length = 0
+
+    def to_dict(self) -> Dict:
+        """JSON-serializable form of the index (see from_dict)"""
+        return {
+            'postings': {term: sorted(docs.items()) for term, docs in self.postings.items()},
+            'doc_lengths': sorted(self.doc_lengths.items()),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'QuoteSearchIndex':
+        """Index saved with to_dict"""
+        index = cls()
+        for doc_id, length in data['doc_lengths']:
+            index.doc_lengths[doc_id] = length
+            index.doc_terms[doc_id] = []
+            index.total_length += length
+        for term, docs in data['postings'].items():
+            index.postings[term] = dict(docs)
+            for doc_id, _ in docs:
+                index.doc_terms[doc_id].append(term)
+        return index
+
+    def add(self, doc_id: int, text: str):
+        """Index a document"""
+        terms = tokenize(text)
+        if doc_id in self.doc_lengths:
+            self.remove(doc_id)
+
+        counts = Counter(terms)
+        self.doc_lengths[doc_id] = len(terms)
+        self.doc_terms[doc_id] = list(counts)
+        self.total_length += len(terms)
+        for term, count in counts.items():
+            self.postings.setdefault(term, {})[doc_id] = count
+
+    def remove(self, doc_id: int):
+        """Drop a document from the index"""
+        length = self.doc_lengths.pop(doc_id, None)
+        if length is None:
+            return
+
+        self.total_length -= length
+        for term in self.doc_terms.pop(doc_id):
+            docs = self.postings[term]
+            del docs[doc_id]
+            if not docs:
+                del self.postings[term]
+
+    def search(self, query: str) -> List[Tuple[int, float]]:
+        """
+        Rank documents matching any query term
+
+        Returns:
+            (doc_id, score) pairs, best match first
+        """
+        doc_count = len(self.doc_lengths)
+        if not doc_count:
+            return []
+
+        avg_length = self.total_length / doc_count
+        scores: Dict[int, float] = {}
+
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+
+            idf = math.log(1 + (doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, tf in docs.items():
+                norm = tf + self.K1 * (1 - self.B + self.B * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.K1 + 1) / norm
+
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
@@ -3,34 +3,107 @@ TRMNL Plugin Server
 Flask server that responds to TRMNL's plugin requests
 """
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, redirect, Response, g
+from werkzeug.exceptions import RequestEntityTooLarge
+import atexit
+import contextvars
+import functools
 import json
+import logging
 import os
-from datetime import datetime
+import re
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import TimeoutError as FutureTimeout
+from datetime import datetime, timedelta
 import sys
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from display_manager import QuoteDisplayManager
+from display_manager import QuoteDisplayManager, device_profile
+from category_weights import category_spec, parse_categories
+from user_store import UserStore, bitmap_ids
+from quote_schedule import build_schedule, parse_time
+from corpus_export import CorpusExport, available_encodings
+from corpus_registry import DEFAULT_CORPUS, CorpusRegistry, valid_corpus_name
+from quote_import import QuoteImporter
+from ingest import IngestPipeline, QuoteStore
+from quote_sources import NewsletterArchiveSource, WebhookSource, WebsiteSource
+from profiler import SamplingProfiler, format_folded
+from structured_log import request_id, setup_logging
+from warmup import TrafficRecorder, Warmup
+from admission import AdmissionControl, Overloaded
+from bitmap_renderer import BitmapRenderer, IMAGE_FORMATS, LAYOUTS, is_available as pillow_available
 
 app = Flask(__name__)
 
-# Debug: Print current working directory and file paths
-import os
-print(f"DEBUG: Current working directory: {os.getcwd()}")
-print(f"DEBUG: Files in current directory: {os.listdir('.')}")
+# Largest request body accepted, in MB (bulk imports are the big ones);
+# anything larger gets a 413 instead of filling the disk
+MAX_UPLOAD_MB = int(os.environ.get('TRMNL_MAX_UPLOAD_MB', '100'))
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_MB * 1024 * 1024
+
+# JSON logs through a background writer, so logging never blocks a request
+setup_logging()
+logger = logging.getLogger('server')
+
+# Debug: Log current working directory and file paths
+logger.debug("Current working directory: %s", os.getcwd())
+logger.debug("Files in current directory: %s", os.listdir('.'))
 if os.path.exists('data'):
-    print(f"DEBUG: Files in data/ directory: {os.listdir('data')}")
+    logger.debug("Files in data/ directory: %s", os.listdir('data'))
 else:
-    print(f"ERROR: data/ directory does not exist!")
-print(f"DEBUG: Does data/quotes.json exist? {os.path.exists('data/quotes.json')}")
+    logger.error("data/ directory does not exist!")
 if os.path.exists('data/quotes.json'):
     file_size = os.path.getsize('data/quotes.json')
-    print(f"DEBUG: File size: {file_size} bytes ({file_size/1024:.1f} KB)")
-    # Read first 200 chars
-    with open('data/quotes.json', 'r') as f:
-        preview = f.read(200)
-        print(f"DEBUG: File preview: {preview}...")
+    logger.debug("data/quotes.json: %d bytes (%.1f KB)", file_size, file_size / 1024)
+else:
+    logger.debug("data/quotes.json does not exist")
+
+
+# Opt-in sampling profiler (TRMNL_PROFILE_RATE / TRMNL_PROFILE_TOKEN); with
+# neither set the request hooks below only check profiler.enabled
+profiler = SamplingProfiler.from_env()
+if profiler.enabled:
+    logger.info("Profiling %.1f%% of requests%s", profiler.sample_rate * 100,
+                ' and requests with X-Profile' if profiler.token else '')
+
+
+@app.before_request
+def assign_request_id():
+    # Taken from a proxy's X-Request-Id if there is one, echoed back in the response
+    g.request_id = request.headers.get('X-Request-Id') or uuid.uuid4().hex[:16]
+    g.request_id_token = request_id.set(g.request_id)
+
+
+@app.after_request
+def add_request_id(response):
+    response.headers['X-Request-Id'] = g.get('request_id', '')
+    return response
+
+
+@app.teardown_request
+def clear_request_id(exc):
+    # Worker threads are reused; don't tag later log lines with this request
+    if 'request_id_token' in g:
+        request_id.reset(g.request_id_token)
+
+
+@app.before_request
+def start_profiling():
+    if (profiler.enabled and request.endpoint != 'admin_profile'
+            and profiler.wants(request.headers.get('X-Profile'))):
+        rule = request.url_rule.rule if request.url_rule else request.path
+        profiler.begin(f"{request.method} {rule}")
+
+
+@app.teardown_request
+def stop_profiling(exc):
+    if profiler.enabled:
+        profiler.end()
 
 
 # Initialize quote manager - create sample quotes if database doesn't exist
@@ -38,10 +111,10 @@ try:
     quote_manager = QuoteDisplayManager('data/quotes.json')
     if not quote_manager.quotes:
         raise FileNotFoundError("No quotes loaded")
-    print(f"✅ Loaded {len(quote_manager.quotes)} quotes from database")
+    logger.info("Loaded %d quotes from database", len(quote_manager.quotes))
 except (FileNotFoundError, json.JSONDecodeError):
     # Create sample quotes for initial deployment
-    print("⚠️  No quotes database found. Creating sample quotes...")
+    logger.warning("No quotes database found. Creating sample quotes...")
     os.makedirs('data', exist_ok=True)
 
     sample_quotes = [
@@ -72,30 +145,129 @@ except (FileNotFoundError, json.JSONDecodeError):
         json.dump(sample_quotes, f, indent=2)
 
     quote_manager = QuoteDisplayManager('data/quotes.json')
-    print(f"✅ Created sample database with {len(sample_quotes)} quotes")
-    print("   Trigger full scrape: POST to /trigger-scrape endpoint")
+    logger.info("Created sample database with %d quotes. Trigger full scrape: POST to /trigger-scrape",
+                len(sample_quotes))
 
+# The updater (including its IMAP IDLE listener) writes data/quotes.json from
+# another process; reload when the file changes, checking at most every few seconds
+RELOAD_CHECK_INTERVAL = 5
+_quotes_mtime = os.path.getmtime('data/quotes.json') if os.path.exists('data/quotes.json') else None
+_last_reload_check = time.monotonic()
+_reload_lock = threading.Lock()
 
-def generate_markup_full(quote_data: dict) -> str:
-    """Generate HTML markup for full screen layout with dynamic font sizing"""
-
-    # Adjust font size based on quote length
-    text_length = len(quote_data['text'])
-
-    if text_length < 150:
-        font_size = '1.6em'
-        line_height = '1.8'
-    elif text_length < 300:
-        font_size = '1.4em'
-        line_height = '1.6'
-    elif text_length < 600:
-        font_size = '1.2em'
-        line_height = '1.5'
+
+def reload_quotes_if_changed():
+    """
+    Reload the global quote manager if data/quotes.json changed on disk
+
+    The reload runs in the background; requests keep being served from the
+    current manager until the new one is loaded and warm.
+    """
+    global _last_reload_check
+
+    now = time.monotonic()
+    if now - _last_reload_check < RELOAD_CHECK_INTERVAL:
+        return
+    _last_reload_check = now
+
+    try:
+        mtime = os.path.getmtime('data/quotes.json')
+    except OSError as e:
+        logger.warning("Could not reload quotes: %s", e)
+        return
+    if mtime != _quotes_mtime and _reload_lock.acquire(blocking=False):
+        threading.Thread(target=contextvars.copy_context().run, args=(reload_quotes, mtime),
+                         name='reload', daemon=True).start()
+
+
+def reload_quotes(mtime: float):
+    """Load data/quotes.json as of mtime and swap it in (holding _reload_lock)"""
+    global quote_manager, _quotes_mtime
+
+    try:
+        manager = load_warm_manager()
+        quote_manager, _quotes_mtime = manager, mtime
+        logger.info("Reloaded %d quotes from data/quotes.json", len(manager.quotes))
+    except (OSError, json.JSONDecodeError) as e:
+        # Tried again at the next check
+        logger.warning("Could not reload quotes: %s", e)
+    finally:
+        _reload_lock.release()
+
+
+def apply_new_quotes(new_quotes: list, loaded_mtime):
+    """
+    Update the in-memory quotes after appending new_quotes to data/quotes.json
+
+    Adds them incrementally (buckets and search index) when the manager was
+    current with the file we appended to; otherwise falls back to a reload.
+
+    Args:
+        new_quotes: Quote dicts that were appended
+        loaded_mtime: mtime of data/quotes.json when it was read, before the write
+    """
+    global quote_manager, _quotes_mtime
+
+    if loaded_mtime is not None and loaded_mtime == _quotes_mtime:
+        quote_manager.add_quotes(new_quotes)
     else:
-        # Very long quotes
-        font_size = '1.0em'
-        line_height = '1.4'
+        quote_manager = load_warm_manager()
+    _quotes_mtime = os.path.getmtime('data/quotes.json')
+
+
+# Replicas (TRMNL_PRIMARY_URL set) serve snapshots of the primary's quotes,
+# kept current by src/replica.py; anything that adds quotes goes to the primary
+PRIMARY_URL = os.environ.get('TRMNL_PRIMARY_URL', '')
+
+
+def primary_only(view):
+    """Refuse a quote-writing endpoint on a replica"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if PRIMARY_URL:
+            return jsonify({'error': 'This node is a read-only replica', 'primary': PRIMARY_URL}), 409
+        return view(*args, **kwargs)
+    return wrapper
+
+
+# Other collections (data/corpora/<name>.json), loaded on first use and
+# evicted LRU under TRMNL_CORPUS_MEMORY_MB
+corpus_registry = CorpusRegistry(
+    'data/corpora', pinned=lambda: quote_manager,
+    on_load=lambda name, manager: warm_manager(manager, name, time.monotonic() + warmup.budget),
+)
+
 
+def corpus_manager(corpus: str) -> QuoteDisplayManager:
+    """
+    Manager for a collection ('' or 'default' is data/quotes.json)
+
+    Raises:
+        ValueError: If there is no such collection
+    """
+    if not corpus or corpus == DEFAULT_CORPUS:
+        reload_quotes_if_changed()
+        return quote_manager
+    try:
+        return corpus_registry.get(corpus)
+    except KeyError:
+        raise ValueError(f"Unknown corpus: {corpus}")
+
+
+def user_key(user_uuid: str, corpus: str) -> str:
+    """
+    Key of a user's record in the user store
+
+    Quote ids are positions within a collection, so each collection keeps
+    its own history and exclusions for a user
+    """
+    if not corpus or corpus == DEFAULT_CORPUS:
+        return user_uuid
+    return f"{corpus}:{user_uuid}"
+
+
+def generate_markup_full(quote_data: dict) -> str:
+    """Generate HTML markup for full screen layout, sized from the text fit table"""
     return f"""
     <div class="view view--full">
         <div class="layout">
@@ -103,8 +275,8 @@ def generate_markup_full(quote_data: dict) -> str:
                 <div class="column">
                     <div class="markdown gap--large">
                         <span class="title" style="font-family: 'Georgia', serif; letter-spacing: 0.5px;">Daily Wisdom</span>
-                        <div class="content-element content content--center" style="font-size: {font_size}; line-height: {line_height}; font-weight: bold; font-family: 'Charter', 'Georgia', serif; letter-spacing: 0.3px;">
-                            "{quote_data['text']}"
+                        <div class="content-element content content--center" style="font-size: {quote_data['font_size']}px; line-height: {quote_data['line_height']}; font-weight: bold; font-family: 'Charter', 'Georgia', serif; letter-spacing: 0.3px;">
+                            "{quote_data['html']}"
                         </div>
                     </div>
                 </div>
@@ -121,8 +293,8 @@ def generate_markup_half_vertical(quote_data: dict) -> str:
         <div class="layout">
             <div class="markdown gap--medium">
                 <span class="subtitle" style="font-family: 'Georgia', serif; letter-spacing: 0.5px;">Daily Wisdom</span>
-                <div class="content-element content" style="font-size: 1.05em; font-weight: bold; line-height: 1.5; font-family: 'Charter', 'Georgia', serif; letter-spacing: 0.2px;">
-                    "{quote_data['text']}"
+                <div class="content-element content" style="font-size: {quote_data['font_size']}px; font-weight: bold; line-height: {quote_data['line_height']}; font-family: 'Charter', 'Georgia', serif; letter-spacing: 0.2px;">
+                    "{quote_data['html']}"
                 </div>
             </div>
         </div>
@@ -137,8 +309,8 @@ def generate_markup_half_horizontal(quote_data: dict) -> str:
         <div class="layout">
             <div class="markdown gap--medium">
                 <span class="subtitle" style="font-family: 'Georgia', serif; letter-spacing: 0.5px;">Daily Wisdom</span>
-                <div class="content-element content" style="font-size: 1.08em; font-weight: bold; line-height: 1.5; font-family: 'Charter', 'Georgia', serif; letter-spacing: 0.2px;">
-                    "{quote_data['text']}"
+                <div class="content-element content" style="font-size: {quote_data['font_size']}px; font-weight: bold; line-height: {quote_data['line_height']}; font-family: 'Charter', 'Georgia', serif; letter-spacing: 0.2px;">
+                    "{quote_data['html']}"
                 </div>
             </div>
         </div>
@@ -151,14 +323,149 @@ def generate_markup_quadrant(quote_data: dict) -> str:
     return f"""
     <div class="view view--quadrant">
         <div class="markdown gap--small" style="display: flex; align-items: center; justify-content: center; text-align: center; height: 100%;">
-            <div class="content-element" style="font-size: 1.07em; line-height: 1.4; font-weight: bold; font-family: 'Charter', 'Georgia', serif; letter-spacing: 0.2px;">
-                "{quote_data['text']}"
+            <div class="content-element" style="font-size: {quote_data['font_size']}px; line-height: {quote_data['line_height']}; font-weight: bold; font-family: 'Charter', 'Georgia', serif; letter-spacing: 0.2px;">
+                "{quote_data['html']}"
             </div>
         </div>
     </div>
     """
 
 
+# Per-user preferences and history, shared by all workers through data/users.db
+user_store = UserStore()
+
+# Raw categories field -> (categories, weights), least recently used first
+MAX_CATEGORY_SETTINGS = 1024
+_category_settings: 'OrderedDict[str, tuple]' = OrderedDict()
+_category_settings_lock = threading.Lock()
+
+# Which collections, devices and categories are requested, for warm-up
+traffic = TrafficRecorder('data/traffic.json')
+atexit.register(traffic.flush)
+
+
+def parsed_categories(selected_categories: str) -> tuple:
+    """
+    (categories, weights) of a categories field, parsed once per distinct value
+
+    Raises:
+        ValueError: If a weight is invalid
+    """
+    with _category_settings_lock:
+        parsed = _category_settings.get(selected_categories)
+        if parsed is not None:
+            _category_settings.move_to_end(selected_categories)
+            return parsed
+
+    parsed = parse_categories(selected_categories)
+    with _category_settings_lock:
+        _category_settings[selected_categories] = parsed
+        while len(_category_settings) > MAX_CATEGORY_SETTINGS:
+            _category_settings.popitem(last=False)
+    return parsed
+
+
+def category_setting(selected_categories: str, manager: QuoteDisplayManager) -> tuple:
+    """
+    (category set id, categories, weights) of a categories field
+
+    The id is interned for the canonical spec of the categories the
+    collection has (see category_spec), so equivalent fields share one row.
+    A field that matches no quotes gets None and stores nothing.
+
+    Raises:
+        ValueError: If a weight is invalid
+    """
+    categories, weights = parsed_categories(selected_categories)
+    spec = category_spec(categories, weights, manager.stats.by_category)
+    set_id = user_store.intern_category_set(spec) if spec is not None else None
+    return set_id, categories, weights
+
+
+# Markup field and generator for each layout in a plugin response
+PLUGIN_LAYOUTS = [
+    ('full', 'markup', generate_markup_full),
+    ('half_vertical', 'markup_half_vertical', generate_markup_half_vertical),
+    ('half_horizontal', 'markup_half_horizontal', generate_markup_half_horizontal),
+    ('quadrant', 'markup_quadrant', generate_markup_quadrant),
+]
+
+
+def plugin_payload(user_uuid: str, selected_categories: str, device: dict, minute: int,
+                   fragments: dict = None, save_history: bool = True, corpus: str = '') -> tuple:
+    """
+    Markup for every layout for one device
+
+    Args:
+        fragments: Markup cache keyed by (corpus, quote id, layout, width, height);
+            a batch passes one dict so each distinct fragment renders once
+        save_history: Write the user's history now; with False the changed
+            record is returned for the caller to save
+        corpus: Collection to show ('' for the default)
+
+    Returns:
+        (response dict, user record whose history changed or None)
+
+    Raises:
+        ValueError: If the categories field has an invalid weight or the
+            corpus doesn't exist
+    """
+    manager = corpus_manager(corpus)
+
+    # Get device profile; candidate pools and font sizes are built per profile
+    width, height = device_profile(device.get('width'), device.get('height'))
+    set_id, categories, weights = category_setting(selected_categories, manager)
+    traffic.record(corpus or DEFAULT_CORPUS, selected_categories, width, height)
+
+    # Recently shown and excluded quotes, kept across category changes
+    user = user_store.get(user_key(user_uuid, corpus), manager) if user_uuid else None
+    history = user.recent_history(minute) if user else 0
+    exclude = user.exclusions if user else 0
+
+    # Get quotes for each layout type and generate their markup
+    fragments = {} if fragments is None else fragments
+    response = {}
+    shown = []
+    for layout, field, generate_markup in PLUGIN_LAYOUTS:
+        quote = manager.pick_quote_for_user(layout, user_uuid, width, height, categories, weights,
+                                            history, exclude, minute)
+        if not quote:
+            response[field] = ''
+            continue
+
+        quote_id = manager.quote_id(quote)
+        key = (corpus, quote_id, layout, width, height)
+        markup = fragments.get(key)
+        if markup is None:
+            markup = fragments[key] = generate_markup(manager.format_for_display(quote, layout, width, height))
+        response[field] = markup
+
+        # History follows the full-screen rotation; the smaller layouts skip
+        # the same quotes but draw from pools of their own
+        if layout == 'full':
+            shown.append(quote_id)
+    response['shared'] = ''  # Optional: shared data between layouts
+
+    changed = None
+    if user:
+        # Excluded quotes are never shown, so history starts over without them
+        pool = manager.pool_bitmap('full', width, height, categories, weights) & ~exclude
+        if user_store.record_shown(user, minute, set_id, shown, pool, save=False):
+            changed = user
+            if save_history:
+                try:
+                    user_store.save(user)
+                except sqlite3.Error as e:
+                    logger.warning("Could not save history for %s: %s", user_uuid, e)
+
+    return response, changed
+
+
+# Concurrency limit and deadline for /plugin, falling back to each device's
+# last good response (TRMNL_PLUGIN_CONCURRENCY / _DEADLINE_MS / _QUEUE)
+admission = AdmissionControl(profiler=profiler)
+
+
 @app.route('/plugin', methods=['GET', 'POST'])
 def plugin_endpoint():
     """
@@ -167,70 +474,243 @@ def plugin_endpoint():
     Request includes:
     - user_uuid: Unique user identifier
     - trmnl: Metadata object with device info
-    - categories: Comma-separated list of categories to include (from form fields)
+    - categories: Comma-separated list of categories to include, or category
+      weights (from form fields)
+    - corpus: Collection to draw from (default data/quotes.json; see /corpora)
 
     Headers include:
     - Authorization: Bearer token for the user's plugin connection
+
+    Responses are computed under admission control: a response that isn't
+    ready within the deadline, fails, or would queue behind too many others
+    is replaced by the device's last good one (with an Age header).
     """
+    reload_quotes_if_changed()
+
     try:
         # Get request data (works for both GET and POST)
         if request.method == 'POST':
             user_uuid = request.form.get('user_uuid')
             trmnl_data = request.form.get('trmnl')
             selected_categories = request.form.get('categories', '')
+            corpus = request.form.get('corpus', '')
         else:
             user_uuid = request.args.get('user_uuid')
             trmnl_data = request.args.get('trmnl')
             selected_categories = request.args.get('categories', '')
+            corpus = request.args.get('corpus', '')
 
         # Parse TRMNL metadata if present
         metadata = json.loads(trmnl_data) if trmnl_data else {}
 
-        # Get device dimensions for layout optimization
+        minute = int(datetime.now().timestamp() / 60)
         device = metadata.get('device', {})
-        width = device.get('width', 800)
-        height = device.get('height', 480)
-
-        # Filter quotes by selected categories
-        filtered_quotes = quote_manager.quotes
-        if selected_categories and selected_categories.strip():
-            # Parse comma-separated categories
-            categories_list = [cat.strip() for cat in selected_categories.split(',') if cat.strip()]
-            if categories_list:
-                filtered_quotes = [q for q in quote_manager.quotes
-                                  if q.get('category', '') in categories_list]
-
-        # Create a temporary quote manager with filtered quotes
-        temp_manager = QuoteDisplayManager('data/quotes.json')
-
-        # Override with filtered quotes if needed
-        if filtered_quotes != quote_manager.quotes:
-            temp_manager.quotes = filtered_quotes
-            temp_manager.categorize_by_length()
-
-        # Get quotes for each layout type
-        quote_full = temp_manager.get_quote_for_user('full', user_uuid)
-        quote_half_v = temp_manager.get_quote_for_user('half_vertical', user_uuid)
-        quote_half_h = temp_manager.get_quote_for_user('half_horizontal', user_uuid)
-        quote_quad = temp_manager.get_quote_for_user('quadrant', user_uuid)
-
-        # Generate markup for all layouts
-        response = {
-            'markup': generate_markup_full(quote_full) if quote_full else '',
-            'markup_half_vertical': generate_markup_half_vertical(quote_half_v) if quote_half_v else '',
-            'markup_half_horizontal': generate_markup_half_horizontal(quote_half_h) if quote_half_h else '',
-            'markup_quadrant': generate_markup_quadrant(quote_quad) if quote_quad else '',
-            'shared': '',  # Optional: shared data between layouts
-        }
+        key = (user_uuid, selected_categories, corpus, *device_profile(device.get('width'), device.get('height')))
+        try:
+            response, age = admission.run(key, lambda: plugin_payload(
+                user_uuid, selected_categories, device, minute, corpus=corpus)[0])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except Overloaded:
+            return jsonify({'error': 'Overloaded, try again shortly'}), 503, {'Retry-After': '30'}
+
+        result = jsonify(response)
+        if age is not None:
+            result.headers['Age'] = str(int(age))
+        return result
+
+    except Exception as e:
+        logger.exception("Error generating plugin content: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+
+# Most devices a single /plugin/batch request may refresh
+MAX_BATCH_SIZE = 10000
+
+
+@app.route('/plugin/batch', methods=['POST'])
+def plugin_batch_endpoint():
+    """
+    Plugin payloads for many devices in one request, streamed as NDJSON
+
+    Body (JSON): {"requests": [{"user_uuid": ..., "categories": ..., "corpus": ..., "trmnl": {...}}, ...]}
+    where trmnl may be an object or the JSON string TRMNL sends (or pass
+    "device": {"width": ..., "height": ...} directly).
+
+    Streams one JSON line per request, in order: the /plugin response plus
+    "user_uuid", or {"user_uuid": ..., "error": ...}. The whole batch is
+    selected at the same minute, shares candidate pools, renders each
+    distinct markup fragment once and saves history in one transaction.
+    """
+    reload_quotes_if_changed()
+
+    data = request.get_json(silent=True) or {}
+    items = data.get('requests')
+    if not isinstance(items, list):
+        return jsonify({'error': 'Body must be {"requests": [...]}'}), 400
+    if len(items) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'At most {MAX_BATCH_SIZE} requests per batch'}), 400
+
+    minute = int(datetime.now().timestamp() / 60)
+
+    def generate():
+        fragments = {}
+        changed = []
+        for item in items:
+            user_uuid = item.get('user_uuid') if isinstance(item, dict) else None
+            try:
+                metadata = item.get('trmnl') or {}
+                if isinstance(metadata, str):
+                    metadata = json.loads(metadata)
+                device = item.get('device') or metadata.get('device', {})
+                response, user = plugin_payload(user_uuid, item.get('categories', ''), device, minute,
+                                                fragments, save_history=False, corpus=item.get('corpus', ''))
+                if user:
+                    changed.append(user)
+                line = {'user_uuid': user_uuid, **response}
+            except Exception as e:
+                line = {'user_uuid': user_uuid, 'error': str(e)}
+            yield json.dumps(line, ensure_ascii=False) + '\n'
+
+        try:
+            user_store.save_many(changed)
+        except sqlite3.Error as e:
+            logger.warning("Could not save history for batch of %d users: %s", len(changed), e)
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+
+@app.route('/schedule', methods=['GET'])
+def schedule_endpoint():
+    """
+    The quotes a user will be shown over a time range
+
+    Parameters:
+    - user_uuid (required), categories, corpus: As for /plugin
+    - layouts: Comma-separated layouts (default full)
+    - start: ISO 8601 server-local time (default now)
+    - end or hours: End of the range (default 24 hours after start)
+    - step: Minutes between slots, i.e. the refresh rate (default 15)
+    - width, height: Device size (default 800x480)
+
+    Matches what /plugin returns when polled at each slot
+    """
+    reload_quotes_if_changed()
+
+    user_uuid = request.args.get('user_uuid')
+    if not user_uuid:
+        return jsonify({'error': 'user_uuid is required'}), 400
+
+    try:
+        start = parse_time(request.args.get('start'))
+        if request.args.get('end'):
+            end = parse_time(request.args.get('end'))
+        else:
+            end = start + timedelta(hours=float(request.args.get('hours', 24)))
+        layouts = [layout.strip() for layout in request.args.get('layouts', 'full').split(',') if layout.strip()]
+        corpus = request.args.get('corpus', '')
+        schedule = build_schedule(
+            corpus_manager(corpus), user_uuid, layouts, start, end,
+            step=int(request.args.get('step', 15)),
+            width=request.args.get('width', 800),
+            height=request.args.get('height', 480),
+            selected_categories=request.args.get('categories', ''),
+            user_store=user_store,
+            store_key=user_key(user_uuid, corpus),
+        )
+    except (ValueError, OverflowError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(schedule)
+
+
+# Background renderer for image-serving mode (process pool starts on first use)
+renderer = BitmapRenderer()
+
+
+@app.route('/image', methods=['GET', 'POST'])
+def image_endpoint():
+    """
+    Image-serving mode: the user's current quote as a ready-to-display 1-bit bitmap
+
+    Parameters (query string or form):
+    - layout: full, half_vertical, half_horizontal or quadrant (default full)
+    - user_uuid, categories, corpus: Same as /plugin
+    - width, height: Device size in pixels (or pass the trmnl metadata object)
+    - format: png (default) or bmp
+
+    Renders the bitmap if it isn't cached, then redirects to the
+    content-addressed /render/<key>.<format> URL, which is served from cache
+    with long-lived cache headers
+    """
+    if not pillow_available():
+        return jsonify({'error': 'Image mode requires Pillow (pip install Pillow)'}), 503
 
-        return jsonify(response)
+    reload_quotes_if_changed()
 
+    try:
+        layout = request.values.get('layout', 'full')
+        image_format = request.values.get('format', 'png').lower()
+        if layout not in LAYOUTS or image_format not in IMAGE_FORMATS:
+            return jsonify({'error': 'Unsupported layout or format'}), 400
+
+        trmnl_data = request.values.get('trmnl')
+        device = (json.loads(trmnl_data) if trmnl_data else {}).get('device', {})
+        width = int(request.values.get('width', device.get('width', 800)))
+        height = int(request.values.get('height', device.get('height', 480)))
+        if not (100 <= width <= 2000 and 100 <= height <= 2000):
+            return jsonify({'error': 'width and height must be between 100 and 2000'}), 400
+
+        try:
+            categories, weights = parse_categories(request.values.get('categories', ''))
+            manager = corpus_manager(request.values.get('corpus', ''))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        # The quote comes from the device's profile pool; the bitmap is drawn at its real size
+        profile_width, profile_height = device_profile(width, height)
+        quote = manager.pick_quote_for_user(layout, request.values.get('user_uuid'), profile_width,
+                                            profile_height, categories, weights)
+        if not quote:
+            return jsonify({'error': 'No quotes available for this layout'}), 404
+
+        # Wait for the bitmap to reach the shared cache, so whichever worker
+        # gets the /render request can serve it
+        try:
+            key = renderer.render(quote['text'], layout, width, height, image_format)
+        except FutureTimeout:
+            return jsonify({'error': 'Rendering, try again shortly'}), 503, {'Retry-After': '5'}
+        response = redirect(f"/render/{key}.{image_format}", code=302)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    except Exception as e:
+        logger.exception("Error generating image: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/render/<key>.<image_format>', methods=['GET'])
+def render_bitmap(key, image_format):
+    """Serve a pre-rendered bitmap by content address"""
+    if image_format not in IMAGE_FORMATS or not re.fullmatch(r'[0-9a-f]{32}', key):
+        return jsonify({'error': 'Not found'}), 404
+
+    try:
+        data = renderer.get(key, image_format)
     except Exception as e:
-        print(f"Error generating plugin content: {e}")
+        logger.exception("Error rendering bitmap %s: %s", key, e)
         return jsonify({'error': str(e)}), 500
 
+    if data is None:
+        return jsonify({'error': 'Not found'}), 404
+
+    response = Response(data, mimetype=IMAGE_FORMATS[image_format])
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    response.set_etag(key)
+    return response.make_conditional(request)
+
 
 @app.route('/webhook/newsletter', methods=['POST'])
+@primary_only
 def newsletter_webhook():
     """
     Webhook endpoint for receiving new newsletter quotes
@@ -242,61 +722,334 @@ def newsletter_webhook():
         # Extract quotes from webhook data
         quotes = data.get('quotes', [])
 
-        # Add to quotes database
-        quotes_file = 'data/quotes.json'
-        existing_quotes = []
+        # Add them through the ingestion pipeline, skipping near-duplicates of
+        # ones we already have; the quote manager is updated as they are stored
+        pipeline = IngestPipeline(QuoteStore('data/quotes.json', on_commit=apply_new_quotes))
+        summary = pipeline.run([WebhookSource(quotes)])
+
+        return jsonify({'status': 'success', 'added': summary['added'], 'duplicates': len(quotes) - summary['added']})
 
-        # Ensure data directory exists
-        os.makedirs('data', exist_ok=True)
+    except Exception as e:
+        logger.exception("Error processing newsletter webhook: %s", e)
+        return jsonify({'error': str(e)}), 500
 
-        if os.path.exists(quotes_file):
-            with open(quotes_file, 'r', encoding='utf-8') as f:
-                existing_quotes = json.load(f)
 
-        # Add new quotes
-        for quote_text in quotes:
-            new_quote = {
-                'text': quote_text,
-                'category': '3-2-1-newsletter',
-                'source': 'James Clear - 3-2-1 Newsletter',
-                'length': len(quote_text),
-                'scraped_at': datetime.now().isoformat()
-            }
-            existing_quotes.append(new_quote)
+# Bulk imports are spooled to disk and run in a background thread; their
+# status files let any worker answer GET /import/<job_id>
+IMPORTS_DIR = 'data/imports'
+_import_lock = threading.Lock()
 
-        # Save updated quotes
-        with open(quotes_file, 'w', encoding='utf-8') as f:
-            json.dump(existing_quotes, f, indent=2, ensure_ascii=False)
 
-        # Reload quote manager
-        global quote_manager
-        quote_manager = QuoteDisplayManager('data/quotes.json')
+def write_import_status(job_id: str, status: dict):
+    """Save an import's status (write-then-rename so readers never see a partial file)"""
+    status_file = os.path.join(IMPORTS_DIR, f'{job_id}.json')
+    with open(status_file + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(status, f)
+    os.replace(status_file + '.tmp', status_file)
 
-        return jsonify({'status': 'success', 'added': len(quotes)})
 
-    except Exception as e:
-        print(f"Error processing newsletter webhook: {e}")
-        return jsonify({'error': str(e)}), 500
+def run_import(job_id: str, spool_file: str, corpus: str = ''):
+    """Import a spooled NDJSON upload, updating its status file after every batch"""
+    status = {'job_id': job_id, 'status': 'running', 'started_at': datetime.now().isoformat()}
+    if corpus and corpus != DEFAULT_CORPUS:
+        # Other collections are picked up by the registry when their file changes
+        quotes_file, on_commit = corpus_registry.path(corpus), None
+        status['corpus'] = corpus
+    else:
+        quotes_file, on_commit = 'data/quotes.json', apply_new_quotes
+
+    def progress(summary: dict):
+        write_import_status(job_id, {**status, **summary})
+
+    # One import at a time per worker; commits are also locked across workers
+    with _import_lock:
+        importer = None
+        try:
+            importer = QuoteImporter(quotes_file, on_commit=on_commit, on_progress=progress)
+            with open(spool_file, 'rb') as f:
+                summary = importer.run(f)
+            status.update(summary, status='done')
+            logger.info("Import %s: added %d quotes (%d duplicates, %d invalid)",
+                        job_id, summary['added'], summary['duplicates'], summary['invalid'])
+        except Exception as e:
+            status.update(importer.summary if importer else {}, status='failed', error=str(e))
+            logger.exception("Import %s failed: %s", job_id, e)
+        finally:
+            os.remove(spool_file)
+        status['finished_at'] = datetime.now().isoformat()
+        write_import_status(job_id, status)
+
+
+@app.route('/import', methods=['POST'])
+@primary_only
+def import_quotes():
+    """
+    Bulk import of curated quotes from an NDJSON body
+
+    Each line is {"text": ..., "category": ..., "source": ..., "date": ...}
+    (source and date optional). The body is streamed to disk and imported in
+    the background in batches, so large imports don't tie up the worker;
+    poll the returned status_url for progress.
+
+    ?corpus=<name> imports into data/corpora/<name>.json instead, creating
+    the collection if it doesn't exist.
+    """
+    corpus = request.args.get('corpus', '')
+    if corpus and not valid_corpus_name(corpus):
+        return jsonify({'error': 'corpus must be a lowercase name (letters, digits, - and _)'}), 400
+
+    os.makedirs(IMPORTS_DIR, exist_ok=True)
+    job_id = uuid.uuid4().hex[:16]
+    spool_file = os.path.join(IMPORTS_DIR, f'{job_id}.ndjson')
+    try:
+        with open(spool_file, 'wb') as f:
+            # Stops at MAX_CONTENT_LENGTH, even for chunked bodies with no Content-Length
+            shutil.copyfileobj(request.stream, f, 1024 * 1024)
+    except RequestEntityTooLarge:
+        os.remove(spool_file)
+        return jsonify({'error': f'Import body is larger than {MAX_UPLOAD_MB} MB'}), 413
+
+    write_import_status(job_id, {'job_id': job_id, 'status': 'queued', 'bytes': os.path.getsize(spool_file)})
+    threading.Thread(target=contextvars.copy_context().run, args=(run_import, job_id, spool_file, corpus),
+                     daemon=True).start()
+
+    return jsonify({
+        'status': 'queued',
+        'job_id': job_id,
+        'status_url': f'/import/{job_id}',
+    }), 202
+
+
+@app.route('/import/<job_id>', methods=['GET'])
+def import_status(job_id):
+    """Progress or result of a bulk import"""
+    if not re.fullmatch(r'[0-9a-f]{16}', job_id):
+        return jsonify({'error': 'Unknown import'}), 404
+    try:
+        with open(os.path.join(IMPORTS_DIR, f'{job_id}.json'), 'r', encoding='utf-8') as f:
+            return jsonify(json.load(f))
+    except FileNotFoundError:
+        return jsonify({'error': 'Unknown import'}), 404
+
+
+@app.route('/search', methods=['GET'])
+def search_quotes():
+    """
+    Full-text search over the quotes database
+
+    Query parameters:
+    - q: Search terms (required)
+    - categories: Comma-separated list of categories to include
+    - length: Length category (short, medium, long, very_long)
+    - min_length / max_length: Character length bounds
+    - page / per_page: Pagination (per_page max 100)
+    - corpus: Collection to search (default data/quotes.json)
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Missing required parameter: q'}), 400
+
+    try:
+        manager = corpus_manager(request.args.get('corpus', ''))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 404
+
+    length = request.args.get('length') or None
+    if length and length not in manager.by_length:
+        return jsonify({'error': f"Invalid length: {length}"}), 400
+
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        per_page = min(max(int(request.args.get('per_page', 10)), 1), 100)
+        min_length = request.args.get('min_length', type=int)
+        max_length = request.args.get('max_length', type=int)
+    except ValueError:
+        return jsonify({'error': 'page and per_page must be integers'}), 400
+
+    selected_categories = request.args.get('categories', '')
+    categories_list = [cat.strip() for cat in selected_categories.split(',') if cat.strip()]
+
+    results = manager.search(
+        query,
+        categories=categories_list or None,
+        length=length,
+        min_length=min_length,
+        max_length=max_length,
+        page=page,
+        per_page=per_page,
+    )
+    return jsonify(results)
+
+
+@app.route('/users/<user_uuid>/exclusions', methods=['GET', 'POST', 'DELETE'])
+def user_exclusions(user_uuid):
+    """
+    Quotes a user never wants to see
+
+    GET lists the excluded quote ids; POST adds ids from a JSON body
+    {"quote_ids": [...]} (or replaces them with "replace": true); DELETE
+    clears them. Quote ids are the ids returned by /search; pass ?corpus=
+    for another collection (each keeps its own exclusions).
+    """
+    corpus = request.args.get('corpus', '')
+    try:
+        manager = corpus_manager(corpus)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 404
+
+    key = user_key(user_uuid, corpus)
+    if request.method == 'GET':
+        user = user_store.get(key, manager)
+    elif request.method == 'DELETE':
+        user = user_store.set_exclusions(key, manager, [], replace=True)
+    else:
+        data = request.get_json(silent=True) or {}
+        quote_ids = data.get('quote_ids', [])
+        if not isinstance(quote_ids, list) or not all(
+                isinstance(quote_id, int) and 0 <= quote_id < len(manager.quotes) for quote_id in quote_ids):
+            return jsonify({'error': 'quote_ids must be a list of quote ids'}), 400
+        user = user_store.set_exclusions(key, manager, quote_ids, replace=bool(data.get('replace')))
+
+    return jsonify({'user_uuid': user_uuid, 'excluded': list(bitmap_ids(user.exclusions))})
 
 
 @app.route('/stats', methods=['GET'])
 def get_stats():
-    """Get statistics about the quote database"""
-    stats = quote_manager.get_stats()
-    return jsonify(stats)
+    """
+    Get statistics about the quote database
+
+    Built from aggregates kept current as quotes are added; the ETag changes
+    with the corpus, so pollers sending If-None-Match get a 304. Pass
+    ?corpus= for another collection.
+    """
+    try:
+        manager = corpus_manager(request.args.get('corpus', ''))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 404
+
+    response = jsonify(manager.get_stats())
+    response.set_etag(manager.stats.etag())
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+@app.route('/corpora', methods=['GET'])
+def list_corpora():
+    """Available collections, and which this worker has loaded"""
+    return jsonify({'corpora': corpus_registry.names(), **corpus_registry.stats()})
+
+
+@app.route('/admin/profile', methods=['GET', 'DELETE'])
+def admin_profile():
+    """
+    Folded stacks sampled from profiled requests, merged across workers
+
+    Requires the X-Profile header to match TRMNL_PROFILE_TOKEN. The text is
+    ready for flamegraph.pl or speedscope; DELETE starts a new profile.
+    """
+    if not profiler.authorized(request.headers.get('X-Profile')):
+        return jsonify({'error': 'Not found'}), 404
+
+    if request.method == 'DELETE':
+        profiler.reset()
+        return jsonify({'status': 'reset'})
+
+    response = Response(format_folded(profiler.merged()), mimetype='text/plain')
+    response.headers['Content-Disposition'] = 'inline; filename=profile.folded'
+    return response
+
+
+# Generations of data/quotes.json (and of each collection) for downloads,
+# the changefeed and replicas
+corpus_export = CorpusExport('data/quotes.json')
+_collection_exports = {}
+
+
+def corpus_export_for(corpus: str) -> CorpusExport:
+    """
+    Export of a collection ('' or 'default' is data/quotes.json)
+
+    Raises:
+        KeyError: If there is no such collection
+    """
+    if not corpus or corpus == DEFAULT_CORPUS:
+        return corpus_export
+    if not valid_corpus_name(corpus) or not os.path.exists(corpus_registry.path(corpus)):
+        raise KeyError(corpus)
+    if corpus not in _collection_exports:
+        _collection_exports[corpus] = CorpusExport(corpus_registry.path(corpus))
+    return _collection_exports[corpus]
 
 
 @app.route('/download-quotes', methods=['GET'])
 def download_quotes():
-    """Download the quotes.json file"""
+    """
+    Download the quotes.json file
+
+    Served precompressed (zstd or gzip, per Accept-Encoding) with a strong
+    ETag per generation and encoding, so If-None-Match and Range requests
+    work. X-Corpus-Generation tells mirrors where to start /quotes/changes;
+    X-Corpus-Digest lets replicas verify what they received. Pass ?corpus=
+    for another collection.
+    """
     try:
-        return send_file('data/quotes.json',
-                        mimetype='application/json',
-                        as_attachment=True,
-                        download_name='quotes.json')
-    except Exception as e:
+        generation = corpus_export_for(request.args.get('corpus', '')).current()
+    except KeyError:
+        return jsonify({'error': 'Unknown corpus'}), 404
+    except (OSError, json.JSONDecodeError) as e:
         return jsonify({'error': str(e)}), 404
 
+    encoding = next((enc for enc in available_encodings() if request.accept_encodings[enc]), 'identity')
+    body = generation.encoded(encoding)
+
+    response = Response(body, mimetype='application/json')
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Content-Disposition'] = 'attachment; filename=quotes.json'
+    response.headers['X-Corpus-Generation'] = str(generation.number)
+    response.headers['X-Corpus-Digest'] = generation.digest
+    response.cache_control.no_cache = True
+    response.set_etag(generation.etag(encoding))
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(body))
+
+
+@app.route('/quotes/changes', methods=['GET'])
+def quote_changes():
+    """
+    Changefeed: records added or removed since a generation, as NDJSON
+
+    Query parameters:
+    - since: Generation the client already has (0 for everything)
+    - corpus: Collection (default data/quotes.json)
+
+    Streams a {"op": "generation", ...} line for each newer generation,
+    followed by its {"op": "remove"|"add", "quote": {...}} records.
+    X-Corpus-Generation is the generation the client has after applying them.
+    410 if since is older than the compacted log goes back.
+    """
+    try:
+        since = int(request.args.get('since', 0))
+        export = corpus_export_for(request.args.get('corpus', ''))
+        generation = export.current()
+    except KeyError:
+        return jsonify({'error': 'Unknown corpus'}), 404
+    except json.JSONDecodeError as e:
+        return jsonify({'error': f'quotes.json is being rewritten: {e}'}), 503
+    except ValueError:
+        return jsonify({'error': 'since must be a generation number'}), 400
+    except OSError as e:
+        return jsonify({'error': str(e)}), 404
+
+    # Generations folded into the base by compaction can't be caught up from
+    if 0 < since < export.base_generation():
+        return jsonify({'error': f'Generation {since} is no longer in the changefeed; download the quotes again',
+                        'generation': generation.number}), 410
+
+    response = Response(export.changes_since(since), mimetype='application/x-ndjson')
+    response.headers['X-Corpus-Generation'] = str(generation.number)
+    return response
+
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -304,90 +1057,130 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
-        'quotes_loaded': len(quote_manager.quotes)
+        'quotes_loaded': len(quote_manager.quotes),
+        'role': 'replica' if PRIMARY_URL else 'primary',
+        'plugin': admission.stats(),
     })
 
 
+# Caches are warmed in the background at startup; /ready reports when done
+warmup = Warmup()
+
+
+def warm_manager(manager: QuoteDisplayManager, corpus: str, deadline: float) -> int:
+    """
+    Build a collection's candidate pools, text fits and markup for its most
+    requested device profiles and categories
+
+    Returns:
+        Number of combinations warmed
+    """
+    minute = int(time.time() / 60)
+    warmed = 0
+    for combo in traffic.top(corpus, warmup.combos):
+        if time.monotonic() >= deadline:
+            break
+        try:
+            categories, weights = parsed_categories(combo['categories'])
+            width, height = device_profile(combo['width'], combo['height'])
+        except (ValueError, KeyError, TypeError):
+            continue
+        for layout, _, generate_markup in PLUGIN_LAYOUTS:
+            quote = manager.pick_quote_for_user(layout, None, width, height, categories, weights, minute=minute)
+            if quote:
+                generate_markup(manager.format_for_display(quote, layout, width, height))
+        manager.pool_bitmap('full', width, height, categories, weights)
+        warmed += 1
+    return warmed
+
+
+def load_warm_manager() -> QuoteDisplayManager:
+    """Load data/quotes.json, warmed before it replaces the current manager"""
+    manager = QuoteDisplayManager('data/quotes.json')
+    warm_manager(manager, DEFAULT_CORPUS, time.monotonic() + warmup.budget)
+    return manager
+
+
+def warm_indexes(deadline: float) -> int:
+    """Search index and stats of the default collection"""
+    quote_manager.search_index
+    quote_manager.get_stats()
+    return len(quote_manager.quotes)
+
+
+def warm_collections(deadline: float) -> int:
+    """Load the most requested other collections, as many as fit the memory budget"""
+    loaded = 0
+    for corpus in traffic.top_corpora(warmup.combos):
+        if time.monotonic() >= deadline:
+            break
+        if corpus == DEFAULT_CORPUS:
+            continue
+        evictions = corpus_registry.evictions
+        try:
+            corpus_registry.get(corpus)
+        except KeyError:
+            continue
+        if corpus_registry.evictions > evictions:
+            break
+        loaded += 1
+    return loaded
+
+
+def warm_downloads(deadline: float) -> int:
+    """Compressed bodies of the current download (replicas poll it first)"""
+    generation = corpus_export.current()
+    for encoding in available_encodings():
+        generation.encoded(encoding)
+    return len(available_encodings())
+
+
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness check: 503 until this worker's caches are warm (/health is liveness)"""
+    status = warmup.status()
+    status['role'] = 'replica' if PRIMARY_URL else 'primary'
+    return jsonify(status), 200 if status['ready'] else 503
+
+
+warmup.start([
+    ('indexes', warm_indexes),
+    ('plugin', lambda deadline: warm_manager(quote_manager, DEFAULT_CORPUS, deadline)),
+    ('collections', warm_collections),
+    ('downloads', warm_downloads),
+])
+
+
 @app.route('/trigger-scrape', methods=['POST'])
+@primary_only
 def trigger_scrape():
     """
     Trigger the quote scraper manually
     Runs in background to avoid timeout
     """
-    import subprocess
-    import threading
-
     def run_scraper_background():
-        """Run the scraper in background"""
+        """Run the website and newsletter archive sources in background"""
         try:
-            print("🔄 Starting background scraper...")
-
-            # Run scraper script as subprocess
-            result = subprocess.run(
-                ['python', 'src/scraper.py'],
-                capture_output=True,
-                text=True,
-                timeout=300  # 5 minute timeout for website scraping
-            )
-
-            if result.returncode == 0:
-                print("✅ Website scraping complete")
-            else:
-                print(f"⚠️ Website scraper error: {result.stderr}")
-
-            # Run newsletter scraper
-            print("📧 Starting newsletter scraper...")
-
-            # Import here to avoid blocking
-            sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-            from newsletter_scraper import NewsletterWebScraper
-
-            newsletter_scraper = NewsletterWebScraper()
-            all_newsletters = newsletter_scraper.scrape_all_newsletters()
-
-            if all_newsletters:
-                # Load existing quotes
-                with open('data/quotes.json', 'r', encoding='utf-8') as f:
-                    existing_quotes = json.load(f)
-
-                newsletter_count = 0
-                for newsletter in all_newsletters:
-                    for idea_text in newsletter.get('ideas', []):
-                        if not any(q['text'] == idea_text for q in existing_quotes):
-                            new_quote = {
-                                'text': idea_text,
-                                'category': '3-2-1-newsletter',
-                                'source': 'James Clear - 3-2-1 Newsletter',
-                                'length': len(idea_text),
-                                'scraped_at': datetime.now().isoformat()
-                            }
-                            existing_quotes.append(new_quote)
-                            newsletter_count += 1
-
-                with open('data/quotes.json', 'w', encoding='utf-8') as f:
-                    json.dump(existing_quotes, f, indent=2, ensure_ascii=False)
-
-                print(f"✅ Added {newsletter_count} newsletter quotes from {len(all_newsletters)} newsletters")
-
-                # Reload quote manager
-                global quote_manager
-                quote_manager = QuoteDisplayManager('data/quotes.json')
-                print(f"✅ Scraping complete! Total quotes: {len(quote_manager.quotes)}")
-            else:
-                print("⚠️ No newsletter quotes found")
+            logger.info("Starting background scrape...")
+
+            pipeline = IngestPipeline(QuoteStore('data/quotes.json', on_commit=apply_new_quotes))
+            summary = pipeline.run([WebsiteSource(), NewsletterArchiveSource()])
+            logger.info("Scraping complete! Added %d quotes, total quotes: %d",
+                        summary['added'], len(quote_manager.quotes))
 
         except Exception as e:
-            print(f"❌ Background scraper error: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Background scraper error: %s", e)
 
-    # Start scraper in background thread
-    thread = threading.Thread(target=run_scraper_background, daemon=True)
+    # Start scraper in background thread, logging under this request's id
+    job_id = g.request_id
+    thread = threading.Thread(target=contextvars.copy_context().run, args=(run_scraper_background,), daemon=True)
     thread.start()
 
     return jsonify({
         'status': 'started',
-        'message': 'Scraper started in background. Check Railway logs for progress. This will take 5-10 minutes.',
+        'request_id': job_id,
+        'message': 'Scraper started in background. Check Railway logs for progress (filter on request_id). '
+                   'This will take 5-10 minutes.',
         'note': 'The endpoint returned immediately but scraping continues in the background.'
     }), 202  # 202 Accepted
 
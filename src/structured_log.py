@@ -0,0 +1,211 @@
+"""
+Structured Logging
+JSON log records written by a background thread
+
+Modules log through the standard logging module
+(logger = logging.getLogger(__name__)). setup_logging() puts a queue in
+front of the real output, so a log call on a request path only formats the
+message and enqueues it. Writing, and waiting on a slow stdout, happens on
+the listener thread. If the queue fills up, records are dropped (and
+counted) instead of blocking the caller.
+
+Settings (environment):
+- TRMNL_LOG_LEVEL: Root level (default INFO)
+- TRMNL_LOG_LEVELS: Per-module levels, e.g. "newsletter_scraper=WARNING,server=DEBUG"
+- TRMNL_LOG_FORMAT: "json" (default) or "text" for reading locally
+- TRMNL_REQUEST_ID: Request id for a process started on behalf of a request
+
+Each record carries the request id of the request (or /trigger-scrape
+job) it was logged under. Repeated messages, such as a 404 for every
+missing newsletter date, are rate limited per logger and message template.
+"""
+
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+# Request (or background job) a record belongs to
+request_id: contextvars.ContextVar = contextvars.ContextVar('request_id', default=None)
+
+# Records waiting for the writer; beyond this they are dropped
+QUEUE_SIZE = 10000
+
+# Each message template may be logged this many times per window (seconds)
+RATE_LIMIT_BURST = 10
+RATE_LIMIT_WINDOW = 60
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamps records with the current request id"""
+
+    def __init__(self, default: Optional[str] = None):
+        super().__init__()
+        self.default = default
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get() or self.default
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets each (logger, message template) through at most burst times per window
+
+    The first record let through after some were held back carries a
+    "suppressed" count. Warnings and errors are limited too: a flood of
+    identical errors is still a flood.
+    """
+
+    def __init__(self, burst: int = RATE_LIMIT_BURST, window: float = RATE_LIMIT_WINDOW):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.counters: Dict[Tuple[str, str], list] = {}  # key -> [window start, count, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            counter = self.counters.get(key)
+            if counter is None or now - counter[0] >= self.window:
+                suppressed = counter[2] if counter else 0
+                self.counters[key] = [now, 1, 0]
+                if len(self.counters) > 4096:
+                    self.counters = {k: v for k, v in self.counters.items() if now - v[0] < self.window}
+            elif counter[1] < self.burst:
+                counter[1] += 1
+                suppressed = counter[2]
+                counter[2] = 0
+            else:
+                counter[2] += 1
+                return False
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records when the queue is full instead of waiting"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only the message is rendered here; JSON encoding is left to the writer
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if self.dropped:
+            record.dropped, self.dropped = self.dropped, 0
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'pid': record.process,
+        }
+        for field in ('request_id', 'suppressed', 'dropped'):
+            value = getattr(record, field, None)
+            if value:
+                entry[field] = value
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Readable lines for running scripts locally"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-7s %(name)s: %(message)s', '%H:%M:%S')
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        if getattr(record, 'request_id', None):
+            line += f" [{record.request_id}]"
+        if getattr(record, 'suppressed', None):
+            line += f" ({record.suppressed} similar suppressed)"
+        return line
+
+
+def parse_levels(spec: str) -> Dict[str, int]:
+    """Per-module levels from "module=LEVEL,..." (unknown levels are ignored)"""
+    levels = {}
+    for entry in (spec or '').split(','):
+        name, _, level = entry.partition('=')
+        level = logging.getLevelName(level.strip().upper())
+        if name.strip() and isinstance(level, int):
+            levels[name.strip()] = level
+    return levels
+
+
+def setup_logging(fmt: Optional[str] = None, stream=None):
+    """
+    Route all logging through a queue to a background writer
+
+    Safe to call more than once; only the first call configures anything.
+
+    Args:
+        fmt: "json" or "text" (default TRMNL_LOG_FORMAT, else json)
+        stream: Where records are written (default stdout)
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    fmt = fmt or os.environ.get('TRMNL_LOG_FORMAT', 'json')
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(TextFormatter() if fmt == 'text' else JsonFormatter())
+
+    handler = DroppingQueueHandler(queue.Queue(QUEUE_SIZE))
+    handler.addFilter(RequestIdFilter(os.environ.get('TRMNL_REQUEST_ID')))
+    handler.addFilter(RateLimitFilter())
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(logging.getLevelName(os.environ.get('TRMNL_LOG_LEVEL', 'INFO').upper()))
+    for name, level in parse_levels(os.environ.get('TRMNL_LOG_LEVELS', '')).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Write out queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
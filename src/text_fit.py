@@ -0,0 +1,265 @@
+"""
+Text Fit Engine
+Computes the largest font size at which a quote fits a layout, from real font metrics
+
+Results are computed once per (quote, layout, device size) and kept in a
+shared lookup table, so rendering a screen never has to size text.
+"""
+
+import functools
+import hashlib
+import html
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+try:
+    from PIL import ImageFont
+except ImportError:  # Fall back to an average glyph width without Pillow
+    ImageFont = None
+
+
+DEFAULT_WIDTH = 800
+DEFAULT_HEIGHT = 480
+
+# Font size range in pixels for each layout, largest first choice
+FONT_RANGES = {
+    'full': (16, 48),
+    'half_vertical': (14, 32),
+    'half_horizontal': (14, 32),
+    'quadrant': (12, 28),
+}
+
+LINE_HEIGHT = 1.4
+
+# Fits kept in the shared table; TRMNL_FIT_TABLE_SIZE overrides it
+FIT_TABLE_SIZE = int(os.environ.get('TRMNL_FIT_TABLE_SIZE', 0) or 50000)
+
+# Fonts tried in order for metrics; TRMNL_FONT_PATH overrides them
+FONT_CANDIDATES = [
+    '/usr/share/fonts/truetype/dejavu/DejaVuSerif-Bold.ttf',
+    'DejaVuSerif-Bold.ttf',
+    'Georgia Bold.ttf',
+]
+
+# Word widths are measured once at this size and scaled linearly
+_REFERENCE_SIZE = 100
+
+# Average bold serif advance as a fraction of the font size, used without Pillow
+_FALLBACK_ADVANCE = 0.6
+
+
+class FitResult(NamedTuple):
+    """How a quote is displayed in one layout on one device size"""
+    font_size: int          # Font size in pixels
+    line_height: float      # Line height as a multiple of the font size
+    lines: Tuple[str, ...]  # Wrapped lines (of the possibly truncated text)
+    text: str               # Text to display (truncated if it never fit)
+    html: str               # text, HTML-escaped for the markup templates
+    truncated: bool         # Whether text had to be shortened
+
+
+def layout_size(layout: str, width: int, height: int) -> Tuple[int, int]:
+    """Pixel size of a layout's area on a device of the given size"""
+    if layout == 'half_vertical':
+        return width // 2, height
+    if layout == 'half_horizontal':
+        return width, height // 2
+    if layout == 'quadrant':
+        return width // 2, height // 2
+    return width, height
+
+
+def content_box(layout: str, width: int, height: int) -> Dict[str, int]:
+    """
+    Geometry of the quote text area inside a layout
+
+    Leaves a margin on every side and room for the "Daily Wisdom" title
+    (quadrants have no title).
+    """
+    area_width, area_height = layout_size(layout, width, height)
+    margin = max(area_width // 20, 8)
+    title_size = max(area_height // 16, 12) if layout != 'quadrant' else 0
+    title_height = title_size + margin // 2 if title_size else 0
+    return {
+        'area_width': area_width,
+        'area_height': area_height,
+        'margin': margin,
+        'title_size': title_size,
+        'title_height': title_height,
+        'width': area_width - 2 * margin,
+        'height': area_height - 2 * margin - title_height,
+    }
+
+
+@functools.lru_cache(maxsize=128)
+def load_font(size: int):
+    """Load the display font at a pixel size, or None without Pillow"""
+    if ImageFont is None:
+        return None
+
+    candidates = [os.environ['TRMNL_FONT_PATH']] if os.environ.get('TRMNL_FONT_PATH') else []
+    for path in candidates + FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size)
+
+
+@functools.lru_cache(maxsize=65536)
+def word_width(word: str) -> float:
+    """Advance width of a word at the reference font size"""
+    font = load_font(_REFERENCE_SIZE)
+    if font is None:
+        return len(word) * _REFERENCE_SIZE * _FALLBACK_ADVANCE
+    return font.getlength(word)
+
+
+def metrics_signature() -> str:
+    """
+    Fingerprint of the font metrics and size ranges fits are computed with,
+    so fits saved by another process can be checked before they are reused
+    """
+    sample = [round(word_width(word), 2) for word in ('Hamburgefonstiv', 'WMQ', 'il.,;')]
+    payload = json.dumps([sample, FONT_RANGES, LINE_HEIGHT], sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def wrap_words(words: List[str], font_size: int, max_width: float) -> List[str]:
+    """Greedy word wrap at a font size"""
+    scale = font_size / _REFERENCE_SIZE
+    space = word_width(' ') * scale
+    lines = []
+    current: List[str] = []
+    current_width = 0.0
+
+    for word in words:
+        width = word_width(word) * scale
+        if current and current_width + space + width > max_width:
+            lines.append(' '.join(current))
+            current, current_width = [word], width
+        else:
+            current_width += (space if current else 0) + width
+            current.append(word)
+
+    if current:
+        lines.append(' '.join(current))
+    return lines
+
+
+def max_lines(font_size: int, box_height: int) -> int:
+    """How many lines of a font size fit in a height"""
+    return int(box_height // (font_size * LINE_HEIGHT))
+
+
+def truncate_to_fit(text: str, font_size: int, box: Dict[str, int]) -> str:
+    """
+    Shorten text so it fits the box at font_size
+
+    Prefers a sentence boundary if one falls in the last 40% of the text
+    that fits; otherwise cuts at a word boundary and adds an ellipsis.
+    """
+    words = text.split()
+    limit = max_lines(font_size, box['height'])
+
+    # Largest number of words (plus ellipsis) that still fits
+    low, high = 0, len(words)
+    while low < high:
+        middle = (low + high + 1) // 2
+        candidate = words[:middle] + ['...']
+        if len(wrap_words(candidate, font_size, box['width'])) <= limit:
+            low = middle
+        else:
+            high = middle - 1
+
+    fitting = ' '.join(words[:low])
+    for boundary in ['. ', '! ', '? ']:
+        last_sentence = fitting.rfind(boundary)
+        if last_sentence > len(fitting) * 0.6:
+            return fitting[:last_sentence + 1].strip()
+
+    return fitting + '...' if fitting else '...'
+
+
+def fit_text(text: str, layout: str, width: int = DEFAULT_WIDTH, height: int = DEFAULT_HEIGHT) -> FitResult:
+    """
+    Largest font size at which text (shown in quote marks) fits the layout
+
+    Falls back to the layout's minimum size and a truncated text when even
+    that is too large
+    """
+    box = content_box(layout, width, height)
+    min_size, max_size = FONT_RANGES.get(layout, FONT_RANGES['full'])
+    words = f'"{text}"'.split()
+
+    best = None
+    low, high = min_size, max_size
+    while low <= high:
+        size = (low + high) // 2
+        lines = wrap_words(words, size, box['width'])
+        if len(lines) <= max_lines(size, box['height']):
+            best = (size, lines)
+            low = size + 1
+        else:
+            high = size - 1
+
+    if best:
+        size, lines = best
+        return FitResult(size, LINE_HEIGHT, tuple(lines), text, html.escape(text), False)
+
+    truncated = truncate_to_fit(text, min_size, box)
+    lines = wrap_words(f'"{truncated}"'.split(), min_size, box['width'])
+    return FitResult(min_size, LINE_HEIGHT, tuple(lines), truncated, html.escape(truncated), True)
+
+
+class FitTable:
+    """
+    Lookup table of FitResults keyed by (text, layout, width, height)
+
+    Shared by every QuoteDisplayManager, so entries computed at ingestion
+    are reused by per-request managers. Holds at most max_entries, least
+    recently used dropped first.
+    """
+
+    def __init__(self, max_entries: int = FIT_TABLE_SIZE):
+        self.max_entries = max_entries
+        self.entries: 'OrderedDict[Tuple[str, str, int, int], FitResult]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, text: str, layout: str, width: int = DEFAULT_WIDTH, height: int = DEFAULT_HEIGHT) -> FitResult:
+        """Fit for a quote, computing and storing it on a miss"""
+        key = (text, layout, width, height)
+        with self._lock:
+            result = self.entries.get(key)
+            if result is not None:
+                self.entries.move_to_end(key)
+                return result
+
+        result = fit_text(text, layout, width, height)
+        with self._lock:
+            self.entries[key] = result
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return result
+
+    def discard(self, texts: Set[str]):
+        """Drop the entries of texts no longer served (an unloaded corpus)"""
+        if not texts:
+            return
+        with self._lock:
+            for key in [key for key in self.entries if key[0] in texts]:
+                del self.entries[key]
+
+    def precompute(self, texts: List[str], layouts: Optional[List[str]] = None,
+                   width: int = DEFAULT_WIDTH, height: int = DEFAULT_HEIGHT):
+        """Fill the table for many quotes at once (done at ingestion)"""
+        for text in texts:
+            for layout in layouts or FONT_RANGES:
+                self.get(text, layout, width, height)
+
+
+# Process-wide table used by the display manager and renderer
+fit_table = FitTable()
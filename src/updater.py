@@ -3,17 +3,23 @@ Automated Quote Updater
 Runs periodically to update the quote database
 """
 
+import argparse
 import schedule
 import time
 import json
+import logging
 import os
 import sys
-from datetime import datetime
 
 # Add current directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from scraper import JamesClearScraper
-from newsletter_scraper import NewsletterWebScraper
+from email_monitor import NewsletterMonitor
+from ingest import IngestFailed, IngestPipeline, QuoteStore
+from quote_sources import LatestNewsletterSource, NewsletterSource, WebsiteSource
+from structured_log import setup_logging
+
+logger = logging.getLogger('updater')
 
 
 class QuoteUpdater:
@@ -22,6 +28,7 @@ class QuoteUpdater:
     def __init__(self, config_file: str = 'config/config.json'):
         self.config = self.load_config(config_file)
         self.scraper = JamesClearScraper()
+        self.quotes_file = 'data/quotes.json'
 
     def load_config(self, filename: str) -> dict:
         """Load configuration"""
@@ -30,72 +37,77 @@ class QuoteUpdater:
                 return json.load(f)
         return {}
 
+    def ingest(self, sources: list) -> dict:
+        """Run sources through the ingestion pipeline into data/quotes.json"""
+        return IngestPipeline(QuoteStore(self.quotes_file)).run(sources)
+
     def update_from_website(self):
         """Scrape quotes from website"""
-        print(f"\n{datetime.now()} - Starting website scrape...")
+        logger.info("Starting website scrape...")
 
-        quotes = self.scraper.scrape_all_categories()
+        summary = self.ingest([WebsiteSource(self.scraper)])
 
-        if quotes:
-            self.scraper.save_quotes(quotes, 'data/quotes.json')
-            print(f"Updated {len(quotes)} quotes from website")
+        if summary['stages']['parse']['out']:
+            logger.info("Updated %d quotes from website", summary['added'])
         else:
-            print("No quotes found during scrape")
+            logger.warning("No quotes found during scrape")
 
     def update_from_newsletter(self):
         """Check for new newsletter quotes using web scraper"""
-        print(f"\n{datetime.now()} - Checking for newsletter updates...")
+        logger.info("Checking for newsletter updates...")
 
         try:
-            scraper = NewsletterWebScraper()
+            summary = self.ingest([LatestNewsletterSource()])
 
-            # Get the latest newsletter
-            latest = scraper.get_latest_ideas()
-
-            if latest and latest.get('ideas'):
-                # Add to database
-                self.merge_newsletter_quotes([latest])
-                print(f"Found latest newsletter with {len(latest['ideas'])} ideas")
+            if summary['stages']['parse']['out']:
+                logger.info("Found latest newsletter with %d ideas (%d new)",
+                            summary['stages']['parse']['out'], summary['added'])
             else:
-                print("No new newsletter found or couldn't extract ideas")
+                logger.info("No new newsletter found or couldn't extract ideas")
 
         except Exception as e:
-            print(f"Error checking newsletters: {e}")
+            logger.exception("Error checking newsletters: %s", e)
 
     def merge_newsletter_quotes(self, newsletters: list):
-        """Merge newsletter quotes with existing database"""
-        # Load existing quotes
-        quotes_file = '../data/quotes.json'
-        existing_quotes = []
-
-        # Ensure data directory exists
-        os.makedirs('../data', exist_ok=True)
-
-        if os.path.exists(quotes_file):
-            with open(quotes_file, 'r', encoding='utf-8') as f:
-                existing_quotes = json.load(f)
-
-        # Add newsletter ideas
-        for newsletter in newsletters:
-            # Handle both old format (quotes) and new format (ideas)
-            ideas_list = newsletter.get('ideas', newsletter.get('quotes', []))
-            newsletter_date = newsletter.get('date', newsletter.get('title', 'Unknown'))
-
-            for idea_text in ideas_list:
-                # Check if quote already exists
-                if not any(q['text'] == idea_text for q in existing_quotes):
-                    new_quote = {
-                        'text': idea_text,
-                        'category': '3-2-1-newsletter',
-                        'source': f"3-2-1 Newsletter - {newsletter_date}",
-                        'length': len(idea_text),
-                        'scraped_at': datetime.now().isoformat()
-                    }
-                    existing_quotes.append(new_quote)
-
-        # Save updated quotes
-        with open(quotes_file, 'w', encoding='utf-8') as f:
-            json.dump(existing_quotes, f, indent=2, ensure_ascii=False)
+        """
+        Merge newsletter quotes (from the email monitor or web scraper) with existing database
+
+        Raises:
+            IngestFailed: If any of them couldn't be parsed or stored, so the
+                email listener keeps the newsletters for another try
+        """
+        summary = self.ingest([NewsletterSource(newsletters)])
+        errors = sum(stage['errors'] for stage in summary['stages'].values())
+        if summary['failed'] or errors:
+            raise IngestFailed(f"{summary['failed']} quotes not stored, {errors} stage errors")
+
+    def listen_for_newsletters(self):
+        """
+        Watch the inbox with IMAP IDLE and merge 3-2-1 ideas as soon as they arrive
+
+        Replaces the Tuesday/Wednesday newsletter polling when email
+        monitoring is enabled in config/config.json
+        """
+        email_config = self.config.get('email', {})
+        if not email_config.get('enabled'):
+            logger.warning("Email monitoring is disabled. Set email.enabled in config/config.json")
+            return
+
+        monitor = NewsletterMonitor(
+            email_config['email'],
+            email_config['password'],
+            email_config.get('imap_server', 'imap.gmail.com'),
+            imap_port=email_config.get('imap_port'),
+            use_ssl=email_config.get('use_ssl', True),
+        )
+
+        def ingest(newsletters: list):
+            self.merge_newsletter_quotes(newsletters)
+            total = sum(len(n['quotes']) for n in newsletters)
+            logger.info("Merged %d ideas from %d new newsletter(s)", total, len(newsletters))
+
+        logger.info("Listening for 3-2-1 newsletters on %s... (Ctrl+C to stop)", monitor.imap_server)
+        monitor.listen(ingest)
 
     def run_scheduled_updates(self):
         """Set up and run scheduled updates"""
@@ -109,13 +121,12 @@ class QuoteUpdater:
         # Also check Wednesday morning in case newsletter was delayed
         schedule.every().wednesday.at("09:00").do(self.update_from_newsletter)
 
-        print("Quote updater scheduled:")
-        print("- Website scrape: Every Sunday at 2:00 AM")
-        print("- Newsletter check: Every Tuesday at 3:00 PM and Wednesday at 9:00 AM")
-        print("\nRunning indefinitely... (Ctrl+C to stop)")
+        logger.info("Quote updater scheduled: website scrape every Sunday at 2:00 AM, "
+                    "newsletter check every Tuesday at 3:00 PM and Wednesday at 9:00 AM")
+        logger.info("Running indefinitely... (Ctrl+C to stop)")
 
         # Initial update
-        print("\nRunning initial update...")
+        logger.info("Running initial update...")
         self.update_from_website()
 
         # Keep running
@@ -125,5 +136,14 @@ class QuoteUpdater:
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Keep the quote database up to date')
+    parser.add_argument('--listen', action='store_true',
+                        help='Push newsletter ideas in as they arrive (IMAP IDLE) instead of polling')
+    args = parser.parse_args()
+
+    setup_logging()
     updater = QuoteUpdater()
-    updater.run_scheduled_updates()
\ No newline at end of file
+    if args.listen:
+        updater.listen_for_newsletters()
+    else:
+        updater.run_scheduled_updates()
\ No newline at end of file
@@ -0,0 +1,375 @@
+"""
+User Store
+Persistent per-user preferences and history, keyed by user_uuid
+
+Stored in SQLite (data/users.db) so every gunicorn worker shares it, with an
+in-memory LRU in front. Each user row holds:
+- the interned id of their category setting (category strings are stored
+  once in a separate table and compared by id)
+- the quotes they were recently shown, so changing categories doesn't
+  bring back quotes they've just seen
+- the quotes they never want to see
+
+In memory, quotes are bitmaps of quote ids, the positions in the quotes
+file (the same ids /search returns). Positions shift when quotes are
+removed or the file is compacted, so rows store stable keys instead (a hash
+of the canonical text, see canonicalize.canonical_key) and a record is
+read and written through the quote manager that maps between the two.
+Bitmaps are Python ints.
+
+Every write bumps the row's version and only succeeds against the version
+the record was read at. A record read from the cache before another
+worker's write is reloaded and its change (the poll or exclusion that
+changed it) applied again, so no write is lost.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Tries at a conditional write before giving up on a record
+SAVE_ATTEMPTS = 5
+
+# Category set ids kept in memory (least recently used are looked up again)
+MAX_CATEGORY_SETS = 1024
+
+
+def to_bitmap(ids: Iterable[int]) -> int:
+    """Bitmap with the given bits set"""
+    bitmap = 0
+    for quote_id in ids:
+        bitmap |= 1 << quote_id
+    return bitmap
+
+
+def bitmap_ids(bitmap: int):
+    """Ids of the set bits in a bitmap, lowest first"""
+    quote_id = 0
+    while bitmap:
+        if bitmap & 1:
+            yield quote_id
+        bitmap >>= 1
+        quote_id += 1
+
+
+def advance_history(history: int, shown: int, pool: int) -> int:
+    """
+    History after a poll that showed the quotes in the shown bitmap
+
+    Starts over (with just shown) once it covers pool, the bitmap of every
+    quote the user can currently be shown
+    """
+    history |= shown
+    if history & pool == pool:
+        return shown
+    return history
+
+
+def _decode(data: Optional[bytes]) -> int:
+    """Bitmap stored by earlier versions (little-endian bytes of quote ids)"""
+    return int.from_bytes(data, 'little') if data else 0
+
+
+def _encode_keys(keys: Iterable[int]) -> bytes:
+    return b''.join(key.to_bytes(8, 'big') for key in sorted(set(keys)))
+
+
+def _decode_keys(data: Optional[bytes]) -> List[int]:
+    data = data or b''
+    return [int.from_bytes(data[i:i + 8], 'big') for i in range(0, len(data), 8)]
+
+
+class UserRecord:
+    """One user's stored preferences and history, as quote ids of one quote manager"""
+
+    __slots__ = ('user_uuid', 'category_set_id', 'history', 'exclusions',
+                 'last_minute', 'last_shown', 'loaded_at', 'quotes', 'version',
+                 'other_exclusions', 'change')
+
+    def __init__(self, user_uuid: str, category_set_id: Optional[int] = None, history: int = 0,
+                 exclusions: int = 0, last_minute: Optional[int] = None, last_shown: int = 0,
+                 quotes=None, version: int = 0, other_exclusions: Iterable[int] = ()):
+        self.user_uuid = user_uuid
+        self.category_set_id = category_set_id
+        self.history = history            # Bitmap of recently shown quote ids
+        self.exclusions = exclusions      # Bitmap of quote ids never to show
+        self.last_minute = last_minute    # Minute of the last recorded poll
+        self.last_shown = last_shown      # Bitmap of quote ids shown at last_minute
+        self.loaded_at = time.monotonic()
+        self.quotes = quotes              # Quote manager the bitmaps belong to
+        self.version = version            # Row version read (0: no row yet)
+        # Excluded keys that aren't in the quotes file now; kept in case they come back
+        self.other_exclusions = list(other_exclusions)
+        # Unsaved changes, to apply again to a newer copy of the row
+        self.change: Optional[Callable[['UserRecord'], None]] = None
+
+    def recent_history(self, minute: int) -> int:
+        """
+        Recently shown quote ids to move on past at this minute
+
+        Quotes recorded at this same minute are left out, so repeated polls
+        within a minute get the same quotes
+        """
+        if minute == self.last_minute:
+            return self.history & ~self.last_shown
+        return self.history
+
+
+class UserStore:
+    """
+    SQLite-backed user store with an in-memory LRU
+
+    Cached records expire after cache_ttl seconds so changes written by
+    other worker processes are picked up on a later poll; a write made from
+    a stale record is retried against the current row.
+
+    Records are read and written through a quote manager (anything with
+    bitmap_of_keys and keys_of_bitmap, like QuoteDisplayManager), which
+    maps stored keys to its quote ids.
+    """
+
+    def __init__(self, db_file: str = 'data/users.db', max_cached: int = 4096, cache_ttl: float = 60):
+        self.db_file = db_file
+        self.max_cached = max_cached
+        self.cache_ttl = cache_ttl
+        self.cache: 'OrderedDict[str, UserRecord]' = OrderedDict()
+        self.category_set_ids: 'OrderedDict[str, int]' = OrderedDict()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Per-thread connection, creating the database on first use"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.db_file) or '.', exist_ok=True)
+            connection = sqlite3.connect(self.db_file, timeout=10)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS category_sets (
+                    id INTEGER PRIMARY KEY,
+                    spec TEXT UNIQUE NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS users (
+                    user_uuid TEXT PRIMARY KEY,
+                    category_set_id INTEGER,
+                    history BLOB,
+                    exclusions BLOB,
+                    last_minute INTEGER,
+                    last_shown BLOB,
+                    updated_at REAL
+                );
+            """)
+            # Columns added since: stable keys in place of the bitmaps above
+            # (still read from rows written before), and the row version
+            columns = {row[1] for row in connection.execute('PRAGMA table_info(users)')}
+            with connection:
+                for column, kind in [('history_keys', 'BLOB'), ('exclusion_keys', 'BLOB'),
+                                     ('last_shown_keys', 'BLOB'), ('version', 'INTEGER NOT NULL DEFAULT 1')]:
+                    if column not in columns:
+                        connection.execute(f'ALTER TABLE users ADD COLUMN {column} {kind}')
+            self._local.connection = connection
+        return connection
+
+    def intern_category_set(self, spec: str) -> int:
+        """
+        Stable id for a categories setting
+
+        Pass the canonical spec (category_weights.category_spec), not the raw
+        form field, so equivalent settings share one row.
+        """
+        spec = spec or ''
+        with self._lock:
+            set_id = self.category_set_ids.get(spec)
+            if set_id is not None:
+                self.category_set_ids.move_to_end(spec)
+                return set_id
+
+        connection = self._connection()
+        with connection:
+            connection.execute('INSERT OR IGNORE INTO category_sets (spec) VALUES (?)', (spec,))
+        set_id = connection.execute('SELECT id FROM category_sets WHERE spec = ?', (spec,)).fetchone()[0]
+        with self._lock:
+            self.category_set_ids[spec] = set_id
+            while len(self.category_set_ids) > MAX_CATEGORY_SETS:
+                self.category_set_ids.popitem(last=False)
+        return set_id
+
+    def get(self, user_uuid: str, quotes) -> UserRecord:
+        """A user's record in quote ids of the quotes manager (a fresh one if they have none yet)"""
+        with self._lock:
+            record = self.cache.get(user_uuid)
+            if (record is not None and record.quotes is quotes
+                    and time.monotonic() - record.loaded_at < self.cache_ttl):
+                self.cache.move_to_end(user_uuid)
+                return record
+
+        record = self._load(user_uuid, quotes)
+        self._remember(record)
+        return record
+
+    def _load(self, user_uuid: str, quotes) -> UserRecord:
+        """A user's record as stored now"""
+        row = self._connection().execute(
+            """SELECT category_set_id, history, exclusions, last_minute, last_shown,
+                      history_keys, exclusion_keys, last_shown_keys, version
+               FROM users WHERE user_uuid = ?""",
+            (user_uuid,)
+        ).fetchone()
+        if not row:
+            return UserRecord(user_uuid, quotes=quotes)
+
+        def bitmap(keys, legacy) -> Tuple[int, List[int]]:
+            # Rows not written since keys were introduced hold quote ids
+            if keys is None:
+                return _decode(legacy), []
+            return quotes.bitmap_of_keys(_decode_keys(keys))
+
+        history, _ = bitmap(row[5], row[1])
+        exclusions, other_exclusions = bitmap(row[6], row[2])
+        last_shown, _ = bitmap(row[7], row[4])
+        return UserRecord(user_uuid, row[0], history, exclusions, row[3], last_shown,
+                          quotes, row[8], other_exclusions)
+
+    def _remember(self, record: UserRecord):
+        with self._lock:
+            self.cache[record.user_uuid] = record
+            self.cache.move_to_end(record.user_uuid)
+            while len(self.cache) > self.max_cached:
+                self.cache.popitem(last=False)
+
+    def _change(self, record: UserRecord, change: Callable[[UserRecord], None]):
+        """Apply a change to a record, remembering it until the record is saved"""
+        change(record)
+        earlier = record.change
+        if earlier is None:
+            record.change = change
+        else:
+            def both(target: UserRecord):
+                earlier(target)
+                change(target)
+            record.change = both
+
+    def save(self, record: UserRecord):
+        """Write a record through to the database"""
+        self.save_many([record])
+
+    def save_many(self, records: List[UserRecord]):
+        """
+        Write many records in one transaction
+
+        A record whose row was written since it was read is reloaded, its
+        changes are applied again and it is written in a further round.
+        """
+        pending = list({id(record): record for record in records}.values())
+        for _ in range(SAVE_ATTEMPTS):
+            if not pending:
+                return
+            now = time.time()
+            stale = []
+            connection = self._connection()
+            with connection:
+                for record in pending:
+                    quotes = record.quotes
+                    values = (record.category_set_id, record.last_minute,
+                              _encode_keys(quotes.keys_of_bitmap(record.history)),
+                              _encode_keys(quotes.keys_of_bitmap(record.exclusions) + record.other_exclusions),
+                              _encode_keys(quotes.keys_of_bitmap(record.last_shown)), now)
+                    if record.version:
+                        cursor = connection.execute(
+                            """UPDATE users SET category_set_id = ?, last_minute = ?, history_keys = ?,
+                                   exclusion_keys = ?, last_shown_keys = ?, updated_at = ?,
+                                   history = NULL, exclusions = NULL, last_shown = NULL,
+                                   version = version + 1
+                               WHERE user_uuid = ? AND version = ?""",
+                            values + (record.user_uuid, record.version)
+                        )
+                    else:
+                        cursor = connection.execute(
+                            """INSERT OR IGNORE INTO users
+                               (category_set_id, last_minute, history_keys, exclusion_keys, last_shown_keys,
+                                updated_at, user_uuid, version)
+                               VALUES (?, ?, ?, ?, ?, ?, ?, 1)""",
+                            values + (record.user_uuid,)
+                        )
+                    if cursor.rowcount:
+                        record.version += 1
+                        record.change = None
+                    else:
+                        stale.append(record)
+
+            for record in pending:
+                if record not in stale:
+                    self._remember(record)
+
+            pending = []
+            for record in stale:
+                current = self._load(record.user_uuid, record.quotes)
+                if record.change is not None:
+                    self._change(current, record.change)
+                pending.append(current)
+
+        if pending:
+            logger.warning("Gave up saving %d user records after %d conflicting writes",
+                           len(pending), SAVE_ATTEMPTS)
+
+    def record_shown(self, record: UserRecord, minute: int, category_set_id: int,
+                     quote_ids: Iterable[int], pool: int, save: bool = True) -> bool:
+        """
+        Add the quotes shown at a poll to the user's history
+
+        History is cleared once it covers the pool bitmap (everything the
+        user can currently be shown), starting the next cycle. Polls repeated
+        within the same minute aren't written again.
+
+        Args:
+            save: Write through now; pass False to collect records for save_many
+
+        Returns:
+            Whether the record changed
+        """
+        if minute == record.last_minute and category_set_id == record.category_set_id:
+            return False
+
+        shown = to_bitmap(quote_ids)
+
+        def poll(target: UserRecord):
+            target.history = advance_history(target.history, shown, pool)
+            target.last_minute = minute
+            target.last_shown = shown
+            target.category_set_id = category_set_id
+
+        self._change(record, poll)
+        if save:
+            self.save(record)
+        return True
+
+    def set_exclusions(self, user_uuid: str, quotes, quote_ids: Iterable[int],
+                       replace: bool = False) -> UserRecord:
+        """Exclude quote ids for a user (adding to, or replacing, their exclusions)"""
+        record = self.get(user_uuid, quotes)
+        excluded = to_bitmap(quote_ids)
+
+        def exclude(target: UserRecord):
+            if replace:
+                target.exclusions = excluded
+                target.other_exclusions = []
+            else:
+                target.exclusions |= excluded
+
+        self._change(record, exclude)
+        self.save(record)
+        return self.get(user_uuid, quotes)
+
+    def stats(self) -> Tuple[int, int]:
+        """(users stored, distinct category settings)"""
+        connection = self._connection()
+        users = connection.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+        sets = connection.execute('SELECT COUNT(*) FROM category_sets').fetchone()[0]
+        return users, sets
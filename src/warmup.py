@@ -0,0 +1,172 @@
+"""
+Cache Warm-up
+Gets a worker's caches ready before it is reported ready for traffic
+
+After a deploy or a corpus reload, the first requests used to pay for cold
+caches: candidate pools, text fits and the compressed download are all
+built on first use. The TrafficRecorder counts which collection, device
+profile and categories setting the plugin requests use, and every worker
+merges its counts into data/traffic.json. At startup, Warmup works through
+the most requested combinations from that file in a background thread, and
+/ready reports not-ready until it is done. Reloaded collections are warmed
+for the same combinations before they replace the old ones.
+
+Settings (environment):
+- TRMNL_WARMUP_SECONDS: Time budget for warm-up (default 20); combinations
+  left over when it runs out are built on first use as before
+- TRMNL_WARMUP_COMBOS: Most requested combinations to warm (default 50)
+"""
+
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds between merges of a worker's counts into the traffic file
+FLUSH_INTERVAL = 60
+
+# Combinations kept in the traffic file, and days one is kept without requests
+MAX_COMBOS = 200
+MAX_AGE_DAYS = 7
+
+# Device profile and categories warmed when there is no traffic yet
+DEFAULT_COMBO = {'categories': '', 'width': 800, 'height': 480}
+
+
+class TrafficRecorder:
+    """
+    Request counts per (collection, categories, width, height), merged into
+    a file shared by all workers
+    """
+
+    def __init__(self, path: str = 'data/traffic.json', flush_interval: float = FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.counts: Counter = Counter()
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, corpus: str, categories: str, width: int, height: int):
+        """Count a request (flushing now and then)"""
+        with self._lock:
+            self.counts[(corpus, categories, width, height)] += 1
+            due = time.monotonic() - self._last_flush >= self.flush_interval
+            if due:
+                self._last_flush = time.monotonic()
+        if due:
+            self.flush()
+
+    def load(self) -> List[Dict]:
+        """Combinations in the traffic file, most requested first"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('combos', [])
+        except (OSError, ValueError, AttributeError):
+            return []
+
+    def flush(self):
+        """Merge this worker's counts into the traffic file (write-then-rename)"""
+        with self._lock:
+            counts, self.counts = self.counts, Counter()
+        if not counts:
+            return
+
+        today = date.today().isoformat()
+        oldest = (date.today() - timedelta(days=MAX_AGE_DAYS)).isoformat()
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path + '.lock', 'a') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    combos = {
+                        (combo['corpus'], combo['categories'], combo['width'], combo['height']): combo
+                        for combo in self.load() if combo.get('last_seen', '') >= oldest
+                    }
+                    for key, count in counts.items():
+                        combo = combos.setdefault(key, {
+                            'corpus': key[0], 'categories': key[1], 'width': key[2], 'height': key[3], 'count': 0,
+                        })
+                        combo['count'] += count
+                        combo['last_seen'] = today
+
+                    ranked = sorted(combos.values(), key=lambda combo: -combo['count'])[:MAX_COMBOS]
+                    with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+                        json.dump({'combos': ranked}, f)
+                    os.replace(self.path + '.tmp', self.path)
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+        except (OSError, KeyError, TypeError) as e:
+            logger.warning("Could not save traffic counts: %s", e)
+
+    def top(self, corpus: str, limit: int) -> List[Dict]:
+        """
+        Most requested combinations for a collection (the default device
+        profile with no categories if it has no traffic yet)
+        """
+        combos = [combo for combo in self.load() if combo.get('corpus') == corpus][:limit]
+        return combos or [dict(DEFAULT_COMBO, corpus=corpus)]
+
+    def top_corpora(self, limit: int) -> List[str]:
+        """Collections by number of requests"""
+        totals: Counter = Counter()
+        for combo in self.load():
+            totals[combo.get('corpus')] += combo.get('count', 0)
+        return [corpus for corpus, _ in totals.most_common(limit)]
+
+
+class Warmup:
+    """
+    Runs warm-up steps once, in a background thread, and reports progress
+
+    Each step is a (name, function) pair; the function gets the deadline
+    (time.monotonic() value) to stop by and returns how many things it warmed.
+    """
+
+    def __init__(self, budget: Optional[float] = None):
+        self.budget = budget or float(os.environ.get('TRMNL_WARMUP_SECONDS', 20) or 20)
+        self.combos = int(os.environ.get('TRMNL_WARMUP_COMBOS', 50) or 50)
+        self.steps: Dict[str, int] = {}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.errors: List[str] = []
+
+    @property
+    def ready(self) -> bool:
+        return self.finished_at is not None
+
+    def start(self, steps: List[Tuple[str, Callable[[float], int]]]):
+        """Run the steps in a background thread"""
+        threading.Thread(target=self.run, args=(steps,), name='warmup', daemon=True).start()
+
+    def run(self, steps: List[Tuple[str, Callable[[float], int]]]):
+        """Run the steps in order, stopping at the time budget"""
+        self.started_at = time.monotonic()
+        deadline = self.started_at + self.budget
+        for name, step in steps:
+            if time.monotonic() >= deadline:
+                logger.warning("Warm-up ran out of time before %s", name)
+                break
+            try:
+                self.steps[name] = step(deadline)
+            except Exception as e:
+                # A failed step leaves its caches to be built on first use
+                logger.exception("Warm-up step %s failed: %s", name, e)
+                self.errors.append(f"{name}: {e}")
+        self.finished_at = time.monotonic()
+        logger.info("Warm-up finished in %.2fs: %s", self.finished_at - self.started_at, self.steps)
+
+    def status(self) -> Dict:
+        """Progress, for /ready"""
+        status = {'ready': self.ready, 'steps': dict(self.steps)}
+        if self.started_at is not None:
+            status['seconds'] = round((self.finished_at or time.monotonic()) - self.started_at, 3)
+        if self.errors:
+            status['errors'] = list(self.errors)
+        return status
@@ -6,8 +6,13 @@ echo "🚀 Starting TRMNL James Clear Quotes Plugin..."
 # Create data directory
 mkdir -p data
 
+# Replicas mirror the primary's quotes instead of scraping their own
+if [ -n "$TRMNL_PRIMARY_URL" ]; then
+    echo "🔁 Replica of $TRMNL_PRIMARY_URL. Fetching quotes snapshot..."
+    python src/replica.py --once || echo "⚠️  Primary unavailable; serving the local copy"
+    python src/replica.py &
 # Check if quotes database exists or is too small (< 100 quotes)
-if [ ! -f "data/quotes.json" ]; then
+elif [ ! -f "data/quotes.json" ]; then
     echo "📚 No quotes database found. Running initial scrape..."
     python src/scraper.py
     echo "✅ Scraping complete!"
@@ -16,7 +21,8 @@ elif [ $(wc -l < data/quotes.json) -lt 10 ]; then
     python src/scraper.py
     echo "✅ Scraping complete!"
 else
-    echo "✅ Quotes database found with $(python -c "import json; print(len(json.load(open('data/quotes.json'))))" 2>/dev/null || echo "unknown") quotes"
+    echo "✅ Quotes database found"
+    python src/corpus_tool.py build-index || echo "⚠️  Could not index data/quotes.json"
 fi
 
 # Start the server
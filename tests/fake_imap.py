@@ -0,0 +1,116 @@
+"""
+Stand-in IMAP server for the email monitor tests
+
+Speaks just enough plain-text IMAP4rev1 for NewsletterMonitor: LOGIN,
+EXAMINE/SELECT, UID SEARCH (only the UID range counts, with the "n:*"
+quirk of always matching the highest UID), UID FETCH of BODYSTRUCTURE,
+header fields and body sections, NOOP, IDLE and LOGOUT.
+"""
+
+import re
+import socketserver
+import threading
+from typing import Dict, List
+
+
+def message(uid: int, body: str, subject: str = '3-2-1: On habits',
+            date: str = 'Thu, 02 Jan 2025 14:00:00 +0000') -> Dict:
+    """A single-part text/plain message"""
+    data = body.encode('utf-8')
+    return {
+        'uid': uid,
+        'headers': f'Date: {date}\r\nSubject: {subject}\r\n\r\n'.encode('utf-8'),
+        'structure': f'("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL "8BIT" {len(data)} 1)'.encode(),
+        'parts': {'1': data},
+    }
+
+
+class FakeIMAPServer(socketserver.ThreadingTCPServer):
+    """Serves a mailbox of message() dicts on an ephemeral localhost port"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, messages: List[Dict], uidvalidity: int = 1):
+        super().__init__(('127.0.0.1', 0), FakeIMAPHandler)
+        self.messages = messages
+        self.uidvalidity = uidvalidity
+        # Untagged lines sent in the same write as IDLE's continuation
+        self.idle_events: List[bytes] = []
+        self.commands: List[bytes] = []
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+
+class FakeIMAPHandler(socketserver.StreamRequestHandler):
+    server: FakeIMAPServer
+
+    def send(self, data: bytes):
+        self.wfile.write(data)
+        self.wfile.flush()
+
+    def handle(self):
+        self.send(b'* OK [CAPABILITY IMAP4rev1 IDLE] Fake IMAP ready\r\n')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            tag, command, args = (line.rstrip(b'\r\n').split(b' ', 2) + [b''])[:3]
+            command = command.upper()
+            self.server.commands.append(command + b' ' + args)
+
+            if command == b'LOGOUT':
+                self.send(b'* BYE\r\n' + tag + b' OK LOGOUT completed\r\n')
+                return
+            if command in (b'SELECT', b'EXAMINE'):
+                uids = [m['uid'] for m in self.server.messages]
+                self.send(b'* %d EXISTS\r\n' % len(uids)
+                          + b'* OK [UIDVALIDITY %d] UIDs valid\r\n' % self.server.uidvalidity
+                          + b'* OK [UIDNEXT %d] Predicted next UID\r\n' % (max(uids, default=0) + 1))
+            elif command == b'CAPABILITY':
+                self.send(b'* CAPABILITY IMAP4rev1 IDLE\r\n')
+            elif command == b'UID':
+                self.uid_command(args)
+            elif command == b'IDLE':
+                self.send(b'+ idling\r\n' + b''.join(self.server.idle_events))
+                self.server.idle_events = []
+                self.rfile.readline()  # DONE
+            elif command not in (b'LOGIN', b'NOOP'):
+                self.send(tag + b' BAD Unknown command\r\n')
+                continue
+            self.send(tag + b' OK ' + command + b' completed\r\n')
+
+    def uid_command(self, args: bytes):
+        subcommand, rest = args.split(b' ', 1)
+        numbers = {m['uid']: i + 1 for i, m in enumerate(self.server.messages)}
+
+        if subcommand.upper() == b'SEARCH':
+            found = sorted(numbers)
+            start = re.search(rb'UID (\d+):\*', rest)
+            if start and found:
+                # "n:*" is "n:highest", which includes the highest UID even below n
+                found = [uid for uid in found if uid >= int(start.group(1))] or found[-1:]
+            self.send(b'* SEARCH' + b''.join(b' %d' % uid for uid in found) + b'\r\n')
+            return
+
+        uid_set, items = rest.split(b' ', 1)
+        wanted = {int(uid) for uid in uid_set.split(b',')}
+        for msg in self.server.messages:
+            if msg['uid'] not in wanted:
+                continue
+            response = b'* %d FETCH (UID %d' % (numbers[msg['uid']], msg['uid'])
+            if b'BODYSTRUCTURE' in items:
+                response += b' BODYSTRUCTURE ' + msg['structure']
+            if b'HEADER.FIELDS' in items:
+                response += b' BODY[HEADER.FIELDS (DATE SUBJECT)] {%d}\r\n' % len(msg['headers']) + msg['headers']
+            for section in re.findall(rb'BODY\.PEEK\[([\d.]+)\]', items):
+                part = msg['parts'].get(section.decode(), b'')
+                response += b' BODY[' + section + b'] {%d}\r\n' % len(part) + part
+            self.send(response + b')\r\n')
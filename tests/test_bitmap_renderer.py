@@ -0,0 +1,36 @@
+import os
+
+import pytest
+
+pytest.importorskip('PIL')
+
+from bitmap_renderer import BitmapCache, BitmapRenderer
+
+TEXT = "We do not rise to the level of our goals. We fall to the level of our systems."
+
+
+def test_rendered_bitmap_is_servable_by_another_worker(tmp_path):
+    # Two renderers sharing a cache directory stand in for two gunicorn workers
+    first = BitmapRenderer(BitmapCache(str(tmp_path)), max_workers=1)
+    second = BitmapRenderer(BitmapCache(str(tmp_path)), max_workers=1)
+
+    key = first.render(TEXT, 'full', 800, 480)
+
+    data = second.get(key)
+    assert data is not None and data.startswith(b'\x89PNG')
+
+
+def test_disk_cache_removes_least_recently_used(tmp_path):
+    cache = BitmapCache(str(tmp_path), max_memory_items=0, max_disk_bytes=10000)
+    for number in range(5):
+        cache.put(f"{number:032x}", 'png', b'x' * 300)
+        # Distinct mtimes, oldest first
+        os.utime(cache.path(f"{number:032x}", 'png'), (number, number))
+    cache.get(f"{1:032x}", 'png')  # Served recently, so kept
+    cache.max_disk_bytes = 1000
+    cache.put(f"{5:032x}", 'png', b'x' * 300)
+
+    remaining = sorted(name[:32] for name in os.listdir(tmp_path))
+    assert sum(os.path.getsize(tmp_path / name) for name in os.listdir(tmp_path)) <= 1000
+    assert f"{1:032x}" in remaining and f"{5:032x}" in remaining
+    assert f"{0:032x}" not in remaining
@@ -0,0 +1,26 @@
+from canonicalize import canonical_text, leftovers
+
+
+def test_removes_share_link_remnants():
+    assert canonical_text('“Action produces momentum.” ()') == 'Action produces momentum.'
+    assert canonical_text('Be kind. (Share on Twitter)') == 'Be kind.'
+    # An inner quotation keeps its closing mark
+    assert canonical_text('At night: “Did I do my best?” ()') == 'At night: “Did I do my best?”'
+
+
+def test_share_words_inside_a_quote_are_kept():
+    text = 'Write something worth sharing, then ask people to tweet this.'
+    assert canonical_text(text) == text
+    assert leftovers(text) == []
+
+
+def test_spaces_out_glued_titles():
+    text = 'A reminder fromAtomic Habits: “Walk slowly, but never backward.'
+    assert leftovers(text) == ['glued title']
+    assert canonical_text(text) == 'A reminder from Atomic Habits: “Walk slowly, but never backward.”'
+    assert canonical_text('Chapter 2 ofAtomic Habitsfor more.') == 'Chapter 2 of Atomic Habits for more.'
+
+
+def test_canonical_text_is_stable():
+    for text in ['“Action produces momentum.” ()', 'A reminder fromAtomic Habits: “Walk slowly.']:
+        assert canonical_text(canonical_text(text)) == canonical_text(text)
@@ -0,0 +1,22 @@
+from category_weights import category_spec, parse_categories
+
+
+def spec(field, known=None):
+    return category_spec(*parse_categories(field), known)
+
+
+def test_equivalent_fields_share_a_spec():
+    assert spec('life, atomic-habits') == spec('atomic-habits,life,life') == 'atomic-habits,life'
+    assert spec('atomic-habits:2,life:1') == spec('life:10,atomic-habits:20') == 'atomic-habits:0.666667,life:0.333333'
+    assert spec('') == ''
+
+
+def test_unknown_categories_are_left_out():
+    known = {'atomic-habits', 'life'}
+
+    assert spec('life,made-up', known) == 'life'
+    assert spec('life:1,made-up:5', known) == 'life:1'
+    # Fields that match no quotes get no spec at all
+    assert spec('made-up', known) is None
+    assert spec('made-up:1', known) is None
+    assert spec('life:0', known) is None
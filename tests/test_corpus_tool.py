@@ -0,0 +1,51 @@
+import json
+
+import corpus_tool
+from display_manager import DEVICE_PROFILES, QuoteDisplayManager, index_path
+
+LAYOUTS = ['full', 'half_vertical', 'half_horizontal', 'quadrant']
+
+
+def quotes_file(tmp_path, count=40):
+    with open('data/quotes.json', 'r', encoding='utf-8') as f:
+        quotes = json.load(f)[:count]
+    path = tmp_path / 'quotes.json'
+    path.write_text(json.dumps(quotes, indent=2, ensure_ascii=False), encoding='utf-8')
+    return str(path)
+
+
+def pools(manager):
+    return {(layout, width, height, category): [manager.quote_id(quote) for quote in
+                                                manager.candidate_pool(layout, width, height, list(category or []))]
+            for width, height in DEVICE_PROFILES[:5] for layout in LAYOUTS for category in (None, ('life',))}
+
+
+def test_server_loads_what_build_index_saved(tmp_path):
+    path = quotes_file(tmp_path)
+    computed = QuoteDisplayManager(path)
+
+    corpus_tool.main(['--file', path, 'build-index'])
+    loaded = QuoteDisplayManager(path)
+
+    assert len(loaded._pools) == len(DEVICE_PROFILES) * len(LAYOUTS)
+    assert loaded._search_index is not None
+    assert pools(loaded) == pools(computed)
+    assert {name: len(quotes) for name, quotes in loaded.by_length.items()} == \
+        {name: len(quotes) for name, quotes in computed.by_length.items()}
+    assert loaded.search_index.search('habits') == computed.search_index.search('habits')
+
+
+def test_stale_index_is_ignored(tmp_path):
+    path = quotes_file(tmp_path)
+    corpus_tool.main(['--file', path, 'build-index'])
+    with open(path, 'r', encoding='utf-8') as f:
+        quotes = json.load(f)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(quotes[1:], f)
+
+    manager = QuoteDisplayManager(path)
+
+    assert not manager._pools
+    assert not corpus_tool.index_is_current(path)
+    assert 'index' in corpus_tool.verify(path)
+    assert index_path(path) == str(tmp_path / 'quotes.index.json')
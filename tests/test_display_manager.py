@@ -0,0 +1,126 @@
+import json
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from display_manager import QuoteDisplayManager, device_profile
+from text_fit import FitTable
+
+START = datetime(2026, 1, 5, 9, 0)
+MINUTE = int(START.timestamp() // 60)
+
+
+def make_quote(number: int, scraped_at: datetime, category: str = 'Habits') -> dict:
+    text = f"Idea {number}: small habits compound into remarkable results over time."
+    return {'text': text, 'category': category, 'source': 'Test', 'length': len(text),
+            'scraped_at': scraped_at.isoformat()}
+
+
+@pytest.fixture
+def manager(tmp_path):
+    quotes_file = tmp_path / 'quotes.json'
+    quotes_file.write_text(json.dumps([make_quote(n, START) for n in range(50)]))
+    return QuoteDisplayManager(str(quotes_file))
+
+
+def test_add_quotes_replaces_pools_instead_of_changing_them(manager):
+    pool = manager.candidate_pool('full')
+    before = list(pool)
+
+    # Stamped before the loaded quotes, so it sorts to the front
+    manager.add_quotes([make_quote(100, START - timedelta(days=1))])
+
+    assert pool == before
+    grown = manager.candidate_pool('full')
+    assert grown is not pool
+    assert len(grown) == len(pool) + 1
+    assert grown[0]['text'].startswith('Idea 100:')
+
+
+def test_picks_while_quotes_are_added(manager):
+    errors = []
+    stop = threading.Event()
+
+    def pick():
+        minute = MINUTE
+        while not stop.is_set():
+            try:
+                quote = manager.pick_quote_for_user('full', 'user-1', minute=minute)
+                assert quote is not None
+            except Exception as e:  # Reported by the main thread
+                errors.append(e)
+                return
+            minute += 1
+
+    readers = [threading.Thread(target=pick) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    for number in range(200):
+        manager.add_quotes([make_quote(1000 + number, START - timedelta(minutes=number))])
+    stop.set()
+    for reader in readers:
+        reader.join()
+
+    assert errors == []
+
+
+def test_rotation_is_stable_when_quotes_are_added(manager):
+    minutes = range(MINUTE, MINUTE + 40)
+    before = [manager.pick_quote_for_user('full', 'user-1', minute=minute)['text'] for minute in minutes]
+
+    manager.add_quotes([make_quote(n, START + timedelta(minutes=45)) for n in range(100, 110)])
+
+    after = [manager.pick_quote_for_user('full', 'user-1', minute=minute)['text'] for minute in minutes]
+    assert after == before
+
+
+@pytest.mark.parametrize('reported, profile', [
+    ((800, 480), (800, 480)),
+    ((1000, 600), (800, 600)),
+    ((1920, 1080), (1448, 1072)),
+    ((758, 1024), (758, 1024)),
+    ((50, 50), (100, 100)),
+    (('x', None), (800, 480)),
+])
+def test_device_profile_maps_sizes_onto_classes(reported, profile):
+    assert device_profile(*reported) == profile
+
+
+def test_pool_is_built_outside_the_lock(manager, monkeypatch):
+    building = threading.Event()
+    release = threading.Event()
+    fits_layout = manager.fits_layout
+
+    def slow_fits_layout(quote, layout, width, height):
+        if layout == 'quadrant':
+            building.set()
+            release.wait(5)
+        return fits_layout(quote, layout, width, height)
+
+    monkeypatch.setattr(manager, 'fits_layout', slow_fits_layout)
+    pools = []
+    builders = [threading.Thread(target=lambda: pools.append(manager.candidate_pool('quadrant', 1872, 1404)))
+                for _ in range(2)]
+    for builder in builders:
+        builder.start()
+    assert building.wait(5)
+
+    # Other pools are served and quotes added while the build is under way
+    assert manager.pick_quote_for_user('full', 'user-1', minute=MINUTE) is not None
+    manager.add_quotes([make_quote(100, START)])
+
+    release.set()
+    for builder in builders:
+        builder.join()
+    assert pools[0] is pools[1]
+    assert any(quote['text'].startswith('Idea 100:') for quote in pools[0])
+
+
+def test_fit_table_is_bounded():
+    table = FitTable(max_entries=3)
+    for number in range(5):
+        table.get(f"Quote {number}", 'full')
+    table.get("Quote 2", 'full')
+    table.get("Quote 5", 'full')
+    assert [key[0] for key in table.entries] == ["Quote 4", "Quote 2", "Quote 5"]
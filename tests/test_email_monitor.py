@@ -0,0 +1,133 @@
+import json
+import threading
+import time
+
+import pytest
+
+from email_monitor import IMAPResponseParser, NewsletterMonitor
+from fake_imap import FakeIMAPServer, message
+
+
+def newsletter(*ideas: str) -> str:
+    numerals = ['I', 'II', 'III']
+    body = '\n\n'.join(f'{numerals[i]}.\n"{idea}"' for i, idea in enumerate(ideas))
+    return f"Happy 3-2-1 Thursday,\n\n3 IDEAS FROM ME\n\n{body}\n\n2 QUOTES FROM OTHERS\n"
+
+
+IDEAS = [
+    "Systems make the results you want more likely, one day at a time.",
+    "Small habits compound into remarkable results over the long run.",
+    "The best way to change your identity is to change what you do.",
+]
+
+
+@pytest.fixture
+def server():
+    server = FakeIMAPServer([message(uid, newsletter(IDEAS[uid % 3])) for uid in (3, 5, 8)], uidvalidity=7)
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def monitor(server, tmp_path):
+    monitor = NewsletterMonitor('reader@example.com', 'secret', '127.0.0.1', imap_port=server.port,
+                                use_ssl=False, state_file=str(tmp_path / 'email_state.json'))
+    yield monitor
+    monitor.disconnect()
+
+
+def saved_state(monitor: NewsletterMonitor) -> dict:
+    with open(monitor.state_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_parser_handles_literals_quoted_strings_nil_and_sections():
+    data = (b'12 (UID 8 FLAGS (\\Seen) BODY[HEADER.FIELDS (DATE SUBJECT)] {9}'
+            b'Date: x\r\n ENVELOPE ("a \\"b\\"" NIL))')
+
+    tokens = IMAPResponseParser(data).parse()
+
+    assert tokens == [b'12', [b'UID', b'8', b'FLAGS', [b'\\Seen'],
+                              b'BODY[HEADER.FIELDS (DATE SUBJECT)]', b'Date: x\r\n',
+                              b'ENVELOPE', [b'a "b"', None]]]
+
+
+def test_bodystructure_finds_nested_text_part():
+    structure = IMAPResponseParser(
+        b'((("TEXT" "HTML" ("CHARSET" "utf-8") NIL NIL "7BIT" 10 1)'
+        b'("TEXT" "PLAIN" ("CHARSET" "ISO-8859-1" "FORMAT" "flowed") NIL NIL "QUOTED-PRINTABLE" 20 2)'
+        b' "ALTERNATIVE")("IMAGE" "PNG" NIL NIL NIL "BASE64" 300) "MIXED")'
+    ).parse()[0]
+
+    part = NewsletterMonitor('reader@example.com', '').find_text_part(structure)
+
+    assert part == ('1.2', 'quoted-printable', 'ISO-8859-1')
+
+
+def test_check_fetches_new_newsletters_without_committing(monitor):
+    newsletters, uid = monitor.check_new_newsletters()
+
+    assert [n['uid'] for n in newsletters] == [3, 5, 8]
+    assert newsletters[0]['quotes'] == [IDEAS[0]]
+    assert newsletters[0]['subject'] == '3-2-1: On habits'
+    assert uid == 8
+    assert monitor.state['last_uid'] == 0
+
+    monitor.commit_uid(uid)
+    assert saved_state(monitor) == {'uidvalidity': 7, 'last_uid': 8}
+
+
+def test_recent_newsletters_leave_committing_to_the_caller(monitor):
+    newsletters, uid = monitor.get_recent_newsletters()
+
+    assert [n['uid'] for n in newsletters] == [3, 5, 8]
+    assert uid == 8
+    assert monitor.load_state()['last_uid'] == 0
+
+
+def test_search_from_past_the_highest_uid_finds_nothing(monitor):
+    # "9:*" matches UID 8 too, as the highest in the mailbox
+    monitor.state = {'uidvalidity': 7, 'last_uid': 8}
+
+    assert monitor.check_new_newsletters() == ([], 8)
+
+
+def test_uidvalidity_change_starts_over(monitor):
+    monitor.state = {'uidvalidity': 6, 'last_uid': 5}
+
+    newsletters, uid = monitor.check_new_newsletters()
+
+    assert [n['uid'] for n in newsletters] == [3, 5, 8]
+    assert uid == 8
+
+
+def test_listen_commits_only_after_the_handler_succeeds(monitor):
+    monitor.RECONNECT_BACKOFF_MIN = 0.01
+    stop = threading.Event()
+    calls = []
+
+    def on_newsletters(newsletters):
+        calls.append([n['uid'] for n in newsletters])
+        if len(calls) == 1:
+            assert monitor.state['last_uid'] == 0
+            raise RuntimeError('store unavailable')
+        stop.set()
+
+    monitor.listen(on_newsletters, stop_event=stop)
+
+    # The failed batch is fetched again, and committed once handled
+    assert calls == [[3, 5, 8], [3, 5, 8]]
+    assert saved_state(monitor) == {'uidvalidity': 7, 'last_uid': 8}
+
+
+def test_idle_sees_exists_buffered_with_the_continuation(monitor, server):
+    monitor.commit_uid(monitor.check_new_newsletters()[1])
+    # Arrives in the same packet as "+ idling", so it sits in imaplib's buffer
+    server.idle_events = [b'* 4 EXISTS\r\n']
+
+    started = time.monotonic()
+    assert monitor.idle(monitor.mail, timeout=5)
+    assert time.monotonic() - started < 2
+
+    # The connection is still usable after DONE
+    assert monitor.check_new_newsletters() == ([], 8)
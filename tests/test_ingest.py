@@ -0,0 +1,103 @@
+import json
+
+import pytest
+
+import ingest
+from ingest import IngestPipeline, QuoteStore
+from quote_sources import Source
+
+
+class ListSource(Source):
+    """One task per text, each parsed into a single record"""
+
+    name = 'list'
+    category = 'Test'
+    source = 'Test'
+
+    def __init__(self, texts):
+        super().__init__()
+        self.texts = texts
+
+    def tasks(self):
+        return self.texts
+
+    def parse(self, raw, task):
+        return [{'text': raw}]
+
+
+class RecordingStore(QuoteStore):
+    """QuoteStore that remembers the texts of every batch it was given"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = []
+
+    def commit(self, batch):
+        self.calls.append([quote['text'] for quote, _ in batch])
+        return super().commit(batch)
+
+
+TEXTS = [f"Quote number {word} says something entirely different from the rest"
+         for word in ('one', 'two', 'three', 'four', 'five', 'six', 'seven')]
+
+
+@pytest.fixture
+def failing_write(monkeypatch):
+    """Make the first rename of a quotes file fail"""
+    calls = []
+    replace = ingest.os.replace
+
+    def fail_once(src, dst):
+        calls.append(dst)
+        if len(calls) == 1:
+            raise OSError('disk full')
+        return replace(src, dst)
+
+    monkeypatch.setattr(ingest.os, 'replace', fail_once)
+    return calls
+
+
+def test_failed_commit_drops_its_batch(tmp_path, failing_write):
+    quotes_file = str(tmp_path / 'quotes.json')
+    store = RecordingStore(quotes_file)
+
+    summary = IngestPipeline(store, batch_size=3).run([ListSource(TEXTS)])
+
+    assert summary['failed'] == 3
+    assert summary['added'] == 4
+    assert summary['stages']['store']['errors'] == 1
+    # The failed batch is not sent again with the next one
+    assert [len(call) for call in store.calls] == [3, 3, 1]
+    committed = [text for call in store.calls[1:] for text in call]
+    assert not set(committed) & set(store.calls[0])
+
+    with open(quotes_file, encoding='utf-8') as f:
+        stored = [quote['text'] for quote in json.load(f)]
+    assert sorted(stored) == sorted(committed)
+    assert store.pending == {}
+
+
+def test_failed_commit_releases_claims(tmp_path, failing_write):
+    store = QuoteStore(str(tmp_path / 'quotes.json'))
+    quote = {'text': TEXTS[0], 'category': 'Test', 'source': 'Test'}
+
+    with pytest.raises(OSError):
+        store.commit([(quote, store.claim(TEXTS[0]))])
+    assert store.quotes == []
+
+    # The text wasn't stored, so it can be claimed and committed again
+    claim = store.claim(TEXTS[0])
+    assert claim is not None
+    assert store.commit([(quote, claim)]) == [quote]
+    assert store.claim(TEXTS[0]) is None
+
+
+def test_commit_appends_to_a_file_written_elsewhere(tmp_path):
+    quotes_file = tmp_path / 'quotes.json'
+    stored = [{'text': text, 'category': 'Test'} for text in TEXTS[:2]]
+    quotes_file.write_text(json.dumps(stored) + '\n')  # Compact, with a trailing newline
+    store = QuoteStore(str(quotes_file))
+    quote = {'text': TEXTS[2], 'category': 'Test'}
+
+    assert store.commit([(quote, store.claim(TEXTS[2]))]) == [quote]
+    assert json.loads(quotes_file.read_text()) == stored + [quote]
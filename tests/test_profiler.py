@@ -0,0 +1,48 @@
+import importlib
+import os
+import shutil
+import sys
+import time
+
+import pytest
+
+REPO = os.path.join(os.path.dirname(__file__), '..')
+
+
+@pytest.fixture(scope='module')
+def server(tmp_path_factory):
+    """The server module, run from a scratch copy of the data directory with profiling on"""
+    workdir = tmp_path_factory.mktemp('server')
+    os.makedirs(workdir / 'data')
+    shutil.copy(os.path.join(REPO, 'data', 'quotes.json'), workdir / 'data' / 'quotes.json')
+
+    cwd = os.getcwd()
+    environ = dict(os.environ)
+    os.chdir(workdir)
+    os.environ.update({'TRMNL_PROFILE_TOKEN': 'secret', 'TRMNL_PROFILE_INTERVAL_MS': '1',
+                       'TRMNL_LOG_LEVEL': 'WARNING'})
+    sys.modules.pop('server', None)
+    try:
+        yield importlib.import_module('server')
+    finally:
+        sys.modules.pop('server', None)
+        os.chdir(cwd)
+        os.environ.clear()
+        os.environ.update(environ)
+
+
+def test_profiled_plugin_stacks_include_the_computation(server):
+    client = server.app.test_client()
+    deadline = time.monotonic() + 10
+    computed = []
+    while not computed and time.monotonic() < deadline:
+        response = client.post('/plugin', data={'user_uuid': 'profiled-user'},
+                               headers={'X-Profile': 'secret'})
+        assert response.status_code == 200
+        computed = [stack for stack in server.profiler.snapshot()
+                    if 'display_manager.py:' in stack]
+
+    assert computed
+    # Sampled on the admission pool's thread, under the request's label
+    assert all(stack.startswith('POST /plugin;') for stack in computed)
+    assert any('admission.py:_compute' in stack for stack in computed)
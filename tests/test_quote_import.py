@@ -0,0 +1,32 @@
+import io
+import json
+
+from quote_import import QuoteImporter
+
+WORDS = ['habits', 'systems', 'goals', 'identity', 'progress', 'focus', 'patience', 'craft']
+
+
+def ndjson(count: int) -> io.BytesIO:
+    lines = []
+    for number in range(count):
+        # Digits in every word keep the records apart for the near-duplicate check
+        text = ' '.join(f"{WORDS[(number + i) % len(WORDS)]}{number * 7 + i}" for i in range(10))
+        lines.append(json.dumps({'text': text, 'category': 'curated'}))
+    return io.BytesIO('\n'.join(lines).encode())
+
+
+def test_batches_stay_the_same_size(tmp_path):
+    quotes_file = tmp_path / 'quotes.json'
+    quotes_file.write_text('[]')
+    writes = []
+    importer = QuoteImporter(str(quotes_file), batch_size=100,
+                             on_commit=lambda added, mtime: writes.append(len(added)))
+
+    summary = importer.run(ndjson(3000))
+
+    assert summary['added'] == 3000
+    assert writes == [100] * 30
+    # Appending batch by batch writes the file json.dump would
+    stored = json.loads(quotes_file.read_text())
+    assert quotes_file.read_text() == json.dumps(stored, indent=2, ensure_ascii=False)
+    assert len(stored) == 3000
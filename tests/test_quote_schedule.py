@@ -0,0 +1,91 @@
+import json
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+import display_manager
+from display_manager import QuoteDisplayManager
+from quote_schedule import MAX_SLOTS
+
+START = datetime(2026, 1, 5, 9, 0)
+WORDS = ['habits', 'systems', 'goals', 'identity', 'progress', 'focus', 'patience', 'craft']
+
+
+@pytest.fixture(scope='module')
+def manager(tmp_path_factory):
+    rng = random.Random(7)
+    quotes = []
+    for number in range(1000):
+        text = f"Quote {number}: " + ' '.join(rng.choice(WORDS) for _ in range(rng.randint(6, 40))) + '.'
+        quotes.append({'text': text, 'category': rng.choice(['Habits', 'Focus']), 'source': 'Test',
+                       'length': len(text),
+                       'scraped_at': (START - timedelta(days=30, minutes=number % 7)).isoformat()})
+    quotes_file = tmp_path_factory.mktemp('schedule') / 'quotes.json'
+    quotes_file.write_text(json.dumps(quotes))
+    return QuoteDisplayManager(str(quotes_file))
+
+
+def test_week_schedule_walks_each_cycle_about_once(manager, monkeypatch):
+    built = []  # Sizes of the rotation orders built
+    looked_up = []  # Quotes examined, through their id lookups
+
+    class CountingPermutation(display_manager.Permutation):
+        __slots__ = ()
+
+        def __init__(self, seed, size):
+            built.append(size)
+            super().__init__(seed, size)
+
+    class CountingIds(dict):
+        def __getitem__(self, key):
+            looked_up.append(key)
+            return super().__getitem__(key)
+
+    # Half the pool already seen, as for a user who has been polling for a while
+    history = sum(1 << manager.quote_id(quote) for quote in manager.candidate_pool('full')[::2])
+    monkeypatch.setattr(display_manager, 'Permutation', CountingPermutation)
+    monkeypatch.setattr(manager, '_quote_ids', CountingIds(manager._quote_ids))
+
+    rows = manager.schedule_for_user('user-1', ['full', 'quadrant'], int(START.timestamp() // 60), MAX_SLOTS, 1,
+                                     history=history)
+
+    assert len(rows) == MAX_SLOTS
+    # One rotation order per cycle of each pool, not one per slot
+    full = len(manager.candidate_pool('full'))
+    assert built.count(full) <= MAX_SLOTS // full + 2
+    # Each order is scanned about once (with and without history) plus one
+    # lookup per slot, where scanning from every slot's position took millions
+    assert len(looked_up) <= MAX_SLOTS + 2 * sum(built)
+
+
+def test_cursors_pick_the_same_quotes(manager, monkeypatch):
+    rng = random.Random(3)
+    history = sum(1 << rng.randrange(1000) for _ in range(400))
+    exclude = sum(1 << rng.randrange(1000) for _ in range(30))
+    start_minute = int(START.timestamp() // 60)
+
+    def schedule():
+        return manager.schedule_for_user('user-2', ['full', 'quadrant'], start_minute, 1500, 1,
+                                         history=history, exclude=exclude)
+
+    with_cursors = schedule()
+    next_unseen = manager._next_unseen
+    monkeypatch.setattr(manager, '_next_unseen',
+                        lambda pool, order, start, skip, cursors=None, key=None:
+                        next_unseen(pool, order, start, skip))
+    assert schedule() == with_cursors
+
+
+def test_history_starts_over_around_exclusions(manager):
+    start_minute = int(START.timestamp() // 60)
+    pool = manager.candidate_pool('full')
+    exclude = sum(1 << manager.quote_id(quote) for quote in pool[:10])
+
+    rows = manager.schedule_for_user('user-3', ['full'], start_minute, 2 * len(pool), 1, exclude=exclude)
+
+    shown = [manager.quote_id(row['quotes']['full']) for row in rows]
+    assert not any(exclude >> quote_id & 1 for quote_id in shown)
+    # Each pass over the shown quotes has no repeats
+    first = shown[:len(pool) - 10]
+    assert len(set(first)) == len(first)
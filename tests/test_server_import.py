@@ -0,0 +1,69 @@
+import importlib
+import io
+import os
+import shutil
+import sys
+import time
+
+import pytest
+from werkzeug.test import EnvironBuilder
+
+REPO = os.path.join(os.path.dirname(__file__), '..')
+
+
+@pytest.fixture(scope='module')
+def server(tmp_path_factory):
+    """The server module, run from a scratch copy of the data directory with a 1 MB upload cap"""
+    workdir = tmp_path_factory.mktemp('server')
+    os.makedirs(workdir / 'data')
+    shutil.copy(os.path.join(REPO, 'data', 'quotes.json'), workdir / 'data' / 'quotes.json')
+
+    cwd = os.getcwd()
+    environ = dict(os.environ)
+    os.chdir(workdir)
+    os.environ.update({'TRMNL_MAX_UPLOAD_MB': '1', 'TRMNL_LOG_LEVEL': 'WARNING'})
+    sys.modules.pop('server', None)
+    try:
+        yield importlib.import_module('server')
+    finally:
+        sys.modules.pop('server', None)
+        os.chdir(cwd)
+        os.environ.clear()
+        os.environ.update(environ)
+
+
+LINE = b'{"text": "Habits are the compound interest of self-improvement.", "category": "curated"}\n'
+TOO_LARGE = LINE * (2 * 1024 * 1024 // len(LINE))
+
+
+def test_oversized_import_is_refused(server):
+    response = server.app.test_client().post('/import', data=TOO_LARGE,
+                                             content_type='application/x-ndjson')
+
+    assert response.status_code == 413
+    assert not [name for name in os.listdir(server.IMPORTS_DIR) if name.endswith('.ndjson')]
+
+
+def test_oversized_chunked_import_stops_at_the_cap(server):
+    # No Content-Length, as gunicorn passes a chunked body, so the limit is enforced while spooling
+    environ = EnvironBuilder('/import', method='POST', input_stream=io.BytesIO(TOO_LARGE),
+                             content_type='application/x-ndjson').get_environ()
+    del environ['CONTENT_LENGTH']
+    environ['wsgi.input_terminated'] = True
+
+    response = server.app.test_client().open(environ)
+
+    assert response.status_code == 413
+    assert not [name for name in os.listdir(server.IMPORTS_DIR) if name.endswith('.ndjson')]
+
+
+def test_import_within_the_cap_is_queued(server):
+    response = server.app.test_client().post('/import', data=LINE, content_type='application/x-ndjson')
+
+    assert response.status_code == 202
+    # Let the background import finish before the fixture leaves the scratch directory
+    client = server.app.test_client()
+    deadline = time.monotonic() + 10
+    while client.get(response.json['status_url']).json['status'] in ('queued', 'running'):
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
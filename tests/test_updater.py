@@ -0,0 +1,57 @@
+import json
+import threading
+
+import pytest
+
+from email_monitor import NewsletterMonitor
+from fake_imap import FakeIMAPServer, message
+from ingest import IngestFailed, QuoteStore
+from updater import QuoteUpdater
+
+BODY = ("3 IDEAS FROM ME\n\nI.\n\"Systems make the results you want more likely, one day at a time.\"\n\n"
+        "2 QUOTES FROM OTHERS\n")
+
+
+@pytest.fixture
+def updater(tmp_path):
+    updater = QuoteUpdater(str(tmp_path / 'config.json'))
+    updater.quotes_file = str(tmp_path / 'quotes.json')
+    return updater
+
+
+def test_failed_store_keeps_the_newsletter_uncommitted(updater, tmp_path, monkeypatch):
+    def failing_commit(self, batch):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(QuoteStore, 'commit', failing_commit)
+    server = FakeIMAPServer([message(4, BODY)])
+    monitor = NewsletterMonitor('reader@example.com', 'secret', '127.0.0.1', imap_port=server.port,
+                                use_ssl=False, state_file=str(tmp_path / 'email_state.json'))
+    stop = threading.Event()
+    errors = []
+
+    def on_newsletters(newsletters):
+        stop.set()  # One attempt is enough
+        try:
+            updater.merge_newsletter_quotes(newsletters)
+        except IngestFailed as e:
+            errors.append(e)
+            raise
+
+    try:
+        monitor.listen(on_newsletters, stop_event=stop)
+    finally:
+        server.close()
+
+    # Left for a retry rather than marked processed
+    assert len(errors) == 1
+    assert monitor.state['last_uid'] == 0
+    assert not (tmp_path / 'email_state.json').exists()
+
+
+def test_merge_stores_newsletter_quotes(updater, tmp_path):
+    updater.merge_newsletter_quotes([{'quotes': ["Small habits compound into remarkable results."],
+                                      'date': 'Thu, 02 Jan 2025 14:00:00 +0000'}])
+
+    quotes = json.loads((tmp_path / 'quotes.json').read_text())
+    assert [quote['text'] for quote in quotes] == ["Small habits compound into remarkable results."]
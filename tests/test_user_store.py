@@ -0,0 +1,104 @@
+import json
+import sqlite3
+
+import pytest
+
+from display_manager import QuoteDisplayManager
+from user_store import UserStore, bitmap_ids, to_bitmap
+
+TEXTS = [f"Quote {number} about building better habits, one small step at a time." for number in range(6)]
+
+
+def manager_for(tmp_path, texts, name='quotes.json'):
+    quotes_file = tmp_path / name
+    quotes_file.write_text(json.dumps([{'text': text, 'category': 'Habits'} for text in texts]))
+    return QuoteDisplayManager(str(quotes_file))
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    return str(tmp_path / 'users.db')
+
+
+def test_history_and_exclusions_survive_removed_quotes(tmp_path, db_file):
+    before = manager_for(tmp_path, TEXTS)
+    store = UserStore(db_file)
+    user = store.get('user-1', before)
+    store.record_shown(user, 100, 1, [4], pool=to_bitmap(range(6)))
+    store.set_exclusions('user-1', before, [3, 5])
+
+    # Quote 0 is removed: every later quote moves up one position
+    after = manager_for(tmp_path, TEXTS[1:], 'compacted.json')
+    user = UserStore(db_file).get('user-1', after)
+
+    assert list(bitmap_ids(user.history)) == [3]
+    assert list(bitmap_ids(user.exclusions)) == [2, 4]
+
+
+def test_exclusions_of_missing_quotes_are_kept(tmp_path, db_file):
+    full = manager_for(tmp_path, TEXTS)
+    UserStore(db_file).set_exclusions('user-1', full, [5])
+
+    smaller = manager_for(tmp_path, TEXTS[:5], 'smaller.json')
+    store = UserStore(db_file)
+    store.set_exclusions('user-1', smaller, [1])
+    assert list(bitmap_ids(store.get('user-1', smaller).exclusions)) == [1]
+
+    assert list(bitmap_ids(UserStore(db_file).get('user-1', full).exclusions)) == [1, 5]
+
+
+def test_stale_cached_record_does_not_overwrite_newer_write(tmp_path, db_file):
+    manager = manager_for(tmp_path, TEXTS)
+    pool = to_bitmap(range(6))
+    worker_a, worker_b = UserStore(db_file), UserStore(db_file)
+    stale = worker_a.get('user-1', manager)
+
+    # Another worker records a poll and an exclusion
+    user = worker_b.get('user-1', manager)
+    worker_b.record_shown(user, 100, 1, [0], pool)
+    worker_b.set_exclusions('user-1', manager, [5])
+
+    # The first worker's cached copy predates both
+    worker_a.record_shown(stale, 101, 1, [1], pool)
+
+    user = UserStore(db_file).get('user-1', manager)
+    assert list(bitmap_ids(user.history)) == [0, 1]
+    assert list(bitmap_ids(user.exclusions)) == [5]
+    assert user.last_minute == 101
+    assert user.version == 3
+
+
+def test_rows_written_before_stable_keys_are_read_as_quote_ids(tmp_path, db_file):
+    connection = sqlite3.connect(db_file)
+    connection.execute("""CREATE TABLE users (user_uuid TEXT PRIMARY KEY, category_set_id INTEGER,
+                          history BLOB, exclusions BLOB, last_minute INTEGER, last_shown BLOB,
+                          updated_at REAL)""")
+    connection.execute('INSERT INTO users VALUES (?, 1, ?, ?, 100, ?, 0)',
+                       ('user-1', bytes([0b110]), bytes([0b1000]), bytes([0b100])))
+    connection.commit()
+    connection.close()
+
+    manager = manager_for(tmp_path, TEXTS)
+    store = UserStore(db_file)
+    user = store.get('user-1', manager)
+    assert list(bitmap_ids(user.history)) == [1, 2]
+    assert list(bitmap_ids(user.exclusions)) == [3]
+
+    # Written back as stable keys
+    store.record_shown(user, 101, 1, [0], to_bitmap(range(6)))
+    user = UserStore(db_file).get('user-1', manager)
+    assert list(bitmap_ids(user.history)) == [0, 1, 2]
+    assert list(bitmap_ids(user.exclusions)) == [3]
+
+
+def test_category_set_ids_are_stable_and_bounded_in_memory(db_file, monkeypatch):
+    monkeypatch.setattr('user_store.MAX_CATEGORY_SETS', 2)
+    store = UserStore(db_file)
+
+    ids = [store.intern_category_set(spec) for spec in ('', 'a', 'a,b', 'b')]
+
+    assert len(set(ids)) == 4
+    assert list(store.category_set_ids) == ['a,b', 'b']
+    # Evicted specs are looked up again, not stored twice
+    assert store.intern_category_set('a') == ids[1]
+    assert store.stats() == (0, 4)